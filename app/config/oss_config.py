@@ -13,6 +13,12 @@ class OSSConfig:
     # 文件上传配置
     VIDEO_PREFIX: str = "videos/"  # 视频文件在OSS中的前缀路径
     MAX_FILE_SIZE: int = 200 * 1024 * 1024  # 最大文件大小 200MB
+    THUMB_PREFIX: str = "thumbs/"  # 封面和缩略图在OSS中的前缀路径，按文件哈希存放
+    THUMB_CACHE_DIR: str = os.getenv("THUMB_CACHE_DIR", "/tmp/shop-sphere/thumbs")  # 封面和缩略图的本地缓存目录
+    THUMB_MISS_TTL: int = int(os.getenv("THUMB_MISS_TTL", "600"))  # 确认OSS中没有缩略图后，该时长（秒）内不再查询
+    PREFETCH_PARTS: int = int(os.getenv("OSS_PREFETCH_PARTS", "2"))  # 分片中继预取的分片数
+    SIGNED_URL_WINDOW: int = int(os.getenv("OSS_SIGNED_URL_WINDOW", "600"))  # 签名URL过期时间按该粒度（秒）对齐，同一时间窗内复用
+    SIGNED_URL_CACHE_SIZE: int = int(os.getenv("OSS_SIGNED_URL_CACHE_SIZE", "10000"))  # 缓存的签名URL条数
     
     # 允许的视频格式
     ALLOWED_VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv', '.m4v'}
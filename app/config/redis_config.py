@@ -0,0 +1,21 @@
+import os
+
+
+class RedisConfig:
+    """Redis配置"""
+
+    HOST: str = os.getenv("REDIS_HOST", "")
+    PORT: int = int(os.getenv("REDIS_PORT") or 6379)
+    PASSWORD: str = os.getenv("REDIS_PASSWORD", "")
+    DB: int = int(os.getenv("REDIS_DB") or 0)
+
+    @classmethod
+    def is_configured(cls) -> bool:
+        """检查Redis是否配置"""
+        return bool(cls.HOST)
+
+    @classmethod
+    def get_url(cls) -> str:
+        """获取Redis连接URL"""
+        auth = f":{cls.PASSWORD}@" if cls.PASSWORD else ""
+        return f"redis://{auth}{cls.HOST}:{cls.PORT}/{cls.DB}"
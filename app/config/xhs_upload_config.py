@@ -0,0 +1,16 @@
+import os
+
+
+class XhsUploadConfig:
+    """小红书素材上传和批量发布配置"""
+
+    UPLOAD_PART_SIZE: int = int(os.getenv("XHS_UPLOAD_PART_SIZE", str(3 * 1024 * 1024)))  # 视频分片大小（字节）
+    UPLOAD_CONCURRENCY: int = int(os.getenv("XHS_UPLOAD_CONCURRENCY", "4"))  # 并发上传的分片数
+    UPLOAD_PART_RETRIES: int = int(os.getenv("XHS_UPLOAD_PART_RETRIES", "3"))  # 单个分片的最大尝试次数
+    UPLOAD_RETRY_BACKOFF: float = float(os.getenv("XHS_UPLOAD_RETRY_BACKOFF", "1.0"))  # 分片重试退避的基础秒数
+    UPLOAD_TOKEN_TTL: int = int(os.getenv("XHS_UPLOAD_TOKEN_TTL", "3600"))  # 许可响应未给出过期时间时，上传token的有效期（秒）
+    UPLOAD_PERMIT_BATCH: int = int(os.getenv("XHS_UPLOAD_PERMIT_BATCH", "4"))  # 每次请求上传许可的文件数，1 表示不缓存许可
+    UPLOAD_PERMIT_LOW_WATERMARK: int = int(os.getenv("XHS_UPLOAD_PERMIT_LOW_WATERMARK", "1"))  # 缓存的许可少于该数量时后台补充
+    UPLOAD_REUSE_TTL: int = int(os.getenv("XHS_UPLOAD_REUSE_TTL", str(24 * 3600)))  # 同一文件已上传的文件ID复用有效期（秒），0 表示不复用
+    NOTES_PER_ACCOUNT: int = int(os.getenv("XHS_NOTES_PER_ACCOUNT", "2"))  # 异步发布时同一账号同时发布的笔记数
+    MAP_WORKERS: int = int(os.getenv("XHS_MAP_WORKERS", "4"))  # 同步客户端 map 批量请求的线程数，连接池大小不小于该值
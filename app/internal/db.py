@@ -5,6 +5,7 @@ from app.models.video import VideoMaterial
 from app.models.prompt import AIPromptTemplate
 from app.models.user import User  # 添加 User 模型导入
 from app.models.publish_config import PublishConfig
+from app.models.product import ProductSyncState
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 
@@ -595,4 +595,26 @@ class ArticleVideoMapping(BaseModel, table=True):
     article_id: int = Field(index=True, description="文章ID")
     video_id: int = Field(index=True, description="视频ID")
     status: str = Field(default="published", description="关联状态", sa_type=sa.String(length=32))
-    publish_time: int = Field(default=0, sa_type=sa.BigInteger, description="发布时间")
\ No newline at end of file
+    publish_time: int = Field(default=0, sa_type=sa.BigInteger, description="发布时间")
+
+
+class ArticlePublishLease(SQLModel, table=True):
+    """文章发布租约，多个发布进程通过租约保证同一篇文章只发布一次"""
+    __tablename__ = "article_publish_lease"
+
+    article_id: int = Field(primary_key=True, description="文章ID")
+    claim_token: str = Field(description="持有者的认领令牌", sa_type=sa.String(length=64))
+    owner: str = Field(default="", description="持有者标识（主机名:进程号）", sa_type=sa.String(length=128))
+    lease_expire_at: int = Field(default=0, sa_type=sa.BigInteger, description="租约过期时间，毫秒，过期后可被其他进程重新认领")
+    status: str = Field(default="claimed", description="状态 claimed/released/published", sa_type=sa.String(length=16))
+    create_at: int = Field(default_factory=lambda: int(time.time()*1000), sa_type=sa.BigInteger)
+    update_at: int = Field(default_factory=lambda: int(time.time()*1000), sa_type=sa.BigInteger)
+
+class ProductSyncState(BaseModel, table=True):
+    """商品同步状态"""
+    __tablename__ = "product_sync_state"
+
+    sync_key: str = Field(index=True, description="同步任务标识", sa_type=sa.String(length=64))
+    watermark: int = Field(default=0, sa_type=sa.BigInteger, description="已同步商品的最大更新时间(item_update_time)，毫秒")
+    last_full_sync_at: int = Field(default=0, sa_type=sa.BigInteger, description="上次全量同步完成时间，毫秒")
+    resume_page: int = Field(default=0, description="未完成的全量同步最后提交的页码，0 表示无需续传")
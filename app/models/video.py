@@ -102,3 +102,21 @@ class Video(VideoMataData, VideoCommonData, BaseModel, table=True):
     is_enabled: bool = Field(default=True, description="是否可用")
     publish_cnt: int = Field(default=0, description="发布次数")
 
+
+
+class XhsMediaUpload(BaseModel, table=True):
+    """小红书媒体分片上传状态，用于中断后续传"""
+    __tablename__ = "xhs_media_upload"
+
+    source_key: str = Field(index=True, description="源文件标识，优先使用文件哈希，否则为OSS对象键名", sa_type=sa.String(length=512))
+    scene: str = Field(default="video", description="上传场景", sa_type=sa.String(length=16))
+    upload_addr: str = Field(description="COS上传地址", sa_type=sa.String(length=256))
+    file_id: str = Field(index=True, description="小红书文件ID", sa_type=sa.String(length=256))
+    upload_id: str = Field(default="", description="COS分片上传ID", sa_type=sa.String(length=128))
+    token: str = Field(description="上传token", sa_type=sa.Text)
+    token_expire_at: int = Field(default=0, sa_type=sa.BigInteger, description="上传token过期时间，毫秒")
+    part_size: int = Field(default=0, description="分片大小（字节）")
+    total_parts: int = Field(default=0, description="分片总数")
+    parts: str = Field(default="{}", description="已上传分片 {分片序号: ETag}", sa_type=sa.Text)
+    status: str = Field(default="uploading", index=True, description="状态 uploading/completed/expired", sa_type=sa.String(length=16))
+    completed_at: int = Field(default=0, sa_type=sa.BigInteger, description="完成时间，毫秒")
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlmodel import Session, select, func
+import asyncio
 import math
 from datetime import datetime
 import sqlalchemy as sa
@@ -10,13 +11,17 @@ from app.auth.decorators import require_admin
 from app.internal.db import engine
 from app.models.product import Product, ProductArticle, ArticleStatus, ArticleVideoMapping
 from app.models.video import Video
-from app.services.oss_service import OSSService
+from app.services.oss_service import get_oss_service
+from app.services.thumbnail_service import ThumbnailService
+from app.services.publish_scheduler import notify_publish_scheduler
 from app.routers.admin import templates as shared_templates
 
 router = APIRouter(prefix="/admin", tags=["articles"])
 
 templates: Jinja2Templates = shared_templates
 
+thumbnail_service = ThumbnailService(get_oss_service())
+
 @router.get("/articles", response_class=HTMLResponse)
 async def list_articles(
     request: Request,
@@ -79,20 +84,13 @@ async def list_articles(
                 )
             ).all()
             
-            # 生成视频缩略图URL
-            oss_service = OSSService()
+            # 视频缩略图URL
+            thumb_map = thumbnail_service.get_urls([video for _, video in mappings if video], "w320")
             for mapping, video in mappings:
-                if video and oss_service.is_available():
-                    style = "video/snapshot,t_1000,f_jpg,w_320,m_fast"
-                    thumb_url = oss_service.bucket.sign_url(
-                        "GET", 
-                        video.oss_object_key, 
-                        3600, 
-                        params={"x-oss-process": style}
-                    )
+                if video:
                     video_map[mapping.article_id] = {
                         "video": video,
-                        "thumb_url": thumb_url
+                        "thumb_url": thumb_map[video.id]
                     }
 
         # 统计已发布与待发布数量
@@ -143,10 +141,7 @@ async def edit_article_form(article_id: int, request: Request, current_user: dic
             video = session.get(Video, mapping.video_id)
             if video:
                 current_video = video
-                oss_service = OSSService()
-                if oss_service.is_available():
-                    style = "video/snapshot,t_1000,f_jpg,w_320,m_fast"
-                    thumb_url = oss_service.bucket.sign_url("GET", video.oss_object_key, 3600, params={"x-oss-process": style})
+                thumb_url = thumbnail_service.get_url(video, "w320")
         
         # 过滤掉 published 状态
         available_statuses = [s.value for s in ArticleStatus if s != ArticleStatus.PUBLISHED]
@@ -229,6 +224,9 @@ async def edit_article(article_id: int, request: Request, current_user: dict = D
                 session.delete(mapping)
 
         session.commit()
+    
+    # 发布时间或状态可能已修改，唤醒发布调度器重新加载；Redis 发布是同步调用，放到线程中执行，不阻塞事件循环
+    await asyncio.to_thread(notify_publish_scheduler, article_id)
         
     return RedirectResponse(url="/admin/articles", status_code=302)
 
@@ -247,4 +245,47 @@ async def batch_delete_articles(ids: list[int], current_user: dict = Depends(req
         for art in articles:
             session.delete(art)
         session.commit()
-    return {"status": "success", "count": len(articles)} 
\ No newline at end of file
+    return {"status": "success", "count": len(articles)} 
+
+# 发布准点率统计
+@router.get("/articles/publish-stats")
+async def publish_stats(hours: int = 24, current_user: dict = Depends(require_admin())):
+    """统计最近 hours 小时内发布的文章相对预发布时间的延迟（秒）"""
+    now = int(datetime.now().timestamp() * 1000)
+    since = now - max(hours, 1) * 3600 * 1000
+    with Session(engine) as session:
+        rows = session.exec(
+            select(ProductArticle.pre_publish_time, ProductArticle.publish_time).where(
+                ProductArticle.status == ArticleStatus.PUBLISHED,
+                ProductArticle.pre_publish_time > 0,
+                ProductArticle.publish_time >= since,
+            )
+        ).all()
+        # 已到预发布时间仍未发布的文章
+        overdue = session.exec(
+            select(ProductArticle.pre_publish_time).where(
+                ProductArticle.status == ArticleStatus.PENDING_PUBLISH,
+                ProductArticle.pre_publish_time > 0,
+                ProductArticle.pre_publish_time <= now,
+                ProductArticle.publish_time == 0,
+            )
+        ).all()
+
+    lags = sorted((publish_time - pre_publish_time) / 1000 for pre_publish_time, publish_time in rows)
+
+    def percentile(p: float):
+        if not lags:
+            return None
+        return round(lags[min(len(lags) - 1, int(p * len(lags)))], 1)
+
+    return {
+        "hours": hours,
+        "published": len(lags),
+        "avg_lag_seconds": round(sum(lags) / len(lags), 1) if lags else None,
+        "p50_lag_seconds": percentile(0.5),
+        "p95_lag_seconds": percentile(0.95),
+        "max_lag_seconds": round(lags[-1], 1) if lags else None,
+        "within_60s": sum(1 for lag in lags if lag <= 60),
+        "overdue": len(overdue),
+        "max_overdue_seconds": round((now - min(overdue)) / 1000, 1) if overdue else None,
+    }
@@ -149,8 +149,8 @@ async def list_products_api(current_user: dict = Depends(require_admin())):
         } for p in products]
 
 @router.post("/products/sync")
-async def sync_products(background_tasks: BackgroundTasks, current_user: dict = Depends(require_admin())):
-    """同步商品数据"""
+async def sync_products(background_tasks: BackgroundTasks, full: bool = False, current_user: dict = Depends(require_admin())):
+    """同步商品数据，默认增量同步，full=true 时全量同步"""
     try:
         # 初始化商品服务
         product_service = ProductClient()
@@ -162,8 +162,8 @@ async def sync_products(background_tasks: BackgroundTasks, current_user: dict =
         )
         
         # 在后台任务中执行同步
-        background_tasks.add_task(fetch_products_task, product_service, logger)
-        return {"message": "商品同步任务已启动"}
+        background_tasks.add_task(fetch_products_task, product_service, logger, full_sync=full)
+        return {"message": f"商品{'全量' if full else '增量'}同步任务已启动"}
     except Exception as e:
         logger.error(f"同步商品数据失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
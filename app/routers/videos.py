@@ -5,15 +5,16 @@ import sys
 import math
 from typing import Optional
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status, Depends, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 from sqlmodel import Session, select, func
 import asyncio
 
 from app.services.video_service import VideoService
-from app.services.oss_service import OSSService
+from app.services.oss_service import get_oss_service
 from app.services.upload_service import UploadService
+from app.services.thumbnail_service import ThumbnailService
 from app.auth.decorators import require_admin
 from app.internal.db import engine
 from app.models.video import VideoMaterial, VideoStatus, Video
@@ -32,8 +33,9 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/admin/videos", tags=["videos"])
 
 # 服务实例
-video_service = VideoService(logger=logger)
-oss_service = OSSService(logger=logger)
+oss_service = get_oss_service(logger)
+thumbnail_service = ThumbnailService(oss_service, logger=logger)
+video_service = VideoService(logger=logger, thumbnail_service=thumbnail_service)
 upload_service = UploadService(oss_service=oss_service, video_service=video_service, logger=logger)
 
 templates: Jinja2Templates = shared_templates
@@ -72,12 +74,8 @@ async def list_videos(request: Request, page: int = 1, current_user: dict = Depe
             products = session.exec(select(Product).where(Product.item_id.in_(item_ids))).all()
             product_map = {p.item_id: p for p in products}
 
-        # 生成缩略图签名URL
-        thumb_map: dict[int,str] = {}
-        if oss_service.is_available():
-            for v in videos:
-                style = "video/snapshot,t_1000,f_jpg,w_320,m_fast"
-                thumb_map[v.id] = oss_service.bucket.sign_url('GET', v.oss_object_key, 3600, params={'x-oss-process': style})
+        # 缩略图地址，上传时已生成
+        thumb_map: dict[int,str] = thumbnail_service.get_urls(videos, "w320")
 
         return templates.TemplateResponse(
             "admin/videos.html",
@@ -108,11 +106,30 @@ async def play_video(video_id: int, current_user: dict = Depends(require_admin()
             raise HTTPException(500, "OSS 未配置")
 
         # object_key 就是表里保存的 oss_object_key
-        signed_url = oss_service.bucket.sign_url(
-            'GET', v.oss_object_key, expires=3600
-        )
+        signed_url = oss_service.sign_url(v.oss_object_key, expires=3600)
         return {"url": signed_url}
 
+@router.get("/thumbs/{file_hash}/{size}.jpg")
+async def get_thumbnail(file_hash: str, size: str, current_user: dict = Depends(require_admin())):
+    """
+    返回上传时生成的封面或缩略图，没有保存图片的历史视频重定向到 OSS 截帧地址
+    """
+    if not thumbnail_service.is_valid(file_hash, size):
+        raise HTTPException(404, "缩略图不存在")
+    path = await asyncio.to_thread(thumbnail_service.cached_path, file_hash, size)
+    if path:
+        return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
+
+    with Session(engine) as s:
+        v = s.exec(select(Video).where(Video.file_hash == file_hash)).first() \
+            or s.exec(select(VideoMaterial).where(VideoMaterial.file_hash == file_hash)).first()
+    if not v:
+        raise HTTPException(404, "缩略图不存在")
+    url = thumbnail_service.snapshot_url(v, size)
+    if not url:
+        return Response(status_code=404)
+    return RedirectResponse(url)
+
 # ------------------ 视频上传和管理API ------------------
 
 async def check_video_file(video_file: UploadFile) -> None:
@@ -132,27 +149,32 @@ async def check_video_file(video_file: UploadFile) -> None:
             detail="上传的文件必须是视频格式"
         )
 
-    # 检查文件大小
-    MAX_FILE_SIZE = 200 * 1024 * 1024  # 500MB in bytes
-    try:
-        size = 0
-        while chunk := await video_file.read(8192):  # 8KB chunks
-            size += len(chunk)
-            if size > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    detail=f"文件大小超过限制（最大500MB）"
-                )
-        # 重置文件指针
-        await video_file.seek(0)
-    except Exception as e:
-        if not isinstance(e, HTTPException):
-            logger.error(f"检查文件大小时出错: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="检查文件大小时出错"
-            )
-        raise e
+    # 检查文件大小：使用请求中声明的大小，不读取文件内容；实际大小在上传时逐块校验
+    max_size = oss_service.config.MAX_FILE_SIZE
+    if video_file.size is not None and video_file.size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"文件大小超过限制（最大{max_size // (1024 * 1024)}MB）"
+        )
+
+@router.post("/upload/precheck", response_model=dict)
+async def precheck_video_material(
+    file_hash: str = Form(..., description="客户端计算的文件SHA256哈希"),
+    file_size: int = Form(..., description="文件大小（字节）"),
+    filename: str = Form("", description="文件名"),
+    item_id: str = Form(..., description="商品ID"),
+    sku_id: str = Form(None, description="SKU ID"),
+    platform: str = Form("xiaohongshu", description="平台"),
+    source: str = Form("upload", description="来源"),
+    current_user: dict = Depends(require_admin())
+):
+    """上传前按哈希预检，相同文件已入库时直接复用，客户端不再发送文件内容"""
+    video_info = await upload_service.reuse_by_hash(
+        file_hash, file_size, item_id, sku_id or "", platform, source, filename, "process_video_material_file"
+    )
+    if not video_info:
+        return {"exists": False}
+    return {"exists": True, "video_material_id": video_info["id"], "video_material_info": video_info}
 
 @router.post("/upload", response_model=VideoMaterialUploadResponse)
 async def upload_video_material(
@@ -161,9 +183,10 @@ async def upload_video_material(
     sku_id: str = Form(None, description="SKU ID，如果不提供则使用item_id"),
     platform: str = Form("xiaohongshu", description="平台"),
     source: str = Form("upload", description="来源"),
+    file_hash: str = Form("", description="客户端计算的文件SHA256哈希，文件已入库时不再上传OSS"),
     current_user: dict = Depends(require_admin())
 ):
-    """上传视频素材文件并提取元数据保存到数据库"""
+    """上传视频素材文件并提取元数据保存到数据库，相同文件已入库时复用其OSS对象和元数据"""
     try:
         # 使用通用上传服务处理视频上传
         video_info, file_url, oss_object_key, file_size = await upload_service.process_video_upload(
@@ -173,7 +196,8 @@ async def upload_video_material(
             platform=platform,
             source=source,
             prefix="video/material/",
-            process_func="process_video_material_file"
+            process_func="process_video_material_file",
+            file_hash=file_hash
         )
         
         logger.info(f"视频素材上传成功: {video_file.filename}, 数据库ID: {video_info['id']}")
@@ -370,11 +394,7 @@ async def list_published_videos(request: Request, page: int = 1, item_id: str |
             product_map = {p.item_id: p for p in products}
 
         # 缩略图
-        thumb_map = {}
-        if oss_service.is_available():
-            for v in videos:
-                style = "video/snapshot,t_1000,f_jpg,w_320,m_fast"
-                thumb_map[v.id] = oss_service.bucket.sign_url("GET", v.oss_object_key, 3600, params={"x-oss-process": style})
+        thumb_map = thumbnail_service.get_urls(videos, "w320")
 
         return templates.TemplateResponse(
             "admin/published_videos.html",
@@ -394,12 +414,31 @@ async def list_published_videos(request: Request, page: int = 1, item_id: str |
             },
         )
 
+@router.post("/publish/precheck", response_model=dict)
+async def precheck_published_video(
+    file_hash: str = Form(..., description="客户端计算的文件SHA256哈希"),
+    file_size: int = Form(..., description="文件大小（字节）"),
+    filename: str = Form("", description="文件名"),
+    item_id: str = Form(..., description="商品ID"),
+    sku_id: str = Form(None, description="SKU ID"),
+    platform: str = Form("xiaohongshu", description="平台"),
+    current_user: dict = Depends(require_admin())
+):
+    """待发布视频上传前按哈希预检，相同文件已入库时直接复用，客户端不再发送文件内容"""
+    video_info = await upload_service.reuse_by_hash(
+        file_hash, file_size, item_id, sku_id, platform, "upload", filename, "process_video_file"
+    )
+    if not video_info:
+        return {"exists": False}
+    return {"exists": True, "video_id": video_info["id"]}
+
 @router.post("/publish/upload", response_model=dict)
 async def upload_published_video(
     video_files: list[UploadFile] = File(..., description="视频文件列表，字段名同为 video_files"),
     item_id: str = Form(..., description="商品ID"),
     sku_id: str = Form(None, description="SKU ID"),
     platform: str = Form("xiaohongshu", description="平台"),
+    file_hashes: list[str] = Form([], description="客户端计算的文件SHA256哈希，与 video_files 顺序一致，可省略"),
     current_user: dict = Depends(require_admin())
 ):
     """批量上传视频并存到 Video 表（待发布）。单次请求支持多个文件，协程并发处理。返回成功与失败列表"""
@@ -407,7 +446,7 @@ async def upload_published_video(
     if not video_files:
         raise HTTPException(status_code=400, detail="未选择文件")
 
-    async def handle_file(vf: UploadFile):
+    async def handle_file(vf: UploadFile, file_hash: str):
         try:
             video_info, _, _, _ = await upload_service.process_video_upload(
                 video_file=vf,
@@ -415,14 +454,16 @@ async def upload_published_video(
                 sku_id=sku_id,
                 platform=platform,
                 prefix="video/publish/",
-                process_func="process_video_file"
+                process_func="process_video_file",
+                file_hash=file_hash
             )
             return {"filename": vf.filename, "success": True, "video_id": video_info["id"]}
         except Exception as e:
             logger.error(f"视频上传失败 {vf.filename}: {str(e)}")
             return {"filename": vf.filename, "success": False, "error": str(e)}
 
-    results = await asyncio.gather(*(handle_file(f) for f in video_files))
+    hashes = file_hashes + [""] * (len(video_files) - len(file_hashes))
+    results = await asyncio.gather(*(handle_file(f, h) for f, h in zip(video_files, hashes)))
 
     success_cnt = sum(1 for r in results if r["success"])
     return {"success": True, "uploaded": success_cnt, "results": results}
@@ -473,9 +514,7 @@ async def play_published_video(video_id: int, current_user: dict = Depends(requi
             raise HTTPException(500, "OSS 未配置")
 
         # 使用 oss_object_key 而不是 file_id
-        signed_url = oss_service.bucket.sign_url(
-            'GET', v.oss_object_key, expires=3600
-        )
+        signed_url = oss_service.sign_url(v.oss_object_key, expires=3600)
         return {"url": signed_url}
 
 @router.get("/published/list")
@@ -487,17 +526,13 @@ async def list_published_videos_json(item_id: str | None = None, current_user: d
             query = query.where(Video.item_id == item_id, Video.is_enabled == True, Video.publish_cnt == 0)
         videos = session.exec(query.limit(500)).all()
 
-        oss_ok = oss_service.is_available()
+        thumb_map = thumbnail_service.get_urls(videos, "w160")
         result = []
         for v in videos:
-            thumb = ""
-            if oss_ok:
-                style = "video/snapshot,t_1000,f_jpg,w_160,m_fast"
-                thumb = oss_service.bucket.sign_url("GET", v.oss_object_key, 3600, params={"x-oss-process": style})
             result.append({
                 "id": v.id,
                 "item_id": v.item_id,
-                "thumb_url": thumb,
+                "thumb_url": thumb_map[v.id],
                 "is_enabled": v.is_enabled,
             })
         return result
\ No newline at end of file
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+历史重复视频整理脚本
+按 file_hash 找出内容相同但OSS对象不同的视频记录，报告可回收的存储空间；
+指定 --apply 时将同一文件的记录统一指向最早入库的OSS对象，并删除不再被引用的对象。
+视频记录本身保留（可能已被文章关联或发布），只合并OSS对象。
+
+用法:
+    python -m app.scripts.dedupe_videos            # 只报告
+    python -m app.scripts.dedupe_videos --apply    # 合并并删除多余的OSS对象
+"""
+import argparse
+import logging
+import sys
+import os
+import traceback
+import time
+from collections import defaultdict
+from typing import Dict, List, Union
+
+from sqlmodel import Session, select, func
+
+from app.internal.db import engine
+from app.models.video import Video, VideoMaterial
+from app.services.oss_service import OSSService
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from app.utils.logger import setup_logger
+except ImportError as e:
+    error_msg = f"导入模块失败: {str(e)}\n{traceback.format_exc()}"
+    print(error_msg, file=sys.stderr)
+    sys.exit(1)
+
+logger = setup_logger(
+    name='dedupe_videos',
+    log_file=None,
+    level=logging.INFO
+)
+
+VideoRow = Union[Video, VideoMaterial]
+
+
+def find_duplicate_hashes(session: Session) -> List[str]:
+    """两张表中OSS对象不止一个的文件哈希"""
+    keys_by_hash: Dict[str, set] = defaultdict(set)
+    for model_cls in (Video, VideoMaterial):
+        rows = session.exec(
+            select(model_cls.file_hash, model_cls.oss_object_key)
+            .where(model_cls.file_hash != "", model_cls.oss_object_key != "")
+            .group_by(model_cls.file_hash, model_cls.oss_object_key)
+        ).all()
+        for file_hash, object_key in rows:
+            keys_by_hash[file_hash].add(object_key)
+    return sorted(file_hash for file_hash, keys in keys_by_hash.items() if len(keys) > 1)
+
+
+def load_rows(session: Session, file_hash: str) -> List[VideoRow]:
+    """同一文件的全部记录，按入库时间排序"""
+    rows: List[VideoRow] = []
+    for model_cls in (Video, VideoMaterial):
+        rows.extend(session.exec(
+            select(model_cls).where(model_cls.file_hash == file_hash, model_cls.oss_object_key != "")
+        ).all())
+    return sorted(rows, key=lambda row: (row.create_at, row.id))
+
+
+def is_referenced(session: Session, object_key: str) -> bool:
+    """OSS对象是否仍被任一记录引用"""
+    for model_cls in (Video, VideoMaterial):
+        count = session.exec(select(func.count(model_cls.id)).where(model_cls.oss_object_key == object_key)).one()
+        if count:
+            return True
+    return False
+
+
+def dedupe(apply: bool):
+    oss_service = OSSService(logger=logger)
+    if apply and not oss_service.is_available():
+        logger.error("OSS不可用，无法合并")
+        sys.exit(1)
+
+    total_objects = 0
+    total_bytes = 0
+    with Session(engine) as session:
+        hashes = find_duplicate_hashes(session)
+        logger.info(f"发现 {len(hashes)} 个文件存在多个OSS对象")
+
+        for file_hash in hashes:
+            rows = load_rows(session, file_hash)
+            canonical = rows[0]
+            if apply and not oss_service.bucket.object_exists(canonical.oss_object_key):
+                # 最早的对象已不存在时选用仍存在的对象
+                existing = [row for row in rows if oss_service.bucket.object_exists(row.oss_object_key)]
+                if not existing:
+                    logger.warning(f"{file_hash} 的OSS对象均不存在，跳过")
+                    continue
+                canonical = existing[0]
+
+            duplicates = {row.oss_object_key: row.file_size for row in rows if row.oss_object_key != canonical.oss_object_key}
+            total_objects += len(duplicates)
+            total_bytes += sum(duplicates.values())
+            logger.info(
+                f"{file_hash}: {len(rows)} 条记录, 保留 {canonical.oss_object_key}, "
+                f"多余对象 {len(duplicates)} 个: {list(duplicates)}"
+            )
+            if not apply:
+                continue
+
+            now = int(time.time() * 1000)
+            for row in rows:
+                if row.oss_object_key != canonical.oss_object_key:
+                    row.oss_object_key = canonical.oss_object_key
+                    row.url = canonical.url
+                    row.update_at = now
+                    session.add(row)
+            session.commit()
+
+            for object_key in duplicates:
+                if is_referenced(session, object_key):
+                    continue
+                oss_service.delete_file(object_key)
+
+    action = "已回收" if apply else "可回收"
+    logger.info(f"{action} {total_objects} 个OSS对象, {total_bytes / 1024 / 1024:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按文件哈希合并重复的视频OSS对象")
+    parser.add_argument("--apply", action="store_true", help="合并记录并删除多余的OSS对象，不指定时只报告")
+    args = parser.parse_args()
+    dedupe(args.apply)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logger.error(f"Main function failed: {str(e)}\n{traceback.format_exc()}")
+        sys.exit(1)
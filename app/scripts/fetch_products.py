@@ -4,22 +4,24 @@ import os
 from datetime import datetime
 import pytz
 import random
-from sqlmodel import Session, select
+from sqlmodel import Session
 import traceback
 import time
 import logging
 
-from app.models.product import ProductStatus
 from app.utils.logger import setup_logger
 from app.utils.scheduler import TaskScheduler
 from app.services.xiaohongshu.product_client import ProductClient
+from app.services.product_sync_service import ProductSyncService
 from app.config.auth_config import AuthConfig
-from app.models.product import Product
 from app.internal.db import engine
 
 # 获取环境信息
 SERVER_ENV = os.environ.get('SERVER_ENVIRONMENT', 'LOCAL')
 
+# 每日全量同步时间
+FULL_SYNC_TIME = os.environ.get('PRODUCT_FULL_SYNC_TIME', '03:30')
+
 # 设置日志记录器
 try:
     logger = setup_logger(
@@ -42,106 +44,62 @@ except Exception as e:
     logger.error(error_msg)
     sys.exit(1)
 
-def save_result(result: dict, logger):
-    """保存结果到数据库
+# 每页商品数量
+PAGE_SIZE = 20
+# 允许的连续失败次数
+MAX_CONSECUTIVE_FAILURES = 5
+# 已知总页数后每批并发请求的页数，请求频率仍由限流器控制
+PAGE_CONCURRENCY = int(os.environ.get('PRODUCT_PAGE_CONCURRENCY', '3'))
+
+
+def iter_product_pages(product_service: ProductClient, logger, sort_field: str, start_page: int = 1):
+    """逐页拉取商品列表
     
     Args:
-        result: API响应结果
+        product_service: 商品API客户端
         logger: 日志记录器
-    """
-    try:
-        if not result.get('success') or 'data' not in result or 'items' not in result['data']:
-            logger.warning("无效的API响应结果")
-            return
-            
-        items = result['data']['items']
-        products_to_save = []
-        add_cnt = 0
-        update_cnt = 0
-        
-        # 将API响应数据转换为Product模型实例
-        for item in items:
-            try:
-                product = Product.from_api_response(item)
-                products_to_save.append(product)
-            except Exception as e:
-                logger.error(f"处理商品数据时出错: {str(e)}, 商品数据: {item}")
-                continue
+        sort_field: 排序字段，按该字段倒序翻页
+        start_page: 起始页码
         
-        # 保存到数据库
-        with Session(engine) as session:
-            for product in products_to_save:
-                # 检查是否已存在
-                stmt = select(Product).where(Product.item_id == product.item_id)
-                existing_product = session.exec(stmt).first()
-                if existing_product:
-                    # 更新现有记录
-                    existing_product.item_name = product.item_name
-                    existing_product.desc = product.desc
-                    existing_product.min_price = product.min_price
-                    existing_product.max_price = product.max_price
-                    existing_product.update_time = datetime.now()
-                    existing_product.buyable = product.buyable
-                    existing_product.images = product.images
-                    existing_product.deleted = product.deleted
-                    existing_product.total_stock = product.total_stock
-                    existing_product.first_sku_id = product.first_sku_id
-                    logger.info(f"更新商品: {product.item_id}")
-                    if not product.buyable:
-                        existing_product.status = ProductStatus.UNMANAGED
-                    # else:
-                    #     existing_product.status = ProductStatus.MANAGED
-                    update_cnt += 1
-                elif product.buyable:
-                    # 添加新记录
-                    # product.status = ProductStatus.MANAGED
-                    session.add(product)
-                    logger.info(f"新增商品: {product.item_id}")
-                    add_cnt += 1
-            session.commit()
-            
-        logger.info(f"成功保存 {len(products_to_save)} 个商品到数据库，新增 {add_cnt} 个，更新 {update_cnt} 个")
+    Yields:
+        (页码, 商品列表)，请求失败的页商品列表为 None
         
-    except Exception as e:
-        error_msg = f"保存结果到数据库失败: {str(e)}\n{traceback.format_exc()}"
-        logger.error(error_msg)
-
-def fetch_products_task(product_service: ProductClient, logger):
-    """获取商品列表任务"""
-    try:
-        current_time = datetime.now(pytz.timezone(settings.TIMEZONE)).strftime("%Y-%m-%d %H:%M:%S")
-        message = f"[{SERVER_ENV}] 开始获取商品列表任务 at {current_time}"
-        logger.info(message)
+    Raises:
+        RuntimeError: 连续失败次数达到上限
+    """
+    page = start_page
+    total_pages = None
+    consecutive_failures = 0
+    
+    while True:
+        # 首页单独请求以获取总数，之后按批并发请求
+        if total_pages is None:
+            pages = [page]
+        else:
+            pages = list(range(page, min(page + PAGE_CONCURRENCY, total_pages + 1)))
         
-        page = 1
-        page_size = 20
-        total_products = []
-        total_pages = None
-        max_failures = 5  # 允许的连续失败次数
-        consecutive_failures = 0
-        
-        while True:
-            # 搜索商品列表
-            response = product_service.search_products(
-                page_no=page,
-                page_size=page_size,
-                sort_field="create_time",
+        # 搜索商品列表
+        responses = product_service.map([
+            product_service.build_search_request(
+                page_no=page_no,
+                page_size=PAGE_SIZE,
+                sort_field=sort_field,
                 order="desc",
                 card_type=1,
                 is_channel=False
             )
-            
+            for page_no in pages
+        ])
+        
+        for page_no, response in zip(pages, responses):
             # 检查响应是否成功
             if not response.get('success') or 'data' not in response:
-                logger.error(f"第 {page} 页请求失败")
+                logger.error(f"第 {page_no} 页请求失败")
                 consecutive_failures += 1
-                if consecutive_failures >= max_failures:
-                    logger.error(f"连续 {consecutive_failures} 页请求失败，终止任务")
-                    break
-                # 继续下一页，或也可以重试当前页；这里选择跳过当前页
-                page += 1
-                # 随机短暂休眠，避免瞬时连续请求
-                time.sleep(random.randint(1,3))
+                if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    raise RuntimeError(f"连续 {consecutive_failures} 页请求失败，终止任务")
+                # 跳过当前页继续下一页
+                yield page_no, None
                 continue
             
             # 成功获取后重置失败计数
@@ -150,48 +108,143 @@ def fetch_products_task(product_service: ProductClient, logger):
             # 获取当前页的商品
             items = response['data'].get('items', [])
             if not items:
-                break
-                
-            # 第一页时获取总数，计算总页数
-            if page == 1:
+                return
+            
+            # 首次成功时获取总数，计算总页数
+            if total_pages is None:
                 total = response['data'].get('total', 0)
-                total_pages = (total + page_size - 1) // page_size
+                total_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
                 logger.info(f"商品总数: {total}, 总页数: {total_pages}")
             
-            # 收集商品数据
-            total_products.extend(items)
-            logger.info(f"已获取第 {page} 页数据，当前共 {len(total_products)} 个商品")
+            yield page_no, items
             
             # 判断是否还有下一页
-            if not total_pages or page >= total_pages:
-                break
+            if page_no >= total_pages:
+                return
+        
+        page = pages[-1] + 1
+
+
+def save_page(sync_service: ProductSyncService, page: int, items: list, full_sync: bool) -> dict:
+    """在独立事务中保存一页商品，全量同步时同时记录续传页码
+    
+    Args:
+        sync_service: 商品同步服务
+        page: 续传页码，下次从其后一页继续；之前有页面失败时为失败页的前一页
+        items: 当前页商品数据
+        full_sync: 是否全量同步
+        
+    Returns:
+        统计信息，包含 added/updated/unchanged/skipped 数量
+    """
+    with Session(engine) as session:
+        stats = sync_service.bulk_upsert(session, items)
+        if full_sync:
+            state = sync_service.get_state(session)
+            state.resume_page = page
+            sync_service.save_state(session, state)
+        else:
+            session.commit()
+    return stats
+
+
+def fetch_products_task(product_service: ProductClient, logger, full_sync: bool = False):
+    """获取商品列表任务
+    
+    每页拉取后立即解析入库并提交，内存占用与商品总数无关。
+    
+    Args:
+        product_service: 商品API客户端
+        logger: 日志记录器
+        full_sync: 是否全量同步。增量同步按更新时间倒序翻页，遇到早于上次水位的商品即停止；
+                   没有水位时自动执行全量同步。全量同步中断后，下次从最后提交的页继续
+    """
+    try:
+        current_time = datetime.now(pytz.timezone(settings.TIMEZONE)).strftime("%Y-%m-%d %H:%M:%S")
+        
+        # 读取上次同步水位
+        sync_service = ProductSyncService(logger=logger)
+        with Session(engine) as session:
+            state = sync_service.get_state(session)
+            watermark, resume_page = state.watermark, state.resume_page
+        if not watermark:
+            full_sync = True
+        mode = "全量" if full_sync else "增量"
+        start_page = resume_page + 1 if full_sync and resume_page else 1
+        
+        message = f"[{SERVER_ENV}] 开始{mode}获取商品列表任务 at {current_time}, 水位: {watermark}, 起始页: {start_page}"
+        logger.info(message)
+        
+        totals = {"added": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        fetched_count = 0
+        failed_pages = 0
+        # 第一个失败的页码，续传页码不越过该页，中断后续传时会重新拉取
+        first_failed_page = None
+        max_update_time = watermark
+        completed = False
+        
+        try:
+            pages = iter_product_pages(
+                product_service, logger,
+                sort_field="create_time" if full_sync else "update_time",
+                start_page=start_page
+            )
+            for page, items in pages:
+                if items is None:
+                    failed_pages += 1
+                    if first_failed_page is None:
+                        first_failed_page = page
+                    continue
+                
+                # 增量同步只保留不早于水位的商品，出现更早的商品说明后续页面都已同步过
+                reached_watermark = False
+                if not full_sync:
+                    fresh_items = [item for item in items if item.get('update_time', 0) >= watermark]
+                    reached_watermark = len(fresh_items) < len(items)
+                    items = fresh_items
+                
+                resume_at = page if first_failed_page is None else min(first_failed_page - 1, page)
+                stats = save_page(sync_service, resume_at, items, full_sync)
+                for key in totals:
+                    totals[key] += stats[key]
+                fetched_count += len(items)
+                max_update_time = max([max_update_time] + [item.get('update_time', 0) for item in items])
+                logger.info(f"已保存第 {page} 页数据，本次共 {fetched_count} 个商品")
                 
-            page += 1
-            # 添加随机延迟，避免请求过于频繁
-            time.sleep(random.randint(1, 3))
+                if reached_watermark:
+                    logger.info(f"第 {page} 页已到达水位 {watermark}，停止翻页")
+                    break
+            completed = True
+        except RuntimeError as e:
+            logger.error(f"{str(e)}，已提交的页面保留，下次全量同步将从断点继续")
         
         # 打印结果摘要
-        logger.info("\n=== 搜索结果 ===")
-        logger.info(f"状态: 成功")
-        logger.info(f"总页数: {total_pages}")
-        logger.info(f"总商品数: {len(total_products)}")
-        
-        # 构造完整的响应数据
-        complete_response = {
-            'success': True,
-            'code': 200,
-            'msg': 'ok',
-            'data': {
-                'total': len(total_products),
-                'items': total_products
-            }
-        }
-        
-        # 保存结果到数据库
-        save_result(complete_response, logger)
+        logger.info("\n=== 同步结果 ===")
+        logger.info(f"状态: {'完成' if completed else '中断'}")
+        logger.info(f"同步方式: {mode}")
+        logger.info(f"失败页数: {failed_pages}")
+        logger.info(f"总商品数: {fetched_count}")
+        logger.info(f"新增 {totals['added']} 个，更新 {totals['updated']} 个，未变化 {totals['unchanged']} 个")
+        
+        if completed:
+            with Session(engine) as session:
+                state = sync_service.get_state(session)
+                if full_sync:
+                    # 续传时前面的页面由上一次运行提交，水位以库中最大更新时间为准
+                    state.resume_page = 0
+                    max_update_time = max(max_update_time, sync_service.max_item_update_time(session))
+                    if not failed_pages:
+                        state.last_full_sync_at = int(time.time() * 1000)
+                # 所有页面都成功保存后才推进水位，否则下次同步会漏掉失败页中的商品
+                if not failed_pages:
+                    state.watermark = max(state.watermark, max_update_time)
+                    logger.info(f"同步水位更新为: {state.watermark}")
+                else:
+                    logger.warning(f"有 {failed_pages} 页请求失败，本次不更新同步水位")
+                sync_service.save_state(session, state)
         
         logger.info("=" * 60)
-        logger.info(f"🎉 本次任务完成，成功获取 {len(total_products)} 个商品信息")
+        logger.info(f"🎉 本次任务完成，成功获取 {fetched_count} 个商品信息")
         logger.info("=" * 60)
         
     except Exception as e:
@@ -214,9 +267,10 @@ def main():
         # 添加每分钟执行的任务
         # scheduler.add_minute_task(fetch_products_task, product_service, logger)
         scheduler.add_hourly_task(fetch_products_task, random.randint(0, 15), product_service, logger)
-
+        # 每天低峰期执行一次全量同步，校正增量同步可能遗漏的商品
+        scheduler.add_daily_task(fetch_products_task, FULL_SYNC_TIME, product_service, logger, full_sync=True)
         
-        logger.info("已添加每小时获取商品列表的定时任务")
+        logger.info(f"已添加每小时增量获取商品列表、每天 {FULL_SYNC_TIME} 全量同步的定时任务")
         
         # 启动调度器
         scheduler.start()
@@ -23,6 +23,9 @@ from app.services.ai_service import DeepSeekAIService
 from app.utils.logger import setup_logger
 from app.utils.scheduler import TaskScheduler
 from app.models.publish_config import PublishConfig
+from app.services.xiaohongshu.xiaohongshu_client import XiaohongshuClient
+from app.services.xiaohongshu.topic_cache import TopicCache
+from app.services.publish_scheduler import notify_publish_scheduler
 
 # 设置日志
 base_logger = setup_logger(
@@ -42,6 +45,9 @@ class ProductArticleGenerator:
         self.error_count = 0
         self.max_concurrent = max_concurrent
         self.semaphore: asyncio.Semaphore | None = None
+        # 本轮生成文章用到的标签，任务结束后预热话题缓存
+        self.generated_tags: set[str] = set()
+        self.topic_cache: TopicCache | None = None
     
     async def get_products_needing_articles(self, session) -> Tuple[List[Product], int, dict]:
         """
@@ -175,6 +181,7 @@ class ProductArticleGenerator:
                 session.add(article_video_mapping)
             
             self.logger.info(f"文章已保存到数据库，ID: {article_id}, 商品: {product_data['item_id']}")
+            self.generated_tags.update(tag for tag in article_content.get("tags", "").split(",") if tag)
             return True
             
         except Exception as e:
@@ -289,6 +296,7 @@ class ProductArticleGenerator:
                 self.processed_count = 0
                 self.generated_count = 0
                 self.error_count = 0
+                self.generated_tags = set()
                 
                 # 获取需要生成文章的商品
                 products, existing_count, product_videos = await self.get_products_needing_articles(session)
@@ -340,9 +348,28 @@ class ProductArticleGenerator:
                     f"失败: {self.error_count}, "
                     f"耗时: {elapsed_time:.2f}秒"
                 )
+            
+            # 预热话题缓存，发布时无需再搜索话题
+            await self.warm_topic_cache()
+            
+            # 唤醒发布调度器加载新生成的文章
+            if self.generated_count:
+                await asyncio.to_thread(notify_publish_scheduler)
                 
         except Exception as e:
             self.logger.error(f"执行文章生成任务失败: {str(e)}\n{traceback.format_exc()}")
+    
+    async def warm_topic_cache(self):
+        """预热本轮生成文章用到的话题，阻塞调用放到线程中执行"""
+        if not self.generated_tags:
+            return
+        try:
+            if self.topic_cache is None:
+                self.topic_cache = TopicCache(XiaohongshuClient(logger=self.logger), self.logger)
+            fetched = await asyncio.to_thread(self.topic_cache.warm, sorted(self.generated_tags))
+            self.logger.info(f"话题缓存预热完成，标签 {len(self.generated_tags)} 个，新搜索 {fetched} 个")
+        except Exception as e:
+            self.logger.error(f"话题缓存预热失败: {str(e)}")
 
 async def main_async():
     """异步主函数"""
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+批量视频入库脚本
+绕过管理后台的单文件上传（nginx client_max_body_size 100MB），直接从本地目录或清单批量入库：
+多进程计算哈希，并发提取元数据和截帧，分片并行上传OSS，批量写入数据库。
+
+文件与商品的对应关系：
+    目录: <目录>/<item_id>/[<sku_id>/]*.mp4，指定 --item-id 时目录下所有文件都归属该商品
+    清单: CSV（表头 path,item_id,sku_id,name）或 JSONL（同名字段），path 为相对清单所在目录或绝对路径
+
+已完成的文件记录在状态文件中，中断后再次运行跳过已完成的文件；
+上传中断的文件按断点继续上传（OSS键名由文件哈希确定）。相同文件已入库时复用其OSS对象和元数据。
+
+用法:
+    python -m app.scripts.ingest_videos /data/videos --kind material --owner-id 1
+    python -m app.scripts.ingest_videos /data/videos/manifest.csv --kind publish --hash-workers 8
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import mimetypes
+import sys
+import os
+import traceback
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+from sqlmodel import Session
+
+from app.config.oss_config import OSSConfig
+from app.internal.db import engine
+from app.models.video import Video, VideoMaterial
+from app.services.oss_service import OSSService, STREAM_PART_SIZE
+from app.services.probe_service import ProbeService
+from app.services.thumbnail_service import ThumbnailService
+from app.services.video_service import VideoService
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from app.utils.logger import setup_logger
+except ImportError as e:
+    error_msg = f"导入模块失败: {str(e)}\n{traceback.format_exc()}"
+    print(error_msg, file=sys.stderr)
+    sys.exit(1)
+
+logger = setup_logger(
+    name='ingest_videos',
+    log_file=None,
+    level=logging.INFO
+)
+
+# 入库类型 -> (模型, OSS前缀)，与管理后台上传接口一致
+KINDS = {
+    "material": (VideoMaterial, "video/material/"),
+    "publish": (Video, "video/publish/"),
+}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class IngestEntry(NamedTuple):
+    """待入库的文件"""
+    path: str
+    item_id: str
+    sku_id: str
+    name: str
+
+
+def hash_file(path: str) -> Tuple[str, str, int]:
+    """计算文件SHA256哈希，在进程池中执行
+
+    Returns:
+        (路径, 哈希, 文件大小)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+    return path, hasher.hexdigest(), size
+
+
+def scan_directory(root: str, item_id: Optional[str], sku_id: Optional[str]) -> List[IngestEntry]:
+    """按目录结构确定文件归属的商品"""
+    entries = []
+    for dirpath, _, filenames in os.walk(root):
+        parts = os.path.relpath(dirpath, root).split(os.sep)
+        parts = [] if parts == ["."] else parts
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in OSSConfig.ALLOWED_VIDEO_EXTENSIONS:
+                continue
+            file_item_id = item_id or (parts[0] if parts else "")
+            file_sku_id = sku_id or (parts[1] if len(parts) > 1 else "")
+            if not file_item_id:
+                logger.warning(f"无法确定商品ID，跳过: {os.path.join(dirpath, filename)}")
+                continue
+            entries.append(IngestEntry(os.path.join(dirpath, filename), file_item_id, file_sku_id, filename))
+    return entries
+
+
+def read_manifest(manifest: str, item_id: Optional[str], sku_id: Optional[str]) -> List[IngestEntry]:
+    """读取CSV或JSONL清单"""
+    base_dir = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, "r", encoding="utf-8") as f:
+        if manifest.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    entries = []
+    for row in rows:
+        path = os.path.join(base_dir, row["path"])
+        file_item_id = item_id or row.get("item_id") or ""
+        if not file_item_id:
+            logger.warning(f"清单缺少商品ID，跳过: {path}")
+            continue
+        entries.append(IngestEntry(
+            path, file_item_id, sku_id or row.get("sku_id") or "", row.get("name") or os.path.basename(path)
+        ))
+    return entries
+
+
+def load_state(state_file: str) -> Set[str]:
+    """已完成入库的文件路径"""
+    if not os.path.exists(state_file):
+        return set()
+    with open(state_file, "r", encoding="utf-8") as f:
+        return {json.loads(line)["path"] for line in f if line.strip()}
+
+
+class BulkIngester:
+    """批量入库：每个不同的文件提取一次元数据、上传一次，同一文件的多个条目共用OSS对象"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.model_cls, prefix = KINDS[args.kind]
+        if os.getenv("SERVER_ENVIRONMENT") == "LOCAL":
+            prefix = "test/" + prefix
+        self.prefix = prefix
+        self.oss_service = OSSService(logger=logger)
+        self.video_service = VideoService(
+            logger=logger,
+            thumbnail_service=ThumbnailService(self.oss_service, logger=logger),
+            probe_service=ProbeService(max_workers=args.probe_workers, logger=logger),
+        )
+        self.stats = {"files": 0, "uploaded": 0, "reused": 0, "failed": 0, "bytes": 0}
+
+    def object_key(self, entry: IngestEntry, file_hash: str) -> str:
+        """OSS键名由文件哈希确定，中断后再次运行时上传到同一对象并从断点继续"""
+        return f"{self.prefix}{file_hash}{os.path.splitext(entry.path)[1].lower()}"
+
+    def row_kwargs(self, entry: IngestEntry) -> Dict[str, str]:
+        return dict(
+            item_id=entry.item_id,
+            sku_id=entry.sku_id,
+            platform=self.args.platform,
+            source=self.args.source,
+            owner_id=self.args.owner_id,
+            author_id=self.args.owner_id,
+            name=entry.name,
+        )
+
+    def ingest_group(self, entries: List[IngestEntry], file_hash: str, file_size: int
+                     ) -> List[Tuple[IngestEntry, Union[Video, VideoMaterial, None]]]:
+        """处理同一文件的所有条目
+
+        Returns:
+            (条目, 待写入的新记录)，复用已入库记录时为 None（reuse_video 已写入）
+        """
+        existing = self.video_service.find_by_hash(file_hash)
+        if existing:
+            for entry in entries:
+                self.video_service.reuse_video(existing, self.model_cls, **self.row_kwargs(entry))
+            return [(entry, None) for entry in entries]
+
+        first = entries[0]
+        metadata = self.video_service.extract_video_metadata(first.path, file_hash)
+        self.video_service.generate_thumbnails(first.path, metadata, file_hash)
+        object_key = self.object_key(first, file_hash)
+        file_url = self.oss_service.upload_local_file(
+            first.path, object_key, mimetypes.guess_type(first.path)[0],
+            file_hash=file_hash,
+            part_size=self.args.part_size * 1024 * 1024,
+            num_threads=self.args.part_threads,
+            checkpoint_dir=self.args.checkpoint_dir,
+        )
+        return [
+            (entry, self.video_service.build_video_model(
+                self.model_cls, metadata,
+                file_url=file_url,
+                file_extension=os.path.splitext(entry.path)[1].lower(),
+                oss_object_key=object_key,
+                file_size=file_size,
+                file_hash=file_hash,
+                **self.row_kwargs(entry)
+            ))
+            for entry in entries
+        ]
+
+    def hash_entries(self, entries: List[IngestEntry]) -> Dict[str, Tuple[str, int]]:
+        """多进程计算哈希，返回 路径 -> (哈希, 大小)"""
+        hashes = {}
+        paths = sorted({entry.path for entry in entries})
+        with ProcessPoolExecutor(max_workers=self.args.hash_workers) as pool:
+            futures = [pool.submit(hash_file, path) for path in paths]
+            for future in as_completed(futures):
+                try:
+                    path, file_hash, size = future.result()
+                    hashes[path] = (file_hash, size)
+                except Exception as e:
+                    logger.error(f"计算哈希失败: {str(e)}")
+        return hashes
+
+    def run(self, entries: List[IngestEntry], state_file: str):
+        done = load_state(state_file)
+        pending = [entry for entry in entries if entry.path not in done]
+        logger.info(f"共 {len(entries)} 个文件，已完成 {len(entries) - len(pending)} 个，待入库 {len(pending)} 个")
+        if not pending:
+            return
+
+        start = time.perf_counter()
+        hashes = self.hash_entries(pending)
+        logger.info(f"哈希计算完成: {len(hashes)} 个文件, 耗时 {time.perf_counter() - start:.1f} 秒")
+
+        groups: Dict[str, List[IngestEntry]] = {}
+        for entry in pending:
+            if entry.path not in hashes:
+                self.stats["failed"] += 1
+                continue
+            file_hash, size = hashes[entry.path]
+            if size > self.args.max_size * 1024 * 1024:
+                logger.warning(f"文件超过 {self.args.max_size}MB，跳过: {entry.path}")
+                self.stats["failed"] += 1
+                continue
+            groups.setdefault(file_hash, []).append(entry)
+
+        pending_rows: List[Tuple[IngestEntry, Union[Video, VideoMaterial]]] = []
+        with open(state_file, "a", encoding="utf-8") as state, \
+                ThreadPoolExecutor(max_workers=self.args.upload_workers) as pool:
+            futures = {
+                pool.submit(self.ingest_group, group, file_hash, hashes[group[0].path][1]): file_hash
+                for file_hash, group in groups.items()
+            }
+            for future in as_completed(futures):
+                file_hash = futures[future]
+                group = groups[file_hash]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logger.error(f"入库失败: {[entry.path for entry in group]}, {str(e)}")
+                    self.stats["failed"] += len(group)
+                    continue
+                size = hashes[group[0].path][1]
+                for entry, row in results:
+                    self.stats["files"] += 1
+                    if row is None:
+                        self.stats["reused"] += 1
+                        self.record(state, entry, file_hash)
+                    else:
+                        pending_rows.append((entry, row))
+                if results[0][1] is not None:
+                    self.stats["uploaded"] += 1
+                    self.stats["bytes"] += size
+                if len(pending_rows) >= self.args.batch_size:
+                    self.flush(pending_rows, state)
+                    self.report(start)
+            self.flush(pending_rows, state)
+        self.report(start, final=True)
+
+    def flush(self, pending_rows: List[Tuple[IngestEntry, Union[Video, VideoMaterial]]], state):
+        """批量写入数据库，写入成功后记录到状态文件"""
+        if not pending_rows:
+            return
+        with Session(engine, expire_on_commit=False) as session:
+            session.add_all([row for _, row in pending_rows])
+            session.commit()
+        for entry, row in pending_rows:
+            self.record(state, entry, row.file_hash)
+        logger.info(f"已写入 {len(pending_rows)} 条 {self.model_cls.__name__} 记录")
+        pending_rows.clear()
+
+    @staticmethod
+    def record(state, entry: IngestEntry, file_hash: str):
+        state.write(json.dumps({"path": entry.path, "file_hash": file_hash, "item_id": entry.item_id}, ensure_ascii=False) + "\n")
+        state.flush()
+
+    def report(self, start: float, final: bool = False):
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        stats = self.stats
+        logger.info(
+            f"{'入库完成' if final else '进度'}: 入库 {stats['files']} 个, 上传 {stats['uploaded']} 个, "
+            f"复用 {stats['reused']} 个, 失败 {stats['failed']} 个, 耗时 {elapsed:.1f} 秒, "
+            f"{stats['files'] / elapsed:.2f} 个/秒, {stats['bytes'] / 1024 / 1024 / elapsed:.1f}MB/秒"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量视频入库")
+    parser.add_argument("path", help="视频目录，或CSV/JSONL清单")
+    parser.add_argument("--kind", choices=sorted(KINDS), default="material", help="入库为视频素材(material)或发布视频(publish)")
+    parser.add_argument("--item-id", help="所有文件归属的商品ID，不指定时从目录名或清单读取")
+    parser.add_argument("--sku-id", help="所有文件归属的SKU ID")
+    parser.add_argument("--owner-id", default="", help="所有者ID")
+    parser.add_argument("--platform", default="xiaohongshu", help="平台")
+    parser.add_argument("--source", default="bulk", help="记录的来源字段")
+    parser.add_argument("--hash-workers", type=int, default=os.cpu_count() or 2, help="计算哈希的进程数")
+    parser.add_argument("--probe-workers", type=int, default=os.cpu_count() or 2, help="同时运行的 ffprobe 进程数")
+    parser.add_argument("--upload-workers", type=int, default=4, help="同时处理的文件数")
+    parser.add_argument("--part-threads", type=int, default=4, help="每个文件并行上传的分片数")
+    parser.add_argument("--part-size", type=int, default=STREAM_PART_SIZE // 1024 // 1024, help="分片大小（MB）")
+    parser.add_argument("--batch-size", type=int, default=50, help="每次写入数据库的记录数")
+    parser.add_argument("--max-size", type=int, default=OSSConfig.MAX_FILE_SIZE // 1024 // 1024, help="文件大小上限（MB）")
+    parser.add_argument("--state", help="状态文件，默认为目录或清单所在目录下的 .ingest-state.jsonl")
+    parser.add_argument("--checkpoint-dir", default=None, help="分片上传断点目录")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.path):
+        entries = scan_directory(args.path, args.item_id, args.sku_id)
+        state_dir = args.path
+    else:
+        entries = read_manifest(args.path, args.item_id, args.sku_id)
+        state_dir = os.path.dirname(os.path.abspath(args.path))
+    state_file = args.state or os.path.join(state_dir, ".ingest-state.jsonl")
+
+    ingester = BulkIngester(args)
+    if not ingester.oss_service.is_available():
+        logger.error("OSS不可用，请检查配置")
+        sys.exit(1)
+    ingester.run(entries, state_file)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logger.error(f"Main function failed: {str(e)}\n{traceback.format_exc()}")
+        sys.exit(1)
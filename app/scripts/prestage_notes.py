@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+笔记素材预上传脚本
+每分钟扫描即将到达预发布时间的文章，提前完成话题解析、视频和封面上传，
+到达发布时间时 send_note 只需发送一次笔记请求
+"""
+import logging
+import sys
+import os
+import traceback
+import time
+from typing import List, Tuple
+import sqlalchemy as sa
+from sqlmodel import Session, select
+from app.internal.db import engine
+from app.models.product import Product, ProductArticle, ArticleStatus, ArticlePublishLease
+from app.services.xiaohongshu.note_service import NoteService
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from app.utils.logger import setup_logger
+except ImportError as e:
+    error_msg = f"导入模块失败: {str(e)}\n{traceback.format_exc()}"
+    print(error_msg, file=sys.stderr)
+    sys.exit(1)
+
+# 获取环境信息
+SERVER_ENV = os.environ.get('SERVER_ENVIRONMENT', 'LOCAL')
+
+# 预上传提前量（分钟），需小于上传登记的复用有效期 XHS_UPLOAD_REUSE_TTL
+LOOKAHEAD_MINUTES = int(os.getenv("PRESTAGE_LOOKAHEAD_MINUTES", "30"))
+# 每轮最多预上传的文章数
+BATCH_SIZE = int(os.getenv("PRESTAGE_BATCH_SIZE", "10"))
+# 扫描间隔（秒）
+SCAN_INTERVAL = int(os.getenv("PRESTAGE_SCAN_INTERVAL", "60"))
+
+# 设置日志
+try:
+    logger = setup_logger(
+        name='prestage_notes',
+        log_file=None,  # 不输出到文件，让supervisor处理
+        level=logging.INFO
+    )
+except Exception as e:
+    error_msg = f"设置日志失败: {str(e)}\n{traceback.format_exc()}"
+    print(error_msg, file=sys.stderr)
+    sys.exit(1)
+
+logger.info(f"Starting prestage_notes in {SERVER_ENV} environment")
+
+
+def _query_due_articles(session: Session, current_time: int, deadline: int, cursor: Tuple[int, int]) -> List[ProductArticle]:
+    """按 (预发布时间, ID) 从游标之后取一批待预上传的文章
+
+    已到发布时间的文章交给发布服务处理；正被发布进程持有租约的文章跳过，避免与发布同时上传
+    """
+    cursor_time, cursor_id = cursor
+    leased = sa.exists().where(
+        ArticlePublishLease.article_id == ProductArticle.id,
+        ArticlePublishLease.status == "claimed",
+        ArticlePublishLease.lease_expire_at >= current_time
+    )
+    return session.exec(
+        select(ProductArticle).where(
+            ProductArticle.status == ArticleStatus.PENDING_PUBLISH,
+            ProductArticle.pre_publish_time > current_time,
+            ProductArticle.pre_publish_time <= deadline,
+            ProductArticle.publish_time == 0,
+            sa.or_(
+                ProductArticle.pre_publish_time > cursor_time,
+                sa.and_(ProductArticle.pre_publish_time == cursor_time, ProductArticle.id > cursor_id)
+            ),
+            ~leased
+        ).order_by(ProductArticle.pre_publish_time, ProductArticle.id).limit(BATCH_SIZE)
+    ).all()
+
+
+def prestage_due_articles(note_service: NoteService, cursor: Tuple[int, int] = (0, 0)) -> Tuple[int, int]:
+    """预上传提前量窗口内待发布文章的素材
+
+    Args:
+        note_service: 笔记服务
+        cursor: 上一轮处理到的 (预发布时间, 文章ID)，本轮从其后继续，
+            预上传失败或没有可用视频的文章不会一直占据每轮的前几条
+
+    Returns:
+        下一轮的游标，窗口内的文章已扫描完时回到开头
+    """
+    current_time = int(time.time() * 1000)
+    deadline = current_time + LOOKAHEAD_MINUTES * 60 * 1000
+
+    with Session(engine) as session:
+        articles = _query_due_articles(session, current_time, deadline, cursor)
+        logger.info(f"查询到{len(articles)}条 {LOOKAHEAD_MINUTES} 分钟内待发布的文章")
+
+        for article in articles:
+            try:
+                if note_service.is_staged(article.id):
+                    logger.debug(f"文章-【{article.id}】 素材已预上传，跳过")
+                    continue
+
+                product = session.exec(select(Product).where(Product.item_id == article.item_id)).first()
+                if not product:
+                    logger.error(f"文章 {article.id} 找不到关联的商品: {article.item_id}")
+                    continue
+
+                start = time.time()
+                video = note_service.stage_note(article, product.first_sku_id)
+                if not video:
+                    logger.info(f"文章-【{article.id}】 预上传跳过: 没有找到可用视频")
+                    continue
+                logger.info(f"文章-【{article.id}】 预上传完成，耗时 {time.time() - start:.1f} 秒，"
+                            f"距发布时间 {(article.pre_publish_time - current_time) / 1000:.0f} 秒")
+            except Exception as e:
+                logger.error(f"文章-{article.id} 预上传失败: {str(e)}")
+                continue
+
+    if len(articles) < BATCH_SIZE:
+        return 0, 0
+    return articles[-1].pre_publish_time, articles[-1].id
+
+
+def main():
+    """主函数"""
+    logger.info("笔记素材预上传服务启动")
+    # 各轮扫描共用一个服务实例，复用连接和上传许可池
+    note_service = NoteService(logger=logger)
+    cursor = (0, 0)
+    try:
+        while True:
+            try:
+                cursor = prestage_due_articles(note_service, cursor)
+            except Exception as e:
+                logger.error(f"预上传文章素材时发生错误: {str(e)}")
+
+            time.sleep(SCAN_INTERVAL)
+    finally:
+        note_service.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        error_msg = f"Main function failed: {str(e)}\n{traceback.format_exc()}"
+        logger.error(error_msg)
+        sys.exit(1)
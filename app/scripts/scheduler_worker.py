@@ -22,6 +22,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.internal.db import get_async_session
 from app.models.publish_config import PublishConfig
 from app.scripts.generate_product_articles import ProductArticleGenerator
+from app.scripts.dedupe_videos import dedupe
 from app.utils.logger import setup_logger
 
 # 设置日志
@@ -66,6 +67,13 @@ class SchedulerWorker:
             error_msg = f"执行定时任务失败: {str(e)}\n{traceback.format_exc()}"
             logger.error(error_msg)
     
+    async def report_duplicate_videos(self):
+        """报告内容相同但OSS对象不同的视频"""
+        try:
+            await asyncio.to_thread(dedupe, False)
+        except Exception as e:
+            logger.error(f"报告重复视频失败: {str(e)}\n{traceback.format_exc()}")
+    
     async def start(self):
         """启动调度器"""
         try:
@@ -79,6 +87,16 @@ class SchedulerWorker:
                 coalesce=True     # 如果错过执行时间，合并执行
             )
             
+            # 每天报告一次重复的视频OSS对象，合并需手动执行 dedupe_videos --apply
+            self.scheduler.add_job(
+                self.report_duplicate_videos,
+                CronTrigger(hour=4, minute=20),
+                id='report_duplicate_videos',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
             # 启动调度器
             self.scheduler.start()
             logger.info("调度器已启动，每分钟检查一次是否需要生成文章")
@@ -6,10 +6,16 @@ from datetime import datetime
 import pytz
 import traceback
 import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
 from sqlmodel import Session, select
 from app.internal.db import engine
 from app.models.product import ArticleVideoMapping, Product, ProductArticle, ArticleStatus
-from app.services.xiaohongshu.note_service import NoteService
+from app.models.video import Video
+from app.services.xiaohongshu.note_service import NoteService, AsyncNoteService
+from app.services.publish_scheduler import PublishScheduler
+from app.services.publish_lease import PublishLeaseManager
 from app.settings import load_settings
 
 # 添加项目根目录到 Python 路径
@@ -40,6 +46,16 @@ except Exception as e:
     sys.exit(1)
 
 logger.info(f"Starting send_note in {SERVER_ENV} environment")
+
+# 同时发布的文章数，到期文章较多时按此并发处理
+PUBLISH_CONCURRENCY = int(os.getenv("NOTE_PUBLISH_CONCURRENCY", "3"))
+# 发布租约时长（秒），进程崩溃后超过该时长文章可被其他进程重新认领
+PUBLISH_LEASE_SECONDS = int(os.getenv("NOTE_PUBLISH_LEASE_SECONDS", "600"))
+# 发布模式：async 使用异步笔记服务，单篇笔记的话题查询、视频和封面上传并发进行；thread 使用同步笔记服务
+PUBLISH_MODE = os.getenv("NOTE_PUBLISH_MODE", "async")
+
+# 发送笔记的函数，参数为 (文章, 商品SKU ID, 商品名称)，返回 (API响应, 视频)
+SendNote = Callable[[ProductArticle, str, str], Tuple[Dict[str, Any], Optional[Video]]]
 logger.info(f"Current PYTHONPATH: {os.environ.get('PYTHONPATH', 'Not set')}")
 logger.info(f"Current working directory: {os.getcwd()}")
 
@@ -52,97 +68,159 @@ except Exception as e:
     logger.error(error_msg)
     sys.exit(1)
 
-def process_pending_articles():
-    """处理待发布的文章"""
-    current_time = int(time.time() * 1000)
+def publish_article(send_note: SendNote, lease_manager: PublishLeaseManager, article_id: int) -> bool:
+    """
+    认领并发布一篇到期的文章，多个发布进程同时运行时同一篇文章只会被一个进程发布
+    
+    Args:
+        send_note: 发送笔记的函数，同步模式为 NoteService.send_note，异步模式提交到事件循环执行
+        lease_manager: 发布租约
+        article_id: 文章ID
+    
+    Returns:
+        bool: 是否处理完成，发布失败时返回 False 以便稍后重试
+    """
+    with lease_manager.hold(article_id) as token:
+        if token is None:
+            logger.info(f"文章 {article_id} 已被其他进程认领或无需发布，跳过")
+            return True
+        return _publish_claimed_article(send_note, lease_manager, article_id, token)
 
-    try:
-        note_service = NoteService(logger=logger)
-        
-        with Session(engine) as session:
-            # 查询预发布时间小于当前时间的文章，按预发布时间递增排序
-            query = select(ProductArticle).where(
-                ProductArticle.status == ArticleStatus.PENDING_PUBLISH,
-                ProductArticle.pre_publish_time > 0,  # 确保设置了预发布时间
-                ProductArticle.pre_publish_time <= current_time,  # 预发布时间已到
-                ProductArticle.publish_time == 0  # 尚未发布
-            ).order_by(ProductArticle.pre_publish_time).limit(5)
-            
-            # 查询5条数据
-            articles = session.exec(query).all()
+def _publish_claimed_article(send_note: SendNote, lease_manager: PublishLeaseManager, article_id: int, token: str) -> bool:
+    """发布已认领的文章"""
+    with Session(engine) as session:
+        article = session.get(ProductArticle, article_id)
+        current_time = int(time.time() * 1000)
+        # 调度期间文章可能被修改或删除，重新确认仍需发布
+        if (not article or article.status != ArticleStatus.PENDING_PUBLISH or article.publish_time != 0
+                or not 0 < article.pre_publish_time <= current_time):
+            logger.info(f"文章 {article_id} 已不需要发布，跳过")
+            return True
 
-            logger.info(f"查询到{len(articles)}条待发布文章")
+        product = None
+        try:
+            # 查询关联的商品
+            product = session.exec(select(Product).where(Product.item_id == article.item_id)).first()
+            if not product:
+                logger.error(f"文章 {article.id} 找不到关联的商品: {article.item_id}")
+                return False
+            
+            # 发送笔记
+            logger.info(f"开始发送文章 {article.id}， 商品 {product.item_id}， 标题 {article.title} 到小红书")
+            #TODO: 这里用了商品的名称，而不是sku的名称
+            response, video = send_note(article, product.first_sku_id, product.item_name)
             
-            for article in articles:
+            if response.get("success", False) and video:
+                # 记录实际发布时间，与预发布时间的差值即发布延迟
+                published_at = int(time.time() * 1000)
+                
+                # 更新文章状态
+                article.publish_time = published_at
+                article.status = ArticleStatus.PUBLISHED
+                
+                # 更新视频发布次数
+                video.publish_cnt += 1
+                
+                # 查询文章和视频关联是否存在
+                mapping = session.exec(select(ArticleVideoMapping).where(ArticleVideoMapping.article_id == article.id, ArticleVideoMapping.video_id == video.id)).first()
+                if not mapping:
+                    mapping = ArticleVideoMapping(
+                    article_id=article.id,
+                    video_id=video.id,
+                    status="published",
+                    publish_time=published_at
+                )
+                else:
+                    mapping.status = "published"
+                    mapping.publish_time = published_at
+                
+                # 保存所有更改，租约在同一事务中标记为已发布
+                if not lease_manager.mark_published(session, article.id, token):
+                    logger.error(f"文章 {article.id} 的租约在发布期间失效，仍记录本次发布结果")
+                session.add(video)
+                session.add(article)
+                session.add(mapping)
+                session.commit()
+                
+                logger.info(f"文章-【{article.id}】， 商品-【{product.item_id}】， 标题-【{article.title}】 发布成功，"
+                            f"延迟 {(published_at - article.pre_publish_time) / 1000:.1f} 秒")
+                return True
+            if not video:
+                logger.info(f"文章-【{article.id}】， 商品-【{product.item_id}】， 标题-【{article.title}】 发布终止: 没有找到可用视频")
+                return False
+            error_msg = response.get("message", "未知错误")
+            logger.error(f"文章-【{article.id}】， 商品-【{product.item_id}】， 标题-【{article.title}】 发布失败: {error_msg}")
+            return False
+            
+        except Exception as e:
+            logger.error(f"处理文章-{article.id}， 商品-{product.item_id if product else article.item_id}， 标题-{article.title} 时出错: {str(e)}")
+            return False
+
+def run_thread_mode():
+    """同步模式：到期文章在线程池中并发发布"""
+    note_service = NoteService(logger=logger)
+    scheduler = PublishScheduler(logger=logger)
+    lease_manager = PublishLeaseManager(lease_seconds=PUBLISH_LEASE_SECONDS, logger=logger)
+    
+    def on_done(article_id: int, future):
+        scheduler.done(article_id, future.exception() is None and future.result())
+    
+    try:
+        with ThreadPoolExecutor(max_workers=PUBLISH_CONCURRENCY, thread_name_prefix="publish") as executor:
+            while True:
                 try:
-                    # 查询关联的商品
-                    product = session.exec(select(Product).where(Product.item_id == article.item_id)).first()
-                    if not product:
-                        logger.error(f"文章 {article.id} 找不到关联的商品: {article.item_id}")
-                        continue
-                    
-                    # 发送笔记
-                    logger.info(f"开始发送文章 {article.id}， 商品 {product.item_id}， 标题 {article.title} 到小红书")
-                    #TODO: 这里用了商品的名称，而不是sku的名称
-                    response, video = note_service.send_note(article, product.first_sku_id, product.item_name)
-                    
-                    if response.get("success", False) and video:
-                        
-                        # 更新文章状态
-                        article.publish_time = current_time
-                        article.status = ArticleStatus.PUBLISHED
-                        
-                        # 更新视频发布次数
-                        video.publish_cnt += 1
-                        
-                        # 查询文章和视频关联是否存在
-                        mapping = session.exec(select(ArticleVideoMapping).where(ArticleVideoMapping.article_id == article.id, ArticleVideoMapping.video_id == video.id)).first()
-                        if not mapping:
-                            mapping = ArticleVideoMapping(
-                            article_id=article.id,
-                            video_id=video.id,
-                            status="published",
-                            publish_time=current_time
-                        )
-                        else:
-                            mapping.status = "published"
-                            mapping.publish_time = current_time
-                        
-                        # 保存所有更改
-                        session.add(video)
-                        session.add(article)
-                        session.add(mapping)
-                        session.commit()
-                        
-                        logger.info(f"文章-【{article.id}】， 商品-【{product.item_id}】， 标题-【{article.title}】 发布成功")
-                    else:
-                        if not video:
-                            logger.info(f"文章-【{article.id}】， 商品-【{product.item_id}】， 标题-【{article.title}】 发布终止: 没有找到可用视频")
-                            continue
-                        error_msg = response.get("message", "未知错误")
-                        logger.error(f"文章-【{article.id}】， 商品-【{product.item_id}】， 标题-【{article.title}】 发布失败: {error_msg}")
-                    
+                    # 睡眠到最早的文章到期，后台修改发布时间时提前唤醒
+                    scheduler.wait()
+                    due = scheduler.pop_due()
+                    if due:
+                        logger.info(f"{len(due)} 篇文章到期: {due}")
+                    for article_id in due:
+                        future = executor.submit(publish_article, note_service.send_note, lease_manager, article_id)
+                        future.add_done_callback(lambda f, article_id=article_id: on_done(article_id, f))
                 except Exception as e:
-                    logger.error(f"处理文章-{article.id}， 商品-{product.item_id}， 标题-{article.title} 时出错: {str(e)}")
-                    continue
-            
-    except Exception as e:
-        logger.error(f"处理待发布文章时出错: {str(e)}")
+                    logger.error(f"处理文章时发生错误: {str(e)}")
+                    time.sleep(1)
     finally:
         note_service.close()
 
-def main():
-    """主函数"""
-    logger.info("笔记发送服务启动")
+async def run_async_mode():
+    """
+    异步模式：笔记的网络请求在事件循环中并发执行，同一账号的并发数受 XHS_NOTES_PER_ACCOUNT 限制；
+    认领、数据库读写等阻塞操作在线程池中执行
+    """
+    loop = asyncio.get_running_loop()
+    scheduler = PublishScheduler(logger=logger)
+    lease_manager = PublishLeaseManager(lease_seconds=PUBLISH_LEASE_SECONDS, logger=logger)
     
-    while True:
-        try:
-            process_pending_articles()
-        except Exception as e:
-            logger.error(f"处理文章时发生错误: {str(e)}")
+    async with AsyncNoteService(logger=logger) as note_service:
+        def send_note(article: ProductArticle, goods_id: str, goods_name: str):
+            # 在发布线程中调用，等待事件循环完成笔记发送
+            return asyncio.run_coroutine_threadsafe(note_service.send_note(article, goods_id, goods_name), loop).result()
         
-        # 等待一段时间再次检查
-        time.sleep(60)  # 每分钟检查一次
+        def on_done(article_id: int, future):
+            scheduler.done(article_id, not future.cancelled() and future.exception() is None and future.result())
+        
+        with ThreadPoolExecutor(max_workers=PUBLISH_CONCURRENCY, thread_name_prefix="publish") as executor:
+            while True:
+                try:
+                    await asyncio.to_thread(scheduler.wait)
+                    due = scheduler.pop_due()
+                    if due:
+                        logger.info(f"{len(due)} 篇文章到期: {due}")
+                    for article_id in due:
+                        future = loop.run_in_executor(executor, publish_article, send_note, lease_manager, article_id)
+                        future.add_done_callback(lambda f, article_id=article_id: on_done(article_id, f))
+                except Exception as e:
+                    logger.error(f"处理文章时发生错误: {str(e)}")
+                    await asyncio.sleep(1)
+
+def main():
+    """主函数"""
+    logger.info(f"笔记发送服务启动，模式 {PUBLISH_MODE}，并发数 {PUBLISH_CONCURRENCY}")
+    if PUBLISH_MODE == "async":
+        asyncio.run(run_async_mode())
+    else:
+        run_thread_mode()
 
 if __name__ == "__main__":
     try:
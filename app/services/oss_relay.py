@@ -0,0 +1,203 @@
+import io
+import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+# 单次从OSS响应读取的字节数
+READ_BLOCK_SIZE = 256 * 1024
+
+
+class RelayChunk:
+    """中继中的一个分片，数据保存在可复用的缓冲区中
+
+    使用完毕后必须调用 release() 归还缓冲区，否则下载线程会因没有空闲缓冲区而暂停。
+    """
+
+    def __init__(self, relay: "OSSPrefetchRelay", buffer: bytearray, size: int, part_number: int):
+        self._relay = relay
+        self._buffer = buffer
+        self.view = memoryview(buffer)[:size]
+        self.part_number = part_number
+        self._released = False
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def __bytes__(self) -> bytes:
+        return self.view.tobytes()
+
+    def reader(self) -> "ChunkReader":
+        """返回从头读取分片数据的文件对象，可作为 requests 的请求体，每次重试需要重新获取"""
+        return ChunkReader(self.view)
+
+    def release(self):
+        """归还缓冲区，可重复调用"""
+        if not self._released:
+            self._released = True
+            self.view.release()
+            self._relay._release_buffer(self._buffer)
+
+
+class ChunkReader(io.RawIOBase):
+    """基于 memoryview 的只读文件对象，读取时不复制整个分片"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = min(max(0, base + offset), len(self._view))
+        return self._pos
+
+    def readinto(self, b) -> int:
+        size = min(len(b), len(self._view) - self._pos)
+        b[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+
+class OSSPrefetchRelay:
+    """OSS分片预取中继
+
+    后台最多同时下载 prefetch 个后续范围到固定数量的缓冲区中，按分片顺序交给消费方，
+    消费方上传当前分片时后续分片已在下载。缓冲区循环复用：预取中的 prefetch 个分片
+    加上消费方持有的 in_flight 个分片，全部占满时下载暂停等待归还（背压）。
+    下载在开始迭代时启动，之前可以通过 skip() 跳过已上传的分片。
+    """
+
+    def __init__(self, bucket, object_key: str, file_size: int, chunk_size: int,
+                 prefetch: int = 2, in_flight: int = 1, logger: Optional[logging.Logger] = None):
+        """初始化中继
+
+        Args:
+            bucket: oss2.Bucket 实例
+            object_key: OSS对象键名
+            file_size: 文件大小
+            chunk_size: 分片大小
+            prefetch: 预取（并发下载）的分片数
+            in_flight: 消费方同时持有（正在上传）的最大分片数
+            logger: 日志记录器
+        """
+        self.bucket = bucket
+        self.object_key = object_key
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        self.prefetch = max(1, prefetch)
+        self.logger = logger or logging.getLogger(__name__)
+        self._closed = threading.Event()
+        # 按分片顺序存放下载任务，容量即预取深度
+        self._ready: queue.Queue = queue.Queue(maxsize=self.prefetch)
+        self._free: queue.Queue = queue.Queue()
+        buffer_count = min(self.prefetch + max(1, in_flight), max(1, -(-file_size // chunk_size)))
+        for _ in range(buffer_count):
+            self._free.put(bytearray(chunk_size))
+        self._skip_parts = set()
+        self._thread = threading.Thread(target=self._download, name="oss-relay", daemon=True)
+
+    def skip(self, part_numbers: Iterable[int]):
+        """跳过指定分片，不下载也不产出，需在开始迭代前调用"""
+        if self._thread.ident is not None:
+            raise RuntimeError("OSS relay already started")
+        self._skip_parts.update(part_numbers)
+
+    def _download(self):
+        """调度线程：获取空闲缓冲区，提交范围下载任务并按顺序放入就绪队列"""
+        position = 0
+        part_number = 0
+        with ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix="oss-relay-fetch") as pool:
+            while position < self.file_size and not self._closed.is_set():
+                size = min(self.chunk_size, self.file_size - position)
+                part_number += 1
+                if part_number in self._skip_parts:
+                    position += size
+                    continue
+                buffer = self._free.get()
+                if buffer is None or self._closed.is_set():
+                    return
+                self._put(pool.submit(self._fetch, buffer, position, size, part_number))
+                position += size
+            self._put(None)
+
+    def _fetch(self, buffer: bytearray, position: int, size: int, part_number: int) -> RelayChunk:
+        """下载一个范围并包装为分片"""
+        self._fill(buffer, position, size)
+        self.logger.debug(f"Prefetched part {part_number}, {position + size}/{self.file_size} bytes")
+        return RelayChunk(self, buffer, size, part_number)
+
+    def _fill(self, buffer: bytearray, position: int, size: int):
+        """将对象的一个范围读入缓冲区"""
+        result = self.bucket.get_object(self.object_key, byte_range=(position, position + size - 1))
+        view = memoryview(buffer)
+        filled = 0
+        try:
+            while filled < size:
+                data = result.read(min(READ_BLOCK_SIZE, size - filled))
+                if not data:
+                    raise IOError(f"OSS对象 {self.object_key} 在 {position + filled} 处提前结束")
+                view[filled:filled + len(data)] = data
+                filled += len(data)
+        finally:
+            view.release()
+            result.close()
+
+    def _put(self, item):
+        """放入就绪队列，关闭后不再阻塞"""
+        while not self._closed.is_set():
+            try:
+                self._ready.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _release_buffer(self, buffer: bytearray):
+        self._free.put(buffer)
+
+    def __iter__(self) -> Iterator[RelayChunk]:
+        if self._thread.ident is None and not self._closed.is_set():
+            self._thread.start()
+        while True:
+            future = self._ready.get()
+            if future is None:
+                return
+            try:
+                yield future.result()
+            except Exception as e:
+                self.logger.error(f"OSS分片预取失败: {str(e)}")
+                raise
+
+    def close(self):
+        """停止预取并释放未消费的分片"""
+        self._closed.set()
+        self._free.put(None)
+        while True:
+            try:
+                future = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(future, Future):
+                future.add_done_callback(
+                    lambda f: f.result().release() if not f.cancelled() and f.exception() is None else None
+                )
+        if self._thread.ident is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -2,13 +2,116 @@ import os
 import uuid
 import logging
 import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, Tuple, Generator
+from typing import Dict, Iterable, Optional, Tuple, Generator
 import oss2
 from app.config.oss_config import OSSConfig
+from app.services.oss_relay import OSSPrefetchRelay, ChunkReader
 import time
 import math
 
+# 流式上传的分片大小（字节），OSS要求除最后一片外不小于100KB
+STREAM_PART_SIZE = 5 * 1024 * 1024
+
+
+class OSSStreamingUpload:
+    """OSS流式分片上传
+
+    数据边写入边按 part_size 切片上传，只保留一个分片大小的缓冲区，
+    用于上传请求体等不能预先得到完整文件的场景。对象键名和 Content-Type 在开始时确定，
+    文件哈希在写完后才确定，只记录在视频表中，不写入对象元数据。
+    """
+
+    def __init__(self, bucket, object_key: str, content_type: str = None, part_size: int = STREAM_PART_SIZE,
+                 logger: Optional[logging.Logger] = None):
+        self.bucket = bucket
+        self.object_key = object_key
+        self.content_type = content_type or 'application/octet-stream'
+        self.part_size = part_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.upload_id = bucket.init_multipart_upload(
+            object_key, headers={'Content-Type': self.content_type}
+        ).upload_id
+        # 固定大小的分片缓冲区，上传时直接读取不复制
+        self._buffer = bytearray(part_size)
+        self._filled = 0
+        self._parts = []
+        self.size = 0
+
+    def write(self, data: bytes):
+        """写入数据，缓冲区满一个分片时上传"""
+        view = memoryview(data)
+        self.size += len(view)
+        while view:
+            size = min(len(view), self.part_size - self._filled)
+            self._buffer[self._filled:self._filled + size] = view[:size]
+            self._filled += size
+            view = view[size:]
+            if self._filled == self.part_size:
+                self._upload_part()
+
+    def _upload_part(self):
+        part_number = len(self._parts) + 1
+        with memoryview(self._buffer)[:self._filled] as part:
+            result = self.bucket.upload_part(self.object_key, self.upload_id, part_number, ChunkReader(part))
+        self._parts.append(oss2.models.PartInfo(part_number, result.etag, size=self._filled))
+        self._filled = 0
+        self.logger.debug(f"Uploaded part {part_number} of {self.object_key}, {self.size} bytes received")
+
+    def complete(self, file_hash: str = None):
+        """上传剩余数据并完成上传
+
+        file_hash 只用于日志，哈希已保存在视频记录中；OSS 修改元数据需要整对象服务端复制，
+        大文件代价与重新上传相当，因此不再写入 x-oss-meta-hash
+        """
+        if self._filled or not self._parts:
+            self._upload_part()
+        self.bucket.complete_multipart_upload(self.object_key, self.upload_id, self._parts)
+        self.logger.info(f"流式上传完成: {self.object_key}, {self.size} bytes, {len(self._parts)} parts, hash: {file_hash or 'none'}")
+
+    def abort(self):
+        """取消上传，删除已上传的分片"""
+        try:
+            self.bucket.abort_multipart_upload(self.object_key, self.upload_id)
+        except Exception as e:
+            self.logger.warning(f"取消分片上传失败: {self.object_key}, {str(e)}")
+
+
+class SignedUrlCache:
+    """签名URL缓存
+
+    过期时间向上对齐到 window 秒的整数倍，同一时间窗内对同一对象、同一处理样式的请求
+    得到同一个URL，键为 (对象键, 样式, 过期时间)。返回的URL剩余有效期不少于请求的 expires，
+    至多多出一个 window，列表页重复渲染时不再重复计算签名，URL 不变也便于浏览器缓存图片。
+    """
+
+    def __init__(self, window: int = 600, max_size: int = 10000):
+        self.window = max(1, window)
+        self.max_size = max_size
+        self._urls: "OrderedDict[Tuple[str, str, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def expire_at(self, expires: int) -> int:
+        """剩余有效期不少于 expires 秒的对齐过期时间（秒级时间戳）"""
+        deadline = int(time.time()) + expires
+        return (deadline // self.window + 1) * self.window
+
+    def get(self, key: Tuple[str, str, int]) -> Optional[str]:
+        with self._lock:
+            url = self._urls.get(key)
+            if url is not None:
+                self._urls.move_to_end(key)
+            return url
+
+    def put(self, key: Tuple[str, str, int], url: str):
+        with self._lock:
+            self._urls[key] = url
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.max_size:
+                self._urls.popitem(last=False)
+
 
 class OSSService:
     """阿里云OSS文件上传服务"""
@@ -47,11 +150,50 @@ class OSSService:
                     # 设置重试策略
                     b.max_retries = 3  # 最大重试次数
                     b.retry_delay = 1  # 初始重试延迟（秒）
+
+        self.url_cache = SignedUrlCache(self.config.SIGNED_URL_WINDOW, self.config.SIGNED_URL_CACHE_SIZE)
     
     def is_available(self) -> bool:
         """检查OSS服务是否可用"""
         return self.bucket is not None and self.internal_bucket is not None
     
+    def sign_url(self, object_key: str, expires: int = 3600, style: str = "") -> str:
+        """
+        生成对象的GET签名URL，同一时间窗内复用缓存的URL
+
+        Args:
+            object_key: 对象键名
+            expires: URL至少有效的秒数
+            style: 图片/视频处理样式（x-oss-process），为空时返回原文件地址
+
+        Returns:
+            签名URL，OSS不可用时返回空字符串
+        """
+        return self.sign_urls([object_key], expires, style).get(object_key, "")
+
+    def sign_urls(self, object_keys: Iterable[str], expires: int = 3600, style: str = "") -> Dict[str, str]:
+        """
+        批量生成签名URL，参数同 sign_url，只为缓存中没有的对象计算签名
+
+        Returns:
+            对象键名 -> 签名URL
+        """
+        if not self.is_available():
+            return {}
+        expire_at = self.url_cache.expire_at(expires)
+        params = {"x-oss-process": style} if style else None
+        urls = {}
+        for object_key in object_keys:
+            if not object_key or object_key in urls:
+                continue
+            key = (object_key, style, expire_at)
+            url = self.url_cache.get(key)
+            if url is None:
+                url = self.bucket.sign_url("GET", object_key, expire_at - int(time.time()), params=params)
+                self.url_cache.put(key, url)
+            urls[object_key] = url
+        return urls
+
     def calculate_file_hash(self, file_content: bytes) -> str:
         """
         计算文件内容的SHA256哈希值
@@ -160,6 +302,30 @@ class OSSService:
             self.logger.error(f"文件上传异常: {filename}, 错误: {str(e)}")
             return False, f"上传异常: {str(e)}", ""
     
+    def open_streaming_upload(self, filename: str, content_type: str = None, *, prefix: str = None) -> OSSStreamingUpload:
+        """
+        开始一个流式分片上传，文件内容写入返回对象，结束后调用 complete() 或 abort()
+        
+        Args:
+            filename: 原始文件名
+            content_type: 文件MIME类型
+            prefix: 文件路径前缀
+            
+        Returns:
+            OSSStreamingUpload: 流式上传，object_key 为生成的对象键名
+            
+        Raises:
+            ValueError: OSS不可用或文件格式不支持
+        """
+        if not self.is_available():
+            raise ValueError("OSS服务未配置或不可用")
+        _, ext = os.path.splitext(filename)
+        if ext.lower() not in self.config.ALLOWED_VIDEO_EXTENSIONS:
+            raise ValueError(f"不支持的文件格式: {ext}")
+        # 开始上传时文件哈希尚未确定，键名使用随机值代替哈希前缀
+        object_key = self.generate_object_key(filename, uuid.uuid4().hex, prefix=prefix)
+        return OSSStreamingUpload(self.internal_bucket, object_key, content_type, logger=self.logger)
+
     def upload_temp_file(self, temp_file_path: str, original_filename: str, content_type: str = None, *, prefix: str = None, file_hash: str = None) -> Tuple[bool, str, str]:
         """
         上传临时文件到OSS
@@ -182,6 +348,43 @@ class OSSService:
             self.logger.error(f"读取临时文件失败: {temp_file_path}, 错误: {str(e)}")
             return False, f"读取文件失败: {str(e)}", ""
     
+    def upload_local_file(self, file_path: str, object_key: str, content_type: str = None, *, file_hash: str = None,
+                          part_size: int = STREAM_PART_SIZE, num_threads: int = 4, checkpoint_dir: str = None) -> str:
+        """
+        分片并行上传本地文件，中断后再次上传相同文件到相同键名时从断点继续
+
+        Args:
+            file_path: 本地文件路径
+            object_key: 对象键名
+            content_type: 文件MIME类型
+            file_hash: 文件SHA256哈希值，存储在元数据中
+            part_size: 分片大小
+            num_threads: 并行上传的分片数
+            checkpoint_dir: 断点记录目录，默认 ~/.py-oss-upload
+
+        Returns:
+            公网访问URL
+
+        Raises:
+            ValueError: OSS不可用
+            oss2.exceptions.OssError: 上传失败
+        """
+        if not self.is_available():
+            raise ValueError("OSS服务未配置或不可用")
+        headers = {'Content-Type': content_type if content_type else 'application/octet-stream'}
+        if file_hash:
+            headers['x-oss-meta-hash'] = file_hash
+        store = oss2.ResumableStore(root=checkpoint_dir) if checkpoint_dir else None
+        oss2.resumable_upload(
+            self.internal_bucket, object_key, file_path,
+            store=store,
+            headers=headers,
+            multipart_threshold=part_size,
+            part_size=part_size,
+            num_threads=num_threads
+        )
+        return self.config.get_public_url(object_key)
+
     def delete_file(self, object_key: str) -> bool:
         """
         删除OSS中的文件
@@ -271,4 +474,68 @@ class OSSService:
         except Exception as e:
             error_msg = f"Failed to get file stream from OSS: {str(e)}"
             self.logger.error(error_msg)
-            raise 
\ No newline at end of file
+            raise
+
+    def get_file_relay(self, oss_object_key: str, chunk_size: int = 5 * 1024 * 1024, prefetch: Optional[int] = None,
+                       in_flight: int = 1) -> Tuple[OSSPrefetchRelay, dict]:
+        """
+        获取预取中继和文件信息，用于边下载边分块上传
+        
+        与 get_file_stream 不同，中继在后台提前下载后续分片，缓冲区循环复用，
+        消费方处理完每个分片后需要调用分片的 release()，使用完毕后调用中继的 close()
+        
+        Args:
+            oss_object_key: OSS对象的键名
+            chunk_size: 分块大小，默认5MB
+            prefetch: 预取的分片数，默认使用配置中的 PREFETCH_PARTS
+            in_flight: 消费方同时处理的分片数
+            
+        Returns:
+            Tuple[OSSPrefetchRelay, dict]: (预取中继, 文件信息)，文件信息同 get_file_stream，另含分块大小 chunk_size
+        """
+        try:
+            bucket = self.internal_bucket if os.getenv("SERVER_ENVIRONMENT") == "PROD" else self.bucket
+            if not bucket:
+                raise Exception("OSS bucket not configured")
+            
+            object_meta = bucket.head_object(oss_object_key)
+            file_size = object_meta.content_length
+            file_info = {
+                'size': file_size,
+                'content_type': object_meta.content_type,
+                'name': os.path.basename(oss_object_key),
+                'total_chunks': math.ceil(file_size / chunk_size),
+                'chunk_size': chunk_size
+            }
+            self.logger.info(f"Preparing to relay file: {oss_object_key}")
+            self.logger.info(f"File size: {file_size / 1024 / 1024:.2f}MB, Total chunks: {file_info['total_chunks']}")
+            
+            relay = OSSPrefetchRelay(
+                bucket, oss_object_key, file_size, chunk_size,
+                prefetch=self.config.PREFETCH_PARTS if prefetch is None else prefetch,
+                in_flight=in_flight,
+                logger=self.logger,
+            )
+            return relay, file_info
+        
+        except oss2.exceptions.NoSuchKey:
+            error_msg = f"File not found in OSS: {oss_object_key}"
+            self.logger.error(error_msg)
+            raise Exception(error_msg)
+        except Exception as e:
+            error_msg = f"Failed to get file relay from OSS: {str(e)}"
+            self.logger.error(error_msg)
+            raise
+
+
+_oss_service: Optional[OSSService] = None
+_oss_service_lock = threading.Lock()
+
+
+def get_oss_service(logger: Optional[logging.Logger] = None) -> OSSService:
+    """进程内共享的OSS服务，复用OSS客户端连接和签名URL缓存"""
+    global _oss_service
+    with _oss_service_lock:
+        if _oss_service is None:
+            _oss_service = OSSService(logger=logger)
+        return _oss_service
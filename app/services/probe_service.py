@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config.redis_config import RedisConfig
+
+# 只请求入库需要的字段，ffprobe 输出和解析量远小于 -show_format -show_streams
+PROBE_ENTRIES = (
+    "format=duration,bit_rate:"
+    "stream=codec_type,codec_name,width,height,bit_rate,r_frame_rate,channels,sample_rate,"
+    "color_primaries,color_space,color_transfer:"
+    "stream_tags=rotate"
+)
+
+# Redis 中元数据缓存的键前缀和有效期（秒）
+CACHE_KEY_PREFIX = "probe:meta:"
+CACHE_TTL = 30 * 24 * 3600
+
+VIDEO_FORMATS = {
+    'h264': 'AVC',
+    'h265': 'HEVC',
+    'hevc': 'HEVC',
+    'vp8': 'VP8',
+    'vp9': 'VP9',
+    'av1': 'AV1',
+    'mpeg4': 'MPEG4',
+    'mpeg2video': 'MPEG2',
+    'wmv3': 'WMV',
+    'flv1': 'FLV',
+    'theora': 'Theora'
+}
+
+AUDIO_FORMATS = {
+    'aac': 'AAC',
+    'mp3': 'MP3',
+    'opus': 'OPUS',
+    'vorbis': 'Vorbis',
+    'flac': 'FLAC',
+    'pcm_s16le': 'PCM',
+    'ac3': 'AC3',
+    'eac3': 'EAC3'
+}
+
+COLORS = {
+    'bt709': 'BT.709',
+    'bt.709': 'BT.709',
+    'rec709': 'BT.709',
+    'bt2020': 'BT.2020',
+    'bt.2020': 'BT.2020',
+    'rec2020': 'BT.2020',
+    'bt601': 'BT.601',
+    'bt.601': 'BT.601',
+    'rec601': 'BT.601',
+    'smpte170m': 'BT.601',
+    'smpte240m': 'SMPTE-240M',
+    'srgb': 'sRGB',
+    'displayp3': 'Display P3'
+}
+
+
+def _map_color(value: str) -> str:
+    """未知的色彩信息按 BT.709 处理"""
+    return COLORS.get((value or '').lower(), 'BT.709')
+
+
+def _frame_rate(value: str) -> int:
+    if '/' in value:
+        num, den = value.split('/')
+        return int(float(num) / float(den)) if float(den) != 0 else 0
+    return int(float(value or 0))
+
+
+def normalize_metadata(probe: Dict[str, Any]) -> Dict[str, Any]:
+    """将 ffprobe 输出转换为 VideoMataData 的字段
+
+    Args:
+        probe: ffprobe 的 JSON 输出，包含 format 和 streams
+
+    Returns:
+        与 VideoMataData 字段同名的元数据，时长单位为毫秒
+    """
+    format_info = probe.get('format') or {}
+    video_info: Dict[str, Any] = {}
+    audio_info: Dict[str, Any] = {}
+    for stream in probe.get('streams') or []:
+        if stream.get('codec_type') == 'video' and not video_info:
+            video_info = stream
+        elif stream.get('codec_type') == 'audio' and not audio_info:
+            audio_info = stream
+
+    duration_ms = int(float(format_info.get('duration') or 0) * 1000)
+    video_codec = video_info.get('codec_name', 'unknown')
+    audio_codec = audio_info.get('codec_name', 'unknown')
+    return {
+        'width': int(video_info.get('width') or 0),
+        'height': int(video_info.get('height') or 0),
+        'duration': duration_ms,
+        'format': VIDEO_FORMATS.get(video_codec.lower(), video_codec.upper()),
+        'bitrate': int(video_info.get('bit_rate') or 0),
+        'frame_rate': _frame_rate(video_info.get('r_frame_rate', '0/1')),
+        'colour_primaries': _map_color(video_info.get('color_primaries', '')),
+        'matrix_coefficients': _map_color(video_info.get('color_space', '')),
+        'transfer_characteristics': _map_color(video_info.get('color_transfer', '')),
+        'rotation': int((video_info.get('tags') or {}).get('rotate') or 0),
+        'audio_bitrate': int(audio_info.get('bit_rate') or 0),
+        'audio_channels': int(audio_info.get('channels') or 0),
+        'audio_duration': duration_ms,  # 通常音频和视频时长相同
+        'audio_format': AUDIO_FORMATS.get(audio_codec.lower(), audio_codec.upper()),
+        'audio_sampling_rate': int(audio_info.get('sample_rate') or 0),
+    }
+
+
+class ProbeError(Exception):
+    """ffprobe 无法解析输入"""
+
+
+class ProbeService:
+    """视频元数据探测服务
+
+    ffprobe 只输出入库需要的字段，同时运行的进程数受 max_workers 限制；
+    规范化后的元数据按 file_hash 缓存（进程内LRU，配置了Redis时跨进程共享），
+    相同文件再次入库时不再启动 ffprobe。输入可以是本地文件、签名URL（ffprobe 按需发起范围请求），
+    或文件开头的一段字节（moov 在文件开头时足以解析）。
+    """
+
+    def __init__(self, max_workers: int = 4, cache_size: int = 1024, timeout: int = 60,
+                 logger: Optional[logging.Logger] = None):
+        """初始化
+
+        Args:
+            max_workers: 同时运行的 ffprobe 进程数
+            cache_size: 进程内缓存的元数据条数
+            timeout: 单次探测超时（秒）
+            logger: 日志记录器
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self.timeout = timeout
+        self.ffprobe = shutil.which("ffprobe") or "ffprobe"
+        self._slots = threading.BoundedSemaphore(max(1, max_workers))
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._redis = None
+        if RedisConfig.is_configured():
+            import redis
+
+            self._redis = redis.Redis.from_url(RedisConfig.get_url())
+
+    def get_cached(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """查询缓存的元数据"""
+        if not file_hash:
+            return None
+        with self._lock:
+            if file_hash in self._cache:
+                self._cache.move_to_end(file_hash)
+                return dict(self._cache[file_hash])
+        if self._redis is not None:
+            try:
+                value = self._redis.get(CACHE_KEY_PREFIX + file_hash)
+                if value:
+                    metadata = json.loads(value)
+                    self._remember(file_hash, metadata)
+                    return dict(metadata)
+            except Exception as e:
+                self.logger.warning(f"读取元数据缓存失败: {str(e)}")
+        return None
+
+    def put_cached(self, file_hash: str, metadata: Dict[str, Any]):
+        """缓存元数据"""
+        if not file_hash:
+            return
+        self._remember(file_hash, metadata)
+        if self._redis is not None:
+            try:
+                self._redis.set(CACHE_KEY_PREFIX + file_hash, json.dumps(metadata), ex=CACHE_TTL)
+            except Exception as e:
+                self.logger.warning(f"写入元数据缓存失败: {str(e)}")
+
+    def _remember(self, file_hash: str, metadata: Dict[str, Any]):
+        with self._lock:
+            self._cache[file_hash] = dict(metadata)
+            self._cache.move_to_end(file_hash)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def probe(self, source: str, file_hash: str = "") -> Dict[str, Any]:
+        """探测本地文件或URL的元数据
+
+        Args:
+            source: 本地路径或 http(s) 地址
+            file_hash: 文件哈希，提供时先查缓存并缓存结果
+
+        Returns:
+            规范化的元数据，字段同 VideoMataData
+
+        Raises:
+            ProbeError: 无法解析
+        """
+        cached = self.get_cached(file_hash)
+        if cached is not None:
+            return cached
+        metadata = normalize_metadata(self._run(source))
+        self.put_cached(file_hash, metadata)
+        return metadata
+
+    def probe_bytes(self, data: bytes, file_hash: str = "") -> Optional[Dict[str, Any]]:
+        """从文件开头的一段字节探测元数据
+
+        moov 在文件末尾或数据不足以确定时长等信息时返回 None，调用方需改用完整文件
+        """
+        cached = self.get_cached(file_hash)
+        if cached is not None:
+            return cached
+        try:
+            metadata = normalize_metadata(self._run("pipe:0", data))
+        except ProbeError as e:
+            self.logger.info(f"文件开头 {len(data)} 字节不足以解析元数据: {str(e)}")
+            return None
+        if not metadata['duration'] or not metadata['width']:
+            return None
+        self.put_cached(file_hash, metadata)
+        return metadata
+
+    def probe_object(self, oss_service, object_key: str, file_hash: str = "") -> Dict[str, Any]:
+        """通过签名URL探测OSS对象的元数据，不下载整个文件"""
+        cached = self.get_cached(file_hash)
+        if cached is not None:
+            return cached
+        url = oss_service.internal_bucket.sign_url("GET", object_key, 600)
+        return self.probe(url, file_hash)
+
+    def _run(self, source: str, data: Optional[bytes] = None) -> Dict[str, Any]:
+        """运行 ffprobe 并解析输出"""
+        cmd = [self.ffprobe, "-v", "error", "-print_format", "json", "-show_entries", PROBE_ENTRIES, source]
+        with self._slots:
+            try:
+                result = subprocess.run(cmd, input=data, capture_output=True, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                raise ProbeError(f"ffprobe 超时: {source if data is None else 'pipe'}")
+        if result.returncode != 0:
+            raise ProbeError(result.stderr.decode("utf-8", "ignore")[-500:])
+        probe = json.loads(result.stdout or b"{}")
+        if not probe.get('streams'):
+            raise ProbeError("没有可解析的音视频流")
+        return probe
+
+
+_probe_service: Optional[ProbeService] = None
+_probe_service_lock = threading.Lock()
+
+
+def get_probe_service(logger: Optional[logging.Logger] = None) -> ProbeService:
+    """进程内共享的探测服务，并发数由 UPLOAD_PROBE_CONCURRENCY 配置"""
+    global _probe_service
+    with _probe_service_lock:
+        if _probe_service is None:
+            _probe_service = ProbeService(
+                max_workers=int(os.getenv("UPLOAD_PROBE_CONCURRENCY", str(os.cpu_count() or 2))),
+                logger=logger,
+            )
+        return _probe_service
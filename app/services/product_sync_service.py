@@ -0,0 +1,180 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlmodel import Session, func, select
+
+from app.models.product import Product, ProductStatus, ProductSyncState
+
+
+class ProductSyncService:
+    """商品同步服务：将商品API数据批量写入数据库"""
+
+    # 已存在商品每次同步需要刷新的字段
+    UPDATABLE_FIELDS = (
+        "item_name",
+        "desc",
+        "min_price",
+        "max_price",
+        "buyable",
+        "images",
+        "deleted",
+        "total_stock",
+        "first_sku_id",
+        "item_update_time",
+    )
+
+    # 同步状态记录的标识
+    SYNC_KEY = "xiaohongshu_products"
+
+    def __init__(self, logger: Optional[logging.Logger] = None, chunk_size: int = 500):
+        """初始化商品同步服务
+
+        Args:
+            logger: 日志记录器
+            chunk_size: 每批读取/写入的商品数量
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self.chunk_size = chunk_size
+        self.table = Product.__table__
+
+    def get_state(self, session: Session) -> ProductSyncState:
+        """获取同步状态，不存在时返回未入库的初始状态"""
+        state = session.exec(
+            select(ProductSyncState).where(ProductSyncState.sync_key == self.SYNC_KEY)
+        ).first()
+        return state or ProductSyncState(sync_key=self.SYNC_KEY)
+
+    def save_state(self, session: Session, state: ProductSyncState):
+        """保存同步状态"""
+        state.update_at = int(time.time() * 1000)
+        state.update_time = datetime.now()
+        session.add(state)
+        session.commit()
+
+    def max_item_update_time(self, session: Session) -> int:
+        """获取已入库商品的最大更新时间"""
+        return session.exec(select(func.max(Product.item_update_time))).one() or 0
+
+    def parse_items(self, items: Iterable[Dict[str, Any]]) -> List[Product]:
+        """将API商品数据转换为Product实例，同一item_id以最后一条为准"""
+        products: Dict[str, Product] = {}
+        for item in items:
+            try:
+                product = Product.from_api_response(item)
+            except Exception as e:
+                self.logger.error(f"处理商品数据时出错: {str(e)}, 商品数据: {item}")
+                continue
+            products[product.item_id] = product
+        return list(products.values())
+
+    def bulk_upsert(self, session: Session, items: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """批量插入或更新商品
+
+        规则与逐条同步一致：
+        - 已存在的商品刷新 UPDATABLE_FIELDS，不可购买的商品状态置为 UNMANAGED
+        - 不存在的商品仅在可购买时新增
+
+        Args:
+            session: 数据库会话，由调用方负责提交
+            items: API返回的商品数据列表
+
+        Returns:
+            统计信息 {"added": 新增数, "updated": 更新数, "unchanged": 未变化数, "skipped": 跳过的不可购买新商品数}
+        """
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        products = self.parse_items(items)
+
+        for start in range(0, len(products), self.chunk_size):
+            chunk = products[start:start + self.chunk_size]
+            existing = self._load_existing(session, [p.item_id for p in chunk])
+            now = datetime.now()
+
+            rows = []
+            for product in chunk:
+                current = existing.get(product.item_id)
+                if current is None:
+                    if not product.buyable:
+                        stats["skipped"] += 1
+                        continue
+                    rows.append(self._to_row(product))
+                    stats["added"] += 1
+                    continue
+
+                status = current["status"] if product.buyable else ProductStatus.UNMANAGED
+                changed = status != current["status"] or any(
+                    getattr(product, field) != current[field] for field in self.UPDATABLE_FIELDS
+                )
+                if not changed:
+                    stats["unchanged"] += 1
+                    continue
+
+                row = self._to_row(product)
+                row["id"] = current["id"]
+                row["status"] = status
+                row["update_time"] = now
+                rows.append(row)
+                stats["updated"] += 1
+
+            if rows:
+                self._write_rows(session, rows)
+
+        self.logger.info(
+            f"批量同步 {len(products)} 个商品：新增 {stats['added']} 个，更新 {stats['updated']} 个，"
+            f"未变化 {stats['unchanged']} 个，跳过不可购买新商品 {stats['skipped']} 个"
+        )
+        return stats
+
+    def _load_existing(self, session: Session, item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """按item_id一次性读取已存在商品，重复记录以最早的一条为准"""
+        columns = [self.table.c.id, self.table.c.item_id, self.table.c.status]
+        columns += [self.table.c[field] for field in self.UPDATABLE_FIELDS]
+        stmt = select(*columns).where(self.table.c.item_id.in_(item_ids)).order_by(self.table.c.id)
+
+        existing: Dict[str, Dict[str, Any]] = {}
+        for row in session.exec(stmt):
+            data = row._asdict()
+            existing.setdefault(data["item_id"], data)
+        return existing
+
+    def _to_row(self, product: Product) -> Dict[str, Any]:
+        """将Product实例转换为表字段字典"""
+        return {column.name: getattr(product, column.name) for column in self.table.columns}
+
+    def _write_rows(self, session: Session, rows: List[Dict[str, Any]]):
+        """写入一批商品
+
+        新增行 id 为空由数据库自增生成，更新行携带已存在的主键，
+        MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite 使用 ON CONFLICT DO UPDATE，
+        参数以 executemany 方式传入，由驱动合并为多行 VALUES；
+        其他数据库退化为批量 INSERT + 按主键批量 UPDATE。
+        """
+        update_columns = self.UPDATABLE_FIELDS + ("status", "update_time")
+        dialect = session.get_bind().dialect.name
+
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+
+            stmt = insert(self.table)
+            stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+            session.exec(stmt, params=rows)
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+
+            stmt = insert(self.table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[self.table.c.id],
+                set_={column: stmt.excluded[column] for column in update_columns},
+            )
+            session.exec(stmt, params=rows)
+        else:
+            new_rows = [row for row in rows if row["id"] is None]
+            if new_rows:
+                session.bulk_insert_mappings(Product, new_rows)
+            updated_rows = [
+                {"id": row["id"], **{column: row[column] for column in update_columns}}
+                for row in rows if row["id"] is not None
+            ]
+            if updated_rows:
+                session.bulk_update_mappings(Product, updated_rows)
@@ -0,0 +1,157 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.internal.db import engine
+from app.models.product import ArticlePublishLease, ProductArticle, ArticleStatus
+
+
+class PublishLeaseManager:
+    """文章发布租约
+
+    发布前认领文章：MySQL 上先以 SELECT ... FOR UPDATE SKIP LOCKED 锁定文章行，
+    其他进程跳过而不是等待；租约行的写入使用带条件的 UPDATE（比较并设置），
+    SQLite 等不支持行锁的数据库也能保证同一时刻只有一个持有者。
+    持有期间后台线程定期续约，进程崩溃后租约过期，文章可被其他进程重新认领。
+    发布成功时在同一事务中校验令牌并标记租约为已发布，之后不会再被认领。
+    """
+
+    def __init__(self, lease_seconds: int = 600, logger: Optional[logging.Logger] = None):
+        """初始化租约管理
+
+        Args:
+            lease_seconds: 租约时长（秒），需覆盖一次发布（含视频上传）的耗时，持有期间每 1/3 时长续约一次
+            logger: 日志记录器
+        """
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.logger = logger or logging.getLogger(__name__)
+
+    def claim(self, article_id: int) -> Optional[str]:
+        """认领一篇待发布的文章
+
+        Returns:
+            认领令牌，文章不需要发布或已被其他进程持有时返回 None
+        """
+        now = int(time.time() * 1000)
+        token = uuid.uuid4().hex
+        with Session(engine) as session:
+            query = select(ProductArticle.id).where(
+                ProductArticle.id == article_id,
+                ProductArticle.status == ArticleStatus.PENDING_PUBLISH,
+                ProductArticle.publish_time == 0
+            )
+            if engine.dialect.name == "mysql":
+                query = query.with_for_update(skip_locked=True)
+            if session.exec(query).first() is None:
+                # 文章已不需要发布，或正被其他进程锁定
+                return None
+
+            values = dict(claim_token=token, owner=self.owner, lease_expire_at=now + self.lease_seconds * 1000,
+                          status="claimed", update_at=now)
+            # 租约过期或已释放时才能认领，已发布的租约永远不会再被认领
+            claimed = session.exec(
+                sa.update(ArticlePublishLease).where(
+                    ArticlePublishLease.article_id == article_id,
+                    ArticlePublishLease.status != "published",
+                    sa.or_(ArticlePublishLease.status == "released", ArticlePublishLease.lease_expire_at < now)
+                ).values(**values)
+            ).rowcount == 1
+            if not claimed:
+                if session.get(ArticlePublishLease, article_id) is not None:
+                    session.rollback()
+                    return None
+                session.add(ArticlePublishLease(article_id=article_id, create_at=now, **values))
+            try:
+                session.commit()
+            except IntegrityError:
+                # 其他进程同时插入了租约
+                session.rollback()
+                return None
+        self.logger.info(f"认领文章 {article_id}，租约 {self.lease_seconds} 秒")
+        return token
+
+    def renew(self, article_id: int, token: str) -> bool:
+        """续约，令牌已失效时返回 False"""
+        now = int(time.time() * 1000)
+        with Session(engine) as session:
+            renewed = session.exec(
+                sa.update(ArticlePublishLease).where(
+                    ArticlePublishLease.article_id == article_id,
+                    ArticlePublishLease.claim_token == token,
+                    ArticlePublishLease.status == "claimed"
+                ).values(lease_expire_at=now + self.lease_seconds * 1000, update_at=now)
+            ).rowcount == 1
+            session.commit()
+        return renewed
+
+    def release(self, article_id: int, token: str):
+        """释放未完成发布的租约，文章可立即被重新认领"""
+        now = int(time.time() * 1000)
+        with Session(engine) as session:
+            session.exec(
+                sa.update(ArticlePublishLease).where(
+                    ArticlePublishLease.article_id == article_id,
+                    ArticlePublishLease.claim_token == token,
+                    ArticlePublishLease.status == "claimed"
+                ).values(status="released", update_at=now)
+            )
+            session.commit()
+
+    def mark_published(self, session: Session, article_id: int, token: str) -> bool:
+        """在调用方的事务中将租约标记为已发布，需与文章状态的更新一起提交
+
+        Returns:
+            令牌是否仍然有效，无效说明租约已过期并可能被其他进程认领
+        """
+        now = int(time.time() * 1000)
+        return session.exec(
+            sa.update(ArticlePublishLease).where(
+                ArticlePublishLease.article_id == article_id,
+                ArticlePublishLease.claim_token == token
+            ).values(status="published", update_at=now)
+        ).rowcount == 1
+
+    @contextmanager
+    def hold(self, article_id: int) -> Iterator[Optional[str]]:
+        """认领文章并在持有期间自动续约，退出时释放未标记为已发布的租约
+
+        Yields:
+            认领令牌，未认领到时为 None
+        """
+        token = self.claim(article_id)
+        if token is None:
+            yield None
+            return
+
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    if not self.renew(article_id, token):
+                        self.logger.warning(f"文章 {article_id} 的租约已失效")
+                        return
+                except Exception as e:
+                    self.logger.warning(f"文章 {article_id} 续约失败: {str(e)}")
+
+        thread = threading.Thread(target=heartbeat, name=f"lease-{article_id}", daemon=True)
+        thread.start()
+        try:
+            yield token
+        finally:
+            stop.set()
+            thread.join()
+            try:
+                self.release(article_id, token)
+            except Exception as e:
+                self.logger.warning(f"释放文章 {article_id} 的租约失败: {str(e)}")
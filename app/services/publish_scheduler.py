@@ -0,0 +1,195 @@
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlmodel import Session, select
+
+from app.config.redis_config import RedisConfig
+from app.internal.db import engine
+from app.models.product import ProductArticle, ArticleStatus
+
+# 发布调度唤醒信号的Redis频道
+WAKE_CHANNEL = "publish:wake"
+
+
+class PublishWakeSignal:
+    """发布调度唤醒信号
+
+    配置了Redis时通过发布订阅在进程间传递，Web后台修改发布时间后发布工作进程立即重新加载；
+    未配置Redis时只在进程内有效，其他进程的修改在下次定时刷新时生效。
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._event = threading.Event()
+        self._client = None
+        self._pubsub = None
+        if RedisConfig.is_configured():
+            import redis
+
+            self._client = redis.Redis.from_url(RedisConfig.get_url())
+
+    def notify(self, article_id: Optional[int] = None):
+        """通知调度器重新加载待发布文章"""
+        self._event.set()
+        if self._client is None:
+            return
+        try:
+            self._client.publish(WAKE_CHANNEL, str(article_id or ""))
+        except Exception as e:
+            self.logger.warning(f"发送发布调度唤醒信号失败: {str(e)}")
+
+    def wait(self, timeout: float) -> bool:
+        """等待唤醒信号
+
+        Returns:
+            是否收到信号，超时返回 False
+        """
+        if timeout <= 0:
+            return False
+        if self._client is not None:
+            try:
+                return self._wait_redis(timeout)
+            except Exception as e:
+                self.logger.warning(f"订阅发布调度唤醒信号失败，改为进程内等待: {str(e)}")
+                self._pubsub = None
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+    def _wait_redis(self, timeout: float) -> bool:
+        if self._pubsub is None:
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(WAKE_CHANNEL)
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._event.is_set():
+                self._event.clear()
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # 分段等待，进程内的 notify 最多延迟 1 秒生效
+            message = self._pubsub.get_message(timeout=min(remaining, 1.0))
+            if message and message.get("type") == "message":
+                # 合并短时间内的多个信号
+                while self._pubsub.get_message(timeout=0):
+                    pass
+                return True
+
+
+_signal: Optional[PublishWakeSignal] = None
+_signal_lock = threading.Lock()
+
+
+def get_publish_wake_signal(logger: Optional[logging.Logger] = None) -> PublishWakeSignal:
+    """获取进程内共享的唤醒信号"""
+    global _signal
+    with _signal_lock:
+        if _signal is None:
+            _signal = PublishWakeSignal(logger)
+        return _signal
+
+
+def notify_publish_scheduler(article_id: Optional[int] = None):
+    """文章创建或发布时间修改后唤醒发布调度器，失败不影响调用方"""
+    try:
+        get_publish_wake_signal().notify(article_id)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"唤醒发布调度器失败: {str(e)}")
+
+
+class PublishScheduler:
+    """待发布文章调度器
+
+    用最小堆保存 horizon 内待发布文章的预发布时间，睡眠到最早的一篇到期，
+    到期文章一次全部取出交给调用方并发发布。收到唤醒信号或每隔 refresh_interval
+    秒重新查询一次，以反映文章的新增和修改。
+    """
+
+    def __init__(self, horizon: int = 24 * 3600, refresh_interval: int = 60, retry_delay: int = 60,
+                 signal: Optional[PublishWakeSignal] = None, logger: Optional[logging.Logger] = None):
+        """初始化调度器
+
+        Args:
+            horizon: 加载未来多少秒内的待发布文章
+            refresh_interval: 定时重新查询的间隔（秒）
+            retry_delay: 发布失败后再次尝试的间隔（秒）
+            signal: 唤醒信号，默认使用进程内共享的信号
+            logger: 日志记录器
+        """
+        self.horizon = horizon
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self.signal = signal or get_publish_wake_signal(logger)
+        self.logger = logger or logging.getLogger(__name__)
+        self._heap: List[Tuple[int, int]] = []
+        self._in_flight: Set[int] = set()
+        self._retry_at: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._next_refresh = 0.0
+
+    def refresh(self):
+        """重新查询待发布文章并重建堆"""
+        now = int(time.time() * 1000)
+        with Session(engine) as session:
+            rows = session.exec(
+                select(ProductArticle.id, ProductArticle.pre_publish_time).where(
+                    ProductArticle.status == ArticleStatus.PENDING_PUBLISH,
+                    ProductArticle.pre_publish_time > 0,
+                    ProductArticle.pre_publish_time <= now + self.horizon * 1000,
+                    ProductArticle.publish_time == 0
+                )
+            ).all()
+        with self._lock:
+            self._retry_at = {article_id: at for article_id, at in self._retry_at.items() if at > now}
+            self._heap = [
+                (max(pre_publish_time, self._retry_at.get(article_id, 0)), article_id)
+                for article_id, pre_publish_time in rows
+                if article_id not in self._in_flight
+            ]
+            heapq.heapify(self._heap)
+            self._next_refresh = time.monotonic() + self.refresh_interval
+        self.logger.info(f"发布调度已加载 {len(self._heap)} 篇待发布文章，进行中 {len(self._in_flight)} 篇")
+
+    def next_due_in(self) -> Optional[float]:
+        """距最早一篇文章到期的秒数，没有文章时返回 None"""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] / 1000 - time.time())
+
+    def wait(self):
+        """睡眠到最早的文章到期、需要定时刷新或收到唤醒信号"""
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+        timeout = self._next_refresh - time.monotonic()
+        due_in = self.next_due_in()
+        if due_in is not None:
+            timeout = min(timeout, due_in)
+        if self.signal.wait(timeout):
+            self.logger.info("收到发布调度唤醒信号")
+            self.refresh()
+
+    def pop_due(self) -> List[int]:
+        """取出所有已到期的文章ID，标记为进行中"""
+        now = int(time.time() * 1000)
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, article_id = heapq.heappop(self._heap)
+                if article_id not in self._in_flight:
+                    self._in_flight.add(article_id)
+                    due.append(article_id)
+        return due
+
+    def done(self, article_id: int, success: bool):
+        """文章处理结束，失败时 retry_delay 秒后再次调度"""
+        with self._lock:
+            self._in_flight.discard(article_id)
+            if not success:
+                retry_at = int(time.time() * 1000) + self.retry_delay * 1000
+                self._retry_at[article_id] = retry_at
+                heapq.heappush(self._heap, (retry_at, article_id))
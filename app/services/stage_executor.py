@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class StageExecutor:
+    """分阶段执行阻塞操作
+
+    每个阶段一个有界线程池，异步接口中的阻塞调用（oss2、ffprobe/ffmpeg 子进程、同步数据库会话）
+    按阶段提交到对应线程池，事件循环不被阻塞；各阶段的并发数单独限制，
+    例如批量上传时 OSS 上传可以并发，ffmpeg 不会同时启动过多进程占满 CPU。
+    """
+
+    def __init__(self, limits: Dict[str, int], logger: Optional[logging.Logger] = None):
+        """初始化
+
+        Args:
+            limits: 阶段名 -> 最大并发数
+            logger: 日志记录器
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self._pools = {
+            stage: ThreadPoolExecutor(max_workers=max(1, limit), thread_name_prefix=f"stage-{stage}")
+            for stage, limit in limits.items()
+        }
+
+    async def run(self, stage: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在阶段线程池中执行 func，并等待结果"""
+        pool = self._pools[stage]
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def call():
+            waited = time.perf_counter() - submitted
+            if waited > 1:
+                self.logger.info(f"阶段 {stage} 排队 {waited:.1f} 秒: {getattr(func, '__name__', func)}")
+            return func(*args, **kwargs)
+
+        return await loop.run_in_executor(pool, call)
+
+    def shutdown(self, wait: bool = True):
+        """关闭所有线程池"""
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait)
+
+
+_upload_executor: Optional[StageExecutor] = None
+_upload_executor_lock = threading.Lock()
+
+
+def get_upload_executor(logger: Optional[logging.Logger] = None) -> StageExecutor:
+    """视频上传入库使用的进程内共享执行器
+
+    阶段：
+        oss: 上传分片、写临时文件，UPLOAD_OSS_CONCURRENCY，默认 8
+        probe: ffprobe 提取元数据、ffmpeg 截帧，UPLOAD_PROBE_CONCURRENCY，默认 CPU 核数
+        db: 数据库查询和写入，UPLOAD_DB_CONCURRENCY，默认 4
+    """
+    global _upload_executor
+    with _upload_executor_lock:
+        if _upload_executor is None:
+            _upload_executor = StageExecutor({
+                "oss": int(os.getenv("UPLOAD_OSS_CONCURRENCY", "8")),
+                "probe": int(os.getenv("UPLOAD_PROBE_CONCURRENCY", str(os.cpu_count() or 2))),
+                "db": int(os.getenv("UPLOAD_DB_CONCURRENCY", "4")),
+            }, logger)
+        return _upload_executor
@@ -0,0 +1,252 @@
+import os
+import re
+import tempfile
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+import ffmpeg
+import oss2
+
+from app.config.oss_config import OSSConfig
+from app.models.video import Video, VideoMaterial
+from app.services.oss_service import OSSService
+
+# 截帧时间点（秒），与原 OSS 截帧参数 t_1000 一致
+SNAPSHOT_TIME = 1.0
+
+# 尺寸名称 -> 宽度，0 表示原始分辨率（发布封面）
+THUMB_SIZES = {"w160": 160, "w320": 320, "full": 0}
+
+_FILE_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ThumbnailIndex:
+    """缩略图是否存在的进程内记录
+
+    键为 (文件哈希, 尺寸)。已保存的缩略图不会变化，存在的结果一直有效；
+    不存在的结果在 miss_ttl 秒后过期，之后重新查询，其他进程生成的缩略图可以被发现。
+    """
+
+    def __init__(self, miss_ttl: int = 600, max_size: int = 100000):
+        self.miss_ttl = miss_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_hash: str, size: str) -> Optional[bool]:
+        """返回记录的结果，没有记录或不存在的结果已过期时返回 None"""
+        key = (file_hash, size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            exists, expire_at = entry
+            if not exists and expire_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return exists
+
+    def put(self, file_hash: str, size: str, exists: bool):
+        with self._lock:
+            self._entries[(file_hash, size)] = (exists, time.time() + self.miss_ttl)
+            self._entries.move_to_end((file_hash, size))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_thumbnail_index = ThumbnailIndex(OSSConfig.THUMB_MISS_TTL)
+
+
+class ThumbnailService:
+    """视频封面和缩略图存储
+
+    上传视频时用 ffmpeg 截取一帧，生成原始分辨率封面和 w160、w320 缩略图，
+    以 file_hash 为键保存到 OSS 的 THUMB_PREFIX 下，并缓存到本地目录。
+    管理后台和笔记发布直接读取保存的图片，不再每次请求 OSS 实时截帧；
+    没有保存图片的历史视频回退到 OSS 截帧地址。
+    """
+
+    def __init__(self, oss_service: OSSService, logger: Optional[logging.Logger] = None, cache_dir: Optional[str] = None,
+                 index: Optional[ThumbnailIndex] = None):
+        self.oss_service = oss_service
+        self.logger = logger or logging.getLogger(__name__)
+        self.cache_dir = cache_dir or OSSConfig.THUMB_CACHE_DIR
+        # 各处创建的实例共用进程内的存在记录
+        self.index = index or _thumbnail_index
+
+    @staticmethod
+    def is_valid(file_hash: str, size: str) -> bool:
+        """校验哈希和尺寸名称，防止拼接出任意路径"""
+        return bool(_FILE_HASH_RE.match(file_hash or "")) and size in THUMB_SIZES
+
+    def object_key(self, file_hash: str, size: str) -> str:
+        """OSS对象键名"""
+        return f"{OSSConfig.THUMB_PREFIX}{file_hash}/{size}.jpg"
+
+    def _cache_path(self, file_hash: str, size: str) -> str:
+        return os.path.join(self.cache_dir, file_hash[:2], f"{file_hash}_{size}.jpg")
+
+    def _write_cache(self, file_hash: str, size: str, data: bytes):
+        """原子写入本地缓存，失败只记录日志"""
+        path = self._cache_path(file_hash, size)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.logger.warning(f"写入缩略图缓存失败: {path}, {str(e)}")
+
+    def generate(self, video_path: str, file_hash: str, duration: float = 0.0) -> bool:
+        """从本地视频文件截帧，生成封面和缩略图并保存
+
+        Args:
+            video_path: 视频文件路径
+            file_hash: 文件SHA256哈希值
+            duration: 视频时长（秒），短于截帧时间点时截取第一帧
+
+        Returns:
+            是否全部保存成功
+        """
+        if not _FILE_HASH_RE.match(file_hash or ""):
+            self.logger.warning(f"文件哈希无效，跳过生成缩略图: {file_hash}")
+            return False
+        snapshot_time = SNAPSHOT_TIME if duration > SNAPSHOT_TIME else 0
+        with tempfile.TemporaryDirectory() as temp_dir:
+            full_path = os.path.join(temp_dir, "full.jpg")
+            try:
+                # 截取一帧原始分辨率的封面，缩略图从封面缩放，不再重复解码视频
+                (
+                    ffmpeg.input(video_path, ss=snapshot_time)
+                    .output(full_path, vframes=1, format="image2", vcodec="mjpeg", **{"q:v": 2})
+                    .overwrite_output()
+                    .run(quiet=True)
+                )
+                paths = {"full": full_path}
+                for size, width in THUMB_SIZES.items():
+                    if not width:
+                        continue
+                    paths[size] = os.path.join(temp_dir, f"{size}.jpg")
+                    (
+                        ffmpeg.input(full_path)
+                        .filter("scale", width, -2)
+                        .output(paths[size], vframes=1, format="image2", vcodec="mjpeg", **{"q:v": 3})
+                        .overwrite_output()
+                        .run(quiet=True)
+                    )
+            except ffmpeg.Error as e:
+                stderr = e.stderr.decode("utf-8", "ignore") if e.stderr else ""
+                self.logger.error(f"生成缩略图失败: {video_path}, {stderr[-500:]}")
+                return False
+
+            for size, path in paths.items():
+                with open(path, "rb") as f:
+                    data = f.read()
+                if self.oss_service.is_available():
+                    try:
+                        self.oss_service.internal_bucket.put_object(
+                            self.object_key(file_hash, size), data, headers={"Content-Type": "image/jpeg"}
+                        )
+                    except Exception as e:
+                        self.logger.error(f"保存缩略图到OSS失败: {file_hash} {size}, {str(e)}")
+                        return False
+                self._write_cache(file_hash, size, data)
+                self.index.put(file_hash, size, True)
+        self.logger.info(f"缩略图已生成: {file_hash}")
+        return True
+
+    def cached_path(self, file_hash: str, size: str) -> Optional[str]:
+        """返回本地缓存的图片路径，本地没有时从OSS下载，OSS中也不存在时返回 None"""
+        if not self.is_valid(file_hash, size):
+            return None
+        path = self._cache_path(file_hash, size)
+        if os.path.exists(path):
+            return path
+        data = self._download(file_hash, size)
+        if data is None:
+            return None
+        self._write_cache(file_hash, size, data)
+        return path if os.path.exists(path) else None
+
+    def exists(self, file_hash: str, size: str) -> bool:
+        """是否保存了该尺寸的图片：先查本地缓存和进程内记录，都没有时查询OSS并记录结果"""
+        if not self.is_valid(file_hash, size):
+            return False
+        if os.path.exists(self._cache_path(file_hash, size)):
+            return True
+        exists = self.index.get(file_hash, size)
+        if exists is not None:
+            return exists
+        if not self.oss_service.is_available():
+            return False
+        try:
+            exists = self.oss_service.internal_bucket.object_exists(self.object_key(file_hash, size))
+        except oss2.exceptions.OssError as e:
+            self.logger.warning(f"查询缩略图失败: {file_hash} {size}, {str(e)}")
+            return False
+        self.index.put(file_hash, size, exists)
+        return exists
+
+    def read(self, file_hash: str, size: str) -> Optional[bytes]:
+        """读取保存的图片，不存在时返回 None"""
+        if not self.is_valid(file_hash, size):
+            return None
+        path = self.cached_path(file_hash, size)
+        if path is not None:
+            with open(path, "rb") as f:
+                return f.read()
+        # 本地缓存不可写时直接使用OSS中的数据
+        return self._download(file_hash, size)
+
+    def _download(self, file_hash: str, size: str) -> Optional[bytes]:
+        if not self.oss_service.is_available() or self.index.get(file_hash, size) is False:
+            return None
+        try:
+            data = self.oss_service.internal_bucket.get_object(self.object_key(file_hash, size)).read()
+        except oss2.exceptions.NoSuchKey:
+            self.index.put(file_hash, size, False)
+            return None
+        self.index.put(file_hash, size, True)
+        return data
+
+    def get_url(self, video: Union[Video, VideoMaterial], size: str) -> str:
+        """管理后台使用的缩略图地址"""
+        if self.exists(video.file_hash, size):
+            return f"/admin/videos/thumbs/{video.file_hash}/{size}.jpg"
+        return self.snapshot_url(video, size)
+
+    def get_urls(self, videos: List[Union[Video, VideoMaterial]], size: str) -> Dict[int, str]:
+        """批量获取缩略图地址，视频ID -> 地址
+
+        没有保存图片的视频（包括有哈希但上传时截帧失败或早于缩略图功能的历史视频）
+        使用 OSS 截帧地址，一次批量签名
+        """
+        urls = {}
+        legacy = []
+        for video in videos:
+            if self.exists(video.file_hash, size):
+                urls[video.id] = f"/admin/videos/thumbs/{video.file_hash}/{size}.jpg"
+            else:
+                legacy.append(video)
+        if legacy and THUMB_SIZES.get(size, 0):
+            signed = self.oss_service.sign_urls([video.oss_object_key for video in legacy], 3600, self._snapshot_style(legacy[0], size))
+            urls.update({video.id: signed.get(video.oss_object_key, "") for video in legacy})
+        else:
+            urls.update({video.id: self.snapshot_url(video, size) for video in legacy})
+        return urls
+
+    def snapshot_url(self, video: Union[Video, VideoMaterial], size: str) -> str:
+        """OSS实时截帧的签名地址，用于没有保存图片的历史视频"""
+        return self.oss_service.sign_url(video.oss_object_key, 3600, self._snapshot_style(video, size))
+
+    @staticmethod
+    def _snapshot_style(video: Union[Video, VideoMaterial], size: str) -> str:
+        width = THUMB_SIZES.get(size, 0)
+        if width:
+            return f"video/snapshot,t_1000,f_jpg,w_{width},m_fast"
+        return f"video/snapshot,t_1000,f_jpg,w_{video.width},h_{video.height},m_fast"
@@ -1,20 +1,196 @@
 import os
+import hashlib
 import tempfile
 import logging
-from typing import Tuple, Optional
+import asyncio
+from typing import Any, Dict, NamedTuple, Tuple, Optional, Union
 from fastapi import UploadFile, HTTPException, status
 
-from app.services.oss_service import OSSService
+from app.models.video import Video, VideoMaterial
+
+from app.services.oss_service import OSSService, OSSStreamingUpload
 from app.services.video_service import VideoService
+from app.services.stage_executor import StageExecutor, get_upload_executor
+
+# 从上传请求中每次读取的字节数
+INGEST_CHUNK_SIZE = 1024 * 1024
+# 用文件开头的这些字节提前探测元数据，moov 在文件开头时不必等待上传完成
+PROBE_HEAD_SIZE = 2 * 1024 * 1024
+
+
+class IngestResult(NamedTuple):
+    """流式读取上传文件的结果"""
+    file_hash: str
+    file_size: int
+    oss_object_key: str  # 相同文件已入库时为空
+    file_url: str
+    existing: Optional[Union[VideoMaterial, Video]]  # 相同哈希的已入库视频
+    head_probe: Optional["asyncio.Future"]  # 从文件开头探测元数据的任务，结果为 None 时需探测完整文件
 
 
 class UploadService:
     """通用文件上传服务"""
     
-    def __init__(self, oss_service: OSSService, video_service: VideoService, logger: Optional[logging.Logger] = None):
+    def __init__(self, oss_service: OSSService, video_service: VideoService, logger: Optional[logging.Logger] = None,
+                 executor: Optional[StageExecutor] = None):
         self.oss_service = oss_service
         self.video_service = video_service
         self.logger = logger or logging.getLogger(__name__)
+        # 阻塞的OSS、ffmpeg和数据库调用按阶段在有界线程池中执行，不占用事件循环
+        self.executor = executor or get_upload_executor(self.logger)
+
+    def _video_info(self, video: Union[VideoMaterial, Video]) -> dict:
+        """构建视频信息"""
+        return {
+            "id": video.id,
+            "file_extension": video.file_extension,
+            "url": video.url,
+            "file_hash": video.file_hash,
+            "oss_object_key": video.oss_object_key,
+            "file_size": video.file_size,
+            "item_id": video.item_id,
+            "sku_id": video.sku_id,
+            "status": video.status if hasattr(video, 'status') else None,
+            "width": video.width,
+            "height": video.height,
+            "duration": video.duration,
+            "format": video.format,
+            "bitrate": video.bitrate,
+            "frame_rate": video.frame_rate,
+            "audio_format": video.audio_format,
+            "audio_bitrate": video.audio_bitrate,
+            "audio_channels": video.audio_channels,
+            "platform": video.platform,
+            "source": video.source,
+            "is_oss_stored": bool(video.oss_object_key)
+        }
+
+    async def _hash_stream(self, video_file: UploadFile) -> str:
+        """
+        只计算上传文件的哈希，用于校验客户端提供的哈希，不写入临时文件也不上传
+        """
+        max_size = self.oss_service.config.MAX_FILE_SIZE
+        hasher = hashlib.sha256()
+        size = 0
+        while chunk := await video_file.read(INGEST_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"文件大小超过限制({max_size // (1024*1024)}MB)"
+                )
+            await self.executor.run("oss", hasher.update, chunk)
+        return hasher.hexdigest()
+
+    async def _ingest_stream(self, video_file: UploadFile, temp_file, prefix: str) -> IngestResult:
+        """
+        流式读取上传的文件，每块数据只读取一次，内存中最多保留一个OSS分片和文件开头的 PROBE_HEAD_SIZE 字节
+        
+        读到文件开头的数据后即在后台探测元数据，与后续上传并行；
+        读完后如果相同哈希的视频已入库，取消分片上传，不在OSS中生成新对象
+        """
+        max_size = self.oss_service.config.MAX_FILE_SIZE
+        try:
+            upload: OSSStreamingUpload = await self.executor.run(
+                "oss", self.oss_service.open_streaming_upload, video_file.filename, video_file.content_type, prefix=prefix
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"文件上传失败: {str(e)}")
+
+        hasher = hashlib.sha256()
+        head = bytearray()
+        head_probe = None
+
+        def consume(chunk: bytes):
+            hasher.update(chunk)
+            temp_file.write(chunk)
+            upload.write(chunk)
+
+        try:
+            while chunk := await video_file.read(INGEST_CHUNK_SIZE):
+                if upload.size + len(chunk) > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"文件大小超过限制({max_size // (1024*1024)}MB)"
+                    )
+                await self.executor.run("oss", consume, chunk)
+                if head_probe is None:
+                    head += chunk[:PROBE_HEAD_SIZE - len(head)]
+                    if len(head) >= PROBE_HEAD_SIZE:
+                        head_probe = self._start_head_probe(head)
+            if head_probe is None and head:
+                # 文件小于 PROBE_HEAD_SIZE，开头即完整文件
+                head_probe = self._start_head_probe(head)
+            file_hash = hasher.hexdigest()
+            temp_file.flush()
+            existing = await self.executor.run("db", self.video_service.find_by_hash, file_hash)
+            if existing:
+                await self.executor.run("oss", upload.abort)
+                return IngestResult(file_hash, upload.size, "", "", existing, head_probe)
+            await self.executor.run("oss", upload.complete, file_hash)
+        except HTTPException:
+            await self.executor.run("oss", upload.abort)
+            raise
+        except Exception as e:
+            await self.executor.run("oss", upload.abort)
+            self.logger.error(f"OSS上传失败: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"文件上传失败: {str(e)}"
+            )
+        return IngestResult(file_hash, upload.size, upload.object_key,
+                            self.oss_service.config.get_public_url(upload.object_key), None, head_probe)
+
+    def _start_head_probe(self, head: bytearray) -> "asyncio.Future":
+        """在后台从文件开头探测元数据"""
+        return asyncio.ensure_future(self.executor.run("probe", self.video_service.probe_service.probe_bytes, bytes(head)))
+
+    async def _probe_uploaded(self, result: IngestResult, temp_file_path: str) -> Dict[str, Any]:
+        """获取上传文件的元数据：优先使用文件开头的探测结果，失败时探测完整的临时文件"""
+        metadata = None
+        if result.head_probe is not None:
+            try:
+                metadata = await result.head_probe
+            except Exception as e:
+                self.logger.info(f"从文件开头探测元数据失败: {str(e)}")
+        if metadata is not None:
+            self.video_service.probe_service.put_cached(result.file_hash, metadata)
+            return metadata
+        return await self.executor.run("probe", self.video_service.extract_video_metadata, temp_file_path, result.file_hash)
+
+    async def reuse_by_hash(
+        self,
+        file_hash: str,
+        file_size: int,
+        item_id: str,
+        sku_id: str = "",
+        platform: str = "xiaohongshu",
+        source: str = "upload",
+        name: str = "",
+        process_func: str = "process_video_material_file"
+    ) -> Optional[dict]:
+        """
+        上传前按客户端计算的哈希预检，相同文件已入库时直接登记到目标表，客户端不必再发送文件内容
+
+        Args:
+            file_hash: 客户端计算的文件SHA256哈希
+            file_size: 客户端文件大小，与已入库文件不一致时视为不同文件
+            name: 文件名
+            其余参数同 process_video_upload
+
+        Returns:
+            复用后的视频信息，文件未入库时返回 None，客户端需要正常上传
+        """
+        if not file_hash:
+            return None
+        existing = await self.executor.run("db", self.video_service.find_by_hash, file_hash.lower())
+        if not existing or existing.file_size != file_size:
+            return None
+        model_cls = VideoMaterial if process_func == "process_video_material_file" else Video
+        video = await self.executor.run("db", self.video_service.reuse_video, existing, model_cls, item_id=item_id,
+                                        sku_id=sku_id, platform=platform, source=source, name=name)
+        self.logger.info(f"预检命中已入库文件，跳过上传: {name}, 哈希: {existing.file_hash}")
+        return self._video_info(video)
 
     async def process_video_upload(
         self,
@@ -24,7 +200,8 @@ class UploadService:
         platform: str = "xiaohongshu",
         source: str = "upload",
         prefix: str = "video/material/",
-        process_func: str = "process_video_material_file"
+        process_func: str = "process_video_material_file",
+        file_hash: str = ""
     ) -> Tuple[dict, str, str, int]:
         """
         处理视频文件上传的通用逻辑
@@ -37,6 +214,7 @@ class UploadService:
             source: 来源
             prefix: OSS存储前缀
             process_func: 使用的处理函数名称（'process_video_material_file' 或 'process_video_file'）
+            file_hash: 客户端计算的文件SHA256哈希，已入库时校验后直接复用，不上传OSS
             
         Returns:
             Tuple[dict, str, str, int]: (视频信息, 文件URL, OSS对象键, 文件大小)
@@ -44,102 +222,69 @@ class UploadService:
         # 获取文件扩展名
         file_extension = os.path.splitext(video_file.filename)[1].lower()
         
+        #如果是测试环境，prefix前缀添加test
+        self.logger.info(f"SERVER_ENVIRONMENT: {os.getenv('SERVER_ENVIRONMENT')}")
+        if os.getenv("SERVER_ENVIRONMENT") == "LOCAL":
+            prefix = "test/" + prefix
+
+        if not self.oss_service.is_available():
+            self.logger.error("OSS不可用，请检查配置")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="OSS不可用，请检查配置"
+            )
+
+        process_kwargs = dict(
+            item_id=item_id,
+            sku_id=sku_id,
+            platform=platform,
+            source=source,
+            name=video_file.filename
+        )
+        model_cls = VideoMaterial if process_func == "process_video_material_file" else Video
+
+        # 客户端提供了哈希且文件已入库时，只校验哈希，不写临时文件也不上传
+        if file_hash:
+            existing = await self.executor.run("db", self.video_service.find_by_hash, file_hash.lower())
+            if existing:
+                if await self._hash_stream(video_file) == existing.file_hash:
+                    video = await self.executor.run("db", self.video_service.reuse_video, existing, model_cls, **process_kwargs)
+                    return self._video_info(video), video.url, video.oss_object_key, video.file_size
+                self.logger.warning(f"客户端提供的文件哈希与内容不一致，按新文件上传: {video_file.filename}")
+                await video_file.seek(0)
+
         temp_file_path = None
         try:
-            # 创建临时文件保存上传的视频
             with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
                 temp_file_path = temp_file.name
-                # 读取并写入文件内容
-                content = await video_file.read()
-                temp_file.write(content)
-                temp_file.flush()
+                # 单次读取上传内容，同时计算哈希、检查大小、写入临时文件（用于提取元数据）并分片上传到OSS
+                result = await self._ingest_stream(video_file, temp_file, prefix)
+            file_hash, file_size, oss_object_key, file_url, existing = result[:5]
+            if existing:
+                # 相同文件已入库，复用其OSS对象和元数据
+                if result.head_probe is not None:
+                    result.head_probe.cancel()
+                video = await self.executor.run("db", self.video_service.reuse_video, existing, model_cls, **process_kwargs)
+                return self._video_info(video), video.url, video.oss_object_key, video.file_size
+            self.logger.info(f"文件上传到OSS成功: {video_file.filename} -> {oss_object_key}, 大小: {file_size}, 哈希: {file_hash}")
             
-            # 计算文件哈希
-            self.logger.info(f"计算文件哈希: {video_file.filename}")
-            file_hash = self.oss_service.calculate_file_hash(content)
-            self.logger.info(f"文件哈希: {file_hash}")
-            file_size = len(content)
-            
-            # 上传文件到OSS
-            file_url = ""
-            oss_object_key = ""
-            
-            #如果是测试环境，prefix前缀添加test
-            self.logger.info(f"SERVER_ENVIRONMENT: {os.getenv('SERVER_ENVIRONMENT')}")
-            if os.getenv("SERVER_ENVIRONMENT") == "LOCAL":
-                prefix = "test/" + prefix
-
-            if self.oss_service.is_available():
-                # 上传到OSS
-                success, result, public_url = self.oss_service.upload_temp_file(
-                    temp_file_path, 
-                    video_file.filename, 
-                    video_file.content_type,
-                    prefix=prefix,
-                    file_hash=file_hash
-                )
-                
-                if success:
-                    oss_object_key = result
-                    file_url = public_url
-                    self.logger.info(f"文件上传到OSS成功: {video_file.filename} -> {oss_object_key}")
-                else:
-                    self.logger.error(f"OSS上传失败: {result}")
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"文件上传失败: {result}"
-                    )
-            else:
-                # 降级到本地存储
-                file_url = f"/uploads/videos/{video_file.filename}"
-                self.logger.error("OSS不可用，请检查配置")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="OSS不可用，请检查配置"
-                )
-            
-            # 处理视频文件
-            process_method = getattr(self.video_service, process_func)
-            video = process_method(
-                video_file_path=temp_file_path,
-                item_id=item_id,
-                sku_id=sku_id,
+            # 处理视频文件：提取元数据、生成缩略图并保存，与 process_func 指定的处理函数步骤相同，按阶段分别执行
+            metadata = await self._probe_uploaded(result, temp_file_path)
+            await self.executor.run("probe", self.video_service.generate_thumbnails, temp_file_path, metadata, file_hash)
+            convert = (self.video_service.convert_to_video_material_model if model_cls is VideoMaterial
+                       else self.video_service.convert_to_video_model)
+            video_model = convert(
+                metadata=metadata,
                 file_url=file_url,
                 file_extension=file_extension,
                 oss_object_key=oss_object_key,
                 file_size=file_size,
-                platform=platform,
-                source=source,
                 file_hash=file_hash,
-                name=video_file.filename
+                **process_kwargs
             )
+            video = await self.executor.run("db", self.video_service.save_video_to_db, video_model)
             
-            # 构建视频信息
-            video_info = {
-                "id": video.id,
-                "file_extension": video.file_extension,
-                "url": video.url,
-                "file_hash": video.file_hash,
-                "oss_object_key": video.oss_object_key,
-                "file_size": video.file_size,
-                "item_id": video.item_id,
-                "sku_id": video.sku_id,
-                "status": video.status if hasattr(video, 'status') else None,
-                "width": video.width,
-                "height": video.height,
-                "duration": video.duration,
-                "format": video.format,
-                "bitrate": video.bitrate,
-                "frame_rate": video.frame_rate,
-                "audio_format": video.audio_format,
-                "audio_bitrate": video.audio_bitrate,
-                "audio_channels": video.audio_channels,
-                "platform": video.platform,
-                "source": video.source,
-                "is_oss_stored": bool(video.oss_object_key)
-            }
-            
-            return video_info, file_url, oss_object_key, file_size
+            return self._video_info(video), file_url, oss_object_key, file_size
             
         finally:
             # 清理临时文件
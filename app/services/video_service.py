@@ -2,17 +2,21 @@ import os
 import tempfile
 import logging
 import sys
-from typing import Dict, Any, Optional, Union
-import ffmpeg
-from sqlmodel import Session
+from typing import Dict, Any, Optional, Type, TypeVar, Union
+from sqlmodel import Session, select
 from app.internal.db import engine
-from app.models.video import VideoMaterial, Video
+from app.models.video import VideoMaterial, Video, VideoMataData
+from app.services.thumbnail_service import ThumbnailService
+from app.services.probe_service import ProbeService, get_probe_service
+
+VideoModel = TypeVar("VideoModel", VideoMaterial, Video)
 
 
 class VideoService:
     """视频素材处理服务"""
     
-    def __init__(self, logger: Optional[logging.Logger] = None):
+    def __init__(self, logger: Optional[logging.Logger] = None, thumbnail_service: Optional[ThumbnailService] = None,
+                 probe_service: Optional[ProbeService] = None):
         if logger is None:
             # 配置默认logger输出到stdout
             logging.basicConfig(
@@ -23,133 +27,36 @@ class VideoService:
             self.logger = logging.getLogger(__name__)
         else:
             self.logger = logger
+        self.thumbnail_service = thumbnail_service
+        self.probe_service = probe_service or get_probe_service(self.logger)
     
-    def _map_video_format(self, codec_name: str) -> str:
-        """
-        将 FFmpeg 的编码器名称映射为标准格式名称
-        
-        Args:
-            codec_name: FFmpeg 返回的编码器名称
-            
-        Returns:
-            标准格式名称
-        """
-        format_mapping = {
-            'h264': 'AVC',
-            'h265': 'HEVC',
-            'hevc': 'HEVC',
-            'vp8': 'VP8',
-            'vp9': 'VP9',
-            'av1': 'AV1',
-            'mpeg4': 'MPEG4',
-            'mpeg2video': 'MPEG2',
-            'wmv3': 'WMV',
-            'flv1': 'FLV',
-            'theora': 'Theora'
-        }
-        return format_mapping.get(codec_name.lower(), codec_name.upper())
-    
-    def _map_audio_format(self, codec_name: str) -> str:
+    def extract_video_metadata(self, video_path: str, file_hash: str = "") -> Dict[str, Any]:
         """
-        将 FFmpeg 的音频编码器名称映射为标准格式名称
+        使用 ffprobe 提取视频元数据
         
         Args:
-            codec_name: FFmpeg 返回的音频编码器名称
+            video_path: 视频文件路径或签名URL
+            file_hash: 文件哈希，提供时优先使用缓存的元数据
             
         Returns:
-            标准格式名称
-        """
-        format_mapping = {
-            'aac': 'AAC',
-            'mp3': 'MP3',
-            'opus': 'OPUS',
-            'vorbis': 'Vorbis',
-            'flac': 'FLAC',
-            'pcm_s16le': 'PCM',
-            'ac3': 'AC3',
-            'eac3': 'EAC3'
-        }
-        return format_mapping.get(codec_name.lower(), codec_name.upper())
-    
-    def _map_color_info(self, color_value: str) -> str:
-        """
-        将 FFmpeg 的色彩信息映射为标准格式
-        
-        Args:
-            color_value: FFmpeg 返回的色彩信息值
-            
-        Returns:
-            标准色彩信息格式
-        """
-        if not color_value or color_value.lower() in ['unknown', 'unspecified', '']:
-            return 'BT.709'
-        
-        color_mapping = {
-            'bt709': 'BT.709',
-            'bt.709': 'BT.709',
-            'rec709': 'BT.709',
-            'bt2020': 'BT.2020',
-            'bt.2020': 'BT.2020',
-            'rec2020': 'BT.2020',
-            'bt601': 'BT.601',
-            'bt.601': 'BT.601',
-            'rec601': 'BT.601',
-            'smpte170m': 'BT.601',
-            'smpte240m': 'SMPTE-240M',
-            'srgb': 'sRGB',
-            'displayp3': 'Display P3'
-        }
-        
-        return color_mapping.get(color_value.lower(), 'BT.709')
-    
-    def extract_video_metadata(self, video_path: str) -> Dict[str, Any]:
-        """
-        使用 ffmpeg 提取视频元数据
-        
-        Args:
-            video_path: 视频文件路径
-            
-        Returns:
-            包含视频元数据的字典
+            规范化的元数据，字段同 VideoMataData
         """
         try:
-            # 使用 ffprobe 获取视频信息
-            probe = ffmpeg.probe(video_path)
-            
-            # 获取视频流信息
-            video_stream = None
-            audio_stream = None
-            
-            for stream in probe['streams']:
-                if stream['codec_type'] == 'video' and video_stream is None:
-                    video_stream = stream
-                elif stream['codec_type'] == 'audio' and audio_stream is None:
-                    audio_stream = stream
-            
-            # 提取视频元数据
-            metadata = {
-                'format': probe['format'],
-                'video': video_stream,
-                'audio': audio_stream
-            }
-            
-            return metadata
-            
+            return self.probe_service.probe(video_path, file_hash)
         except Exception as e:
             self.logger.error(f"提取视频元数据失败: {str(e)}")
             raise
     
-    def convert_to_video_model(self, metadata: Dict[str, Any], item_id: str, sku_id: str, 
-                              file_url: str,
-                              file_extension: str = "", oss_object_key: str = "",
-                              file_size: int = 0, platform: str = "web", 
-                              author_id: str = "", owner_id: str = "", 
-                              source: str = "upload", file_hash: str = "", name: str = "") -> VideoMaterial:
+    def build_video_model(self, model_cls: Type[VideoModel], metadata: Dict[str, Any], item_id: str, sku_id: str,
+                          file_url: str, file_extension: str = "", oss_object_key: str = "",
+                          file_size: int = 0, platform: str = "web", author_id: str = "", owner_id: str = "",
+                          source: str = "upload", file_hash: str = "", name: str = "") -> VideoModel:
         """
-        将 ffmpeg 元数据转换为 VideoMaterial 模型
+        将规范化的元数据和文件信息转换为 VideoMaterial 或 Video 模型
         
         Args:
-            metadata: ffmpeg 提取的元数据
+            model_cls: VideoMaterial 或 Video
+            metadata: extract_video_metadata 返回的元数据
             item_id: 商品ID
             sku_id: SKU ID
             file_url: 文件URL
@@ -157,78 +64,22 @@ class VideoService:
             oss_object_key: OSS对象键
             file_size: 文件大小
             platform: 平台
-            author_id: 作者ID
+            author_id: 作者ID，仅 VideoMaterial 使用
             owner_id: 所有者ID
             source: 来源
             file_hash: 文件哈希
+            name: 视频名称
             
         Returns:
-            VideoMaterial 模型实例
+            模型实例
         """
-        format_info = metadata['format']
-        video_info = metadata['video'] or {}
-        audio_info = metadata['audio'] or {}
-        
-        # 提取基本信息
-        duration_ms = int(float(format_info.get('duration', 0)) * 1000)
-        file_id = os.path.basename(file_url)
-        
-        # 视频信息
-        width = int(video_info.get('width', 0))
-        height = int(video_info.get('height', 0))
-        video_bitrate = int(video_info.get('bit_rate', 0))
-        
-        # 帧率处理
-        frame_rate_str = video_info.get('r_frame_rate', '0/1')
-        if '/' in frame_rate_str:
-            num, den = frame_rate_str.split('/')
-            frame_rate = int(float(num) / float(den)) if float(den) != 0 else 0
-        else:
-            frame_rate = int(float(frame_rate_str))
-        
-        # 音频信息
-        audio_bitrate = int(audio_info.get('bit_rate', 0))
-        audio_channels = int(audio_info.get('channels', 0))
-        audio_sample_rate = int(audio_info.get('sample_rate', 0))
-        
-        # 色彩信息映射
-        colour_primaries = self._map_color_info(video_info.get('color_primaries', ''))
-        matrix_coefficients = self._map_color_info(video_info.get('color_space', ''))
-        transfer_characteristics = self._map_color_info(video_info.get('color_transfer', ''))
-        
-        # 旋转信息
-        rotation = 0
-        if 'tags' in video_info and 'rotate' in video_info['tags']:
-            rotation = int(video_info['tags']['rotate'])
-        
-        # 格式映射
-        video_format = self._map_video_format(video_info.get('codec_name', 'unknown'))
-        audio_format = self._map_audio_format(audio_info.get('codec_name', 'unknown'))
-        
-        # 创建 VideoMaterial 实例
-        self.logger.info(f"准备创建VideoMaterial实例，file_extension={file_extension}")
-        
-        video_material = Video(
+        video = model_cls(
+            **{field: metadata[field] for field in VideoMataData.model_fields},
             file_extension=file_extension,
             url=file_url,
             file_hash=file_hash,
             item_id=item_id,
             sku_id=sku_id,
-            width=width,
-            height=height,
-            duration=duration_ms,
-            format=video_format,
-            bitrate=video_bitrate,
-            frame_rate=frame_rate,
-            colour_primaries=colour_primaries,
-            matrix_coefficients=matrix_coefficients,
-            transfer_characteristics=transfer_characteristics,
-            rotation=rotation,
-            audio_bitrate=audio_bitrate,
-            audio_channels=audio_channels,
-            audio_duration=duration_ms,  # 通常音频和视频时长相同
-            audio_format=audio_format,
-            audio_sampling_rate=audio_sample_rate,
             platform=platform,
             owner_id=owner_id,
             source=source,
@@ -236,109 +87,21 @@ class VideoService:
             file_size=file_size,
             name=name
         )
-        
-        return video_material
+        if model_cls is VideoMaterial:
+            video.author_id = author_id
+        return video
     
-    def convert_to_video_material_model(self, metadata: Dict[str, Any], item_id: str, sku_id: str, 
-                              file_url: str,
-                              file_extension: str = "", oss_object_key: str = "",
-                              file_size: int = 0, platform: str = "web", 
-                              author_id: str = "", owner_id: str = "", 
-                              source: str = "upload", file_hash: str = "", name: str = "") -> VideoMaterial:
+    def convert_to_video_model(self, metadata: Dict[str, Any], item_id: str, sku_id: str, file_url: str, **kwargs) -> Video:
         """
-        将 ffmpeg 元数据转换为 VideoMaterial 模型
-        
-        Args:
-            metadata: ffmpeg 提取的元数据
-            item_id: 商品ID
-            sku_id: SKU ID
-            file_url: 文件URL
-            file_extension: 文件扩展名
-            oss_object_key: OSS对象键
-            file_size: 文件大小
-            platform: 平台
-            author_id: 作者ID
-            owner_id: 所有者ID
-            source: 来源
-            file_hash: 文件哈希
-            
-        Returns:
-            VideoMaterial 模型实例
+        将元数据转换为 Video 模型，参数同 build_video_model
         """
-        format_info = metadata['format']
-        video_info = metadata['video'] or {}
-        audio_info = metadata['audio'] or {}
-        
-        # 提取基本信息
-        duration_ms = int(float(format_info.get('duration', 0)) * 1000)
-        file_id = os.path.basename(file_url)
-        
-        # 视频信息
-        width = int(video_info.get('width', 0))
-        height = int(video_info.get('height', 0))
-        video_bitrate = int(video_info.get('bit_rate', 0))
-        
-        # 帧率处理
-        frame_rate_str = video_info.get('r_frame_rate', '0/1')
-        if '/' in frame_rate_str:
-            num, den = frame_rate_str.split('/')
-            frame_rate = int(float(num) / float(den)) if float(den) != 0 else 0
-        else:
-            frame_rate = int(float(frame_rate_str))
-        
-        # 音频信息
-        audio_bitrate = int(audio_info.get('bit_rate', 0))
-        audio_channels = int(audio_info.get('channels', 0))
-        audio_sample_rate = int(audio_info.get('sample_rate', 0))
-        
-        # 色彩信息映射
-        colour_primaries = self._map_color_info(video_info.get('color_primaries', ''))
-        matrix_coefficients = self._map_color_info(video_info.get('color_space', ''))
-        transfer_characteristics = self._map_color_info(video_info.get('color_transfer', ''))
-        
-        # 旋转信息
-        rotation = 0
-        if 'tags' in video_info and 'rotate' in video_info['tags']:
-            rotation = int(video_info['tags']['rotate'])
-        
-        # 格式映射
-        video_format = self._map_video_format(video_info.get('codec_name', 'unknown'))
-        audio_format = self._map_audio_format(audio_info.get('codec_name', 'unknown'))
-        
-        # 创建 VideoMaterial 实例
-        self.logger.info(f"准备创建VideoMaterial实例，file_extension={file_extension}")
-        
-        video_material = VideoMaterial(
-            file_extension=file_extension,
-            url=file_url,
-            file_hash=file_hash,
-            item_id=item_id,
-            sku_id=sku_id,
-            width=width,
-            height=height,
-            duration=duration_ms,
-            format=video_format,
-            bitrate=video_bitrate,
-            frame_rate=frame_rate,
-            colour_primaries=colour_primaries,
-            matrix_coefficients=matrix_coefficients,
-            transfer_characteristics=transfer_characteristics,
-            rotation=rotation,
-            audio_bitrate=audio_bitrate,
-            audio_channels=audio_channels,
-            audio_duration=duration_ms,  # 通常音频和视频时长相同
-            audio_format=audio_format,
-            audio_sampling_rate=audio_sample_rate,
-            platform=platform,
-            author_id=author_id,
-            owner_id=owner_id,
-            source=source,
-            oss_object_key=oss_object_key,
-            file_size=file_size,
-            name=name
-        )
-        
-        return video_material
+        return self.build_video_model(Video, metadata, item_id, sku_id, file_url, **kwargs)
+    
+    def convert_to_video_material_model(self, metadata: Dict[str, Any], item_id: str, sku_id: str, file_url: str, **kwargs) -> VideoMaterial:
+        """
+        将元数据转换为 VideoMaterial 模型，参数同 build_video_model
+        """
+        return self.build_video_model(VideoMaterial, metadata, item_id, sku_id, file_url, **kwargs)
     
     def save_video_to_db(self, video_model: Union[VideoMaterial, Video]) -> Union[VideoMaterial, Video]:
         """
@@ -361,10 +124,88 @@ class VideoService:
             self.logger.error(f"保存视频信息到数据库失败: {str(e)}")
             raise
     
+    def find_by_hash(self, file_hash: str) -> Optional[Union[VideoMaterial, Video]]:
+        """
+        按文件哈希查找已入库的视频，两张表中任意一条有OSS对象的记录即可复用
+        
+        Args:
+            file_hash: 文件SHA256哈希值
+            
+        Returns:
+            最早入库的记录，没有时返回 None
+        """
+        if not file_hash:
+            return None
+        with Session(engine) as session:
+            for model_cls in (Video, VideoMaterial):
+                existing = session.exec(
+                    select(model_cls).where(model_cls.file_hash == file_hash, model_cls.oss_object_key != "")
+                    .order_by(model_cls.id)
+                ).first()
+                if existing:
+                    return existing
+        return None
+
+    def reuse_video(self, existing: Union[VideoMaterial, Video], model_cls: type, item_id: str, sku_id: str,
+                    platform: str = "web", source: str = "upload", name: str = "",
+                    author_id: str = "", owner_id: str = "", **kwargs) -> Union[VideoMaterial, Video]:
+        """
+        复用已入库视频的OSS对象和元数据，不再上传和提取元数据
+        
+        同一商品下已有相同文件的记录时直接返回该记录，否则复制元数据新增一条记录
+        
+        Args:
+            existing: 相同哈希的已入库记录
+            model_cls: 目标模型 VideoMaterial 或 Video
+            其余参数同 process_video_file
+            
+        Returns:
+            目标表中的记录
+        """
+        with Session(engine) as session:
+            same = session.exec(
+                select(model_cls).where(model_cls.file_hash == existing.file_hash, model_cls.item_id == item_id)
+                .order_by(model_cls.id)
+            ).first()
+            if same:
+                self.logger.info(f"文件已存在，复用记录: {model_cls.__name__}.id={same.id}, hash={existing.file_hash}")
+                return same
+
+        values = {field: getattr(existing, field) for field in VideoMataData.model_fields}
+        video = model_cls(
+            **values,
+            file_hash=existing.file_hash,
+            file_extension=existing.file_extension,
+            file_size=existing.file_size,
+            oss_object_key=existing.oss_object_key,
+            url=existing.url,
+            item_id=item_id,
+            sku_id=sku_id,
+            platform=platform,
+            source=source,
+            owner_id=owner_id,
+            name=name or existing.name,
+        )
+        if model_cls is VideoMaterial:
+            video.author_id = author_id
+        self.logger.info(f"文件已存在，复用OSS对象 {existing.oss_object_key}: {existing.__class__.__name__}.id={existing.id}")
+        return self.save_video_to_db(video)
+
+    def generate_thumbnails(self, video_file_path: str, metadata: Dict[str, Any], file_hash: str):
+        """
+        截取封面和缩略图，失败不影响视频入库，之后的页面和发布会回退到 OSS 截帧
+        """
+        if not self.thumbnail_service or not file_hash:
+            return
+        try:
+            self.thumbnail_service.generate(video_file_path, file_hash, metadata.get('duration', 0) / 1000)
+        except Exception as e:
+            self.logger.error(f"生成缩略图失败: {str(e)}")
+
     def process_video_material_file(self, video_file_path: str, item_id: str, sku_id: str, 
                           file_url: str, **kwargs) -> VideoMaterial:
         """
-        处理视频文件：提取元数据并保存到数据库
+        处理视频文件：提取元数据、生成缩略图并保存到数据库
         
         Args:
             video_file_path: 视频文件路径
@@ -377,7 +218,8 @@ class VideoService:
             保存后的 VideoMaterial 实例
         """
         # 提取元数据
-        metadata = self.extract_video_metadata(video_file_path)
+        metadata = self.extract_video_metadata(video_file_path, kwargs.get('file_hash', ''))
+        self.generate_thumbnails(video_file_path, metadata, kwargs.get('file_hash', ''))
         
         # 转换为 VideoMaterial 模型
         video_material = self.convert_to_video_material_model(
@@ -394,9 +236,10 @@ class VideoService:
     def process_video_file(self, video_file_path: str, item_id: str, sku_id: str, 
                           file_url: str, **kwargs) -> VideoMaterial:
         """
-        处理视频文件：提取元数据并保存到数据库
+        处理视频文件：提取元数据、生成缩略图并保存到数据库
         """
-        metadata = self.extract_video_metadata(video_file_path)
+        metadata = self.extract_video_metadata(video_file_path, kwargs.get('file_hash', ''))
+        self.generate_thumbnails(video_file_path, metadata, kwargs.get('file_hash', ''))
 
         video = self.convert_to_video_model(
             metadata=metadata,
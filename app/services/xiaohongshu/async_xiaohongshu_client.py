@@ -0,0 +1,205 @@
+import asyncio
+import importlib.util
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+import xmltodict
+
+from .rate_limiter import RateLimiter
+from .xiaohongshu_client import BaseXiaohongshuClient, XiaohongshuConfig, XiaohongshuRequest
+
+
+class AsyncXiaohongshuClient(BaseXiaohongshuClient):
+    """小红书API异步客户端
+
+    基于 httpx.AsyncClient 连接池，连接保持复用，安装了 h2 时启用 HTTP/2，
+    每个域名的并发请求数受 MAX_CONNECTIONS_PER_HOST 限制。
+    签名、认证等请求头按请求生成，不修改共享状态，可在多个协程中并发使用。
+    COS 上传请求（限流类别 upload）使用单独的连接池，不带小红书接口的公共请求头，
+    与同步客户端的 upload_session 一致。
+    """
+
+    def __init__(self, config: Optional[XiaohongshuConfig] = None, logger: Optional[logging.Logger] = None,
+                 rate_limiter: Optional[RateLimiter] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """初始化客户端
+
+        Args:
+            config: API配置，如果不提供则使用默认配置
+            logger: 日志记录器，如果不提供则使用默认记录器
+            rate_limiter: 限流器，如果不提供则使用跨进程共享的限流器
+            transport: httpx 传输层，默认使用网络连接，测试时可替换
+        """
+        super().__init__(config, logger, rate_limiter)
+        self.client = self._create_client({'User-Agent': self.config.USER_AGENT, **self._get_default_headers()}, transport)
+        self.upload_client = self._create_client({'User-Agent': self.config.USER_AGENT}, transport)
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _create_client(self, headers: Dict[str, str], transport: Optional[httpx.AsyncBaseTransport]) -> httpx.AsyncClient:
+        """创建连接池"""
+        http2 = self.config.HTTP2 and importlib.util.find_spec("h2") is not None
+        return httpx.AsyncClient(
+            headers=headers,
+            timeout=self.config.TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=self.config.MAX_CONNECTIONS,
+                max_keepalive_connections=self.config.MAX_CONNECTIONS,
+                keepalive_expiry=self.config.KEEPALIVE_EXPIRY,
+            ),
+            http2=http2,
+            transport=transport,
+        )
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """获取域名对应的并发信号量"""
+        host = urlparse(url).hostname or ""
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.config.MAX_CONNECTIONS_PER_HOST)
+        return self._host_semaphores[host]
+
+    async def _acquire(self, url: str, category: str = ""):
+        """获取限流令牌，等待期间不阻塞事件循环"""
+        # 共享状态存储可能涉及文件锁或网络，放到线程中执行
+        wait = await asyncio.to_thread(self.rate_limiter.reserve, url, category)
+        if wait > 0:
+            self.logger.info(f"Rate limiting: sleeping for {wait:.2f} seconds")
+            await asyncio.sleep(wait)
+
+    async def _feedback(self, url: str, status_code: Optional[int], retry_after: Optional[str] = None, category: str = "",
+                        response_data: Optional[Dict[str, Any]] = None):
+        """将响应结果反馈给限流器"""
+        await asyncio.to_thread(self.rate_limiter.feedback, url, status_code, retry_after, category, response_data)
+
+    async def send_raw(self, method: str, url: str, rate_limit_category: str = "", **kwargs) -> httpx.Response:
+        """经过限流和连接池发送一次请求，不签名、不重试
+
+        用于 COS 分片上传等不需要小红书签名的请求。
+
+        Args:
+            method: HTTP方法
+            url: 完整请求地址
+            rate_limit_category: 限流类别，为空时按地址确定；为 upload 时使用不带公共请求头的连接池
+            **kwargs: 传给 httpx 的其他参数（params、headers、content 等）
+
+        Returns:
+            httpx.Response: 响应对象
+
+        Raises:
+            httpx.HTTPError: 请求异常
+        """
+        response, _ = await self._send(method, url, rate_limit_category, "", **kwargs)
+        return response
+
+    async def _send(self, method: str, url: str, rate_limit_category: str, reponse_format: str,
+                    **kwargs) -> Tuple[httpx.Response, Optional[Dict[str, Any]]]:
+        """发送一次请求并反馈给限流器，reponse_format 为 json 时解析响应体，业务层的限流错误同样会降速
+
+        Returns:
+            (响应对象, 解析后的 JSON 响应体，不是 JSON 对象或未要求解析时为 None)
+        """
+        await self._acquire(url, rate_limit_category)
+        try:
+            async with self._get_host_semaphore(url):
+                client = self.upload_client if rate_limit_category == "upload" else self.client
+                response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            await self._feedback(url, None, category=rate_limit_category)
+            raise
+        response_data = self._parse_json(response) if reponse_format == "json" else None
+        await self._feedback(url, response.status_code, response.headers.get("Retry-After"), rate_limit_category,
+                             response_data)
+        return response, response_data
+
+    async def _make_request(self, method: str, path: str, api_base_url: str = "", params: Optional[Dict] = None,
+                            data: Optional[Dict] = None, headers: Optional[Dict] = None, reponse_format: str = "json",
+                            need_sign: bool = True, rate_limit_category: str = "", **kwargs) -> Dict[str, Any]:
+        """发送HTTP请求，参数和返回值与同步客户端的 _make_request 一致
+
+        Args:
+            method: HTTP方法
+            path: API路径
+            data: 请求数据
+            **kwargs: 其他请求参数
+
+        Returns:
+            API响应数据
+
+        Raises:
+            httpx.HTTPError: 请求异常
+        """
+        request = self.build_request(method, path, api_base_url, params, data, headers, reponse_format, need_sign,
+                                     rate_limit_category)
+        self.logger.info(f"Making request to: {request.url} [method: {method}]")
+        if data and isinstance(data, bytes):
+            self.logger.info(f"Request data: {data[:100]} bytes")
+        else:
+            self.logger.info(f"Request data: {data}")
+        return await self.send_request(request, **kwargs)
+
+    async def send_request(self, request: XiaohongshuRequest, **kwargs) -> Dict[str, Any]:
+        """发送构建完成的请求，失败时重试
+
+        Args:
+            request: 构建完成的请求
+            **kwargs: 传给 httpx 的其他参数
+
+        Returns:
+            API响应数据
+
+        Raises:
+            httpx.HTTPError: 请求异常
+        """
+        method, url, reponse_format = request.method, request.url, request.response_format
+        kwargs.update(headers=request.headers, params=request.params, content=request.body)
+
+        for attempt in range(self.config.MAX_RETRIES):
+            try:
+                self.logger.info(f"Sending {method} request to {url} (attempt {attempt + 1}/{self.config.MAX_RETRIES})")
+                response, response_data = await self._send(method, url, request.rate_limit_category, reponse_format,
+                                                           **kwargs)
+                self.logger.info(f"Response status code: {response.status_code}")
+                if self._should_retry(response, response_data) and attempt < self.config.MAX_RETRIES - 1:
+                    self.logger.warning(f"Too many requests (attempt {attempt + 1}/{self.config.MAX_RETRIES})")
+                    continue
+
+                if reponse_format == "xml":
+                    return xmltodict.parse(response.text)
+                if reponse_format != "json":
+                    return response.text
+                if response_data is None:
+                    self.logger.warning(f"Failed to parse JSON response: {response.text}")
+                    return {"raw_response": response.text, "status_code": response.status_code}
+                if self.is_success(response_data):
+                    return response_data
+                self.logger.error(f"Response data: {json.dumps(response_data, ensure_ascii=False, indent=2)}")
+                return {"response": response.text, "status_code": response.status_code}
+
+            except httpx.TimeoutException:
+                self.logger.warning(f"Request timeout (attempt {attempt + 1}/{self.config.MAX_RETRIES})")
+                if attempt == self.config.MAX_RETRIES - 1:
+                    raise
+
+            except httpx.HTTPError as e:
+                self.logger.error(f"Request error (attempt {attempt + 1}/{self.config.MAX_RETRIES}): {str(e)}")
+                if attempt == self.config.MAX_RETRIES - 1:
+                    raise
+
+        raise httpx.HTTPError("All retry attempts failed")
+
+    async def map(self, xhs_requests: Iterable[XiaohongshuRequest], return_exceptions: bool = False) -> List[Any]:
+        """并发发送一批请求，返回与请求顺序一致的响应数据列表"""
+        return await asyncio.gather(*[self.send_request(request) for request in xhs_requests],
+                                    return_exceptions=return_exceptions)
+
+    async def close(self):
+        """关闭连接池"""
+        await self.client.aclose()
+        await self.upload_client.aclose()
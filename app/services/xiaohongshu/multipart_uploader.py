@@ -0,0 +1,148 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+
+from .rate_limiter import RateLimiter
+
+
+class MultipartUploader:
+    """COS分片并发上传
+
+    调用线程按顺序读取分片，同时最多 concurrency 个分片在上传，
+    读取下一个分片前需要等待空闲的上传槽位，内存中最多保留 concurrency 个分片。
+    每个分片失败后按指数退避重试，任一分片最终失败时停止读取并抛出异常。
+    续传时跳过已上传的分片，每个分片上传成功后通过回调通知调用方保存进度。
+    """
+
+    def __init__(self, session: requests.Session, concurrency: int = 4, max_retries: int = 3,
+                 backoff: float = 1.0, timeout: int = 120, rate_limiter: Optional[RateLimiter] = None,
+                 logger: Optional[logging.Logger] = None):
+        """初始化分片上传器
+
+        Args:
+            session: 上传使用的HTTP会话，复用连接
+            concurrency: 并发上传的分片数
+            max_retries: 每个分片的最大尝试次数
+            backoff: 重试退避的基础秒数，第 n 次重试等待 backoff * 2^(n-1) 秒再加随机抖动
+            timeout: 单个分片请求超时（秒）
+            rate_limiter: 限流器，为空时不限流
+            logger: 日志记录器
+        """
+        self.session = session
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(1, max_retries)
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.logger = logger or logging.getLogger(__name__)
+
+    def upload(self, url: str, token: str, upload_id: str, chunk_stream: Iterable[bytes],
+               total_chunks: Optional[int] = None, uploaded: Optional[Dict[int, str]] = None,
+               on_part: Optional[Callable[[int, str], None]] = None) -> List[Dict[str, str]]:
+        """并发上传所有分片
+
+        Args:
+            url: 对象地址
+            token: 上传token
+            upload_id: 分片上传ID
+            chunk_stream: 按顺序产生分片数据的可迭代对象，分片带有 part_number 属性时以其为分片序号
+            total_chunks: 分片总数，仅用于日志
+            uploaded: 已上传的分片 {分片序号: ETag}，这些分片不再上传
+            on_part: 分片上传成功后的回调，参数为分片序号和ETag，在上传线程中调用
+
+        Returns:
+            List[Dict[str, str]]: 按分片序号排列的 PartNumber 和 ETag
+        """
+        uploaded = dict(uploaded or {})
+        slots = threading.BoundedSemaphore(self.concurrency)
+        errors: List[Exception] = []
+        futures: Dict[int, Future] = {}
+
+        def done(chunk, part_number: int, future: Future):
+            if future.cancelled():
+                errors.append(Exception("part upload cancelled"))
+            elif future.exception() is not None:
+                errors.append(future.exception())
+            elif on_part:
+                try:
+                    on_part(part_number, future.result())
+                except Exception as e:
+                    self.logger.warning(f"Failed to record part {part_number}: {str(e)}")
+            self._release_chunk(chunk)
+            slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="cos-part") as executor:
+            try:
+                for index, chunk in enumerate(chunk_stream, 1):
+                    part_number = getattr(chunk, "part_number", index)
+                    if part_number in uploaded:
+                        self._release_chunk(chunk)
+                        continue
+                    slots.acquire()
+                    if errors:
+                        self._release_chunk(chunk)
+                        slots.release()
+                        break
+                    self.logger.info(f"Uploading part {part_number}/{total_chunks}")
+                    future = executor.submit(self.upload_part, url, token, upload_id, part_number, chunk)
+                    future.add_done_callback(lambda f, chunk=chunk, part_number=part_number: done(chunk, part_number, f))
+                    futures[part_number] = future
+            except BaseException:
+                for future in futures.values():
+                    future.cancel()
+                raise
+
+            for part_number, future in futures.items():
+                uploaded[part_number] = future.result()
+        if uploaded:
+            self.logger.info(f"Uploaded {len(futures)} parts, reused {len(uploaded) - len(futures)} parts")
+        return [{"PartNumber": str(number), "ETag": uploaded[number]} for number in sorted(uploaded)]
+
+    @staticmethod
+    def _release_chunk(chunk):
+        """分片来自预取中继时归还其缓冲区"""
+        release = getattr(chunk, "release", None)
+        if release:
+            release()
+
+    def upload_part(self, url: str, token: str, upload_id: str, part_number: int, chunk: bytes) -> str:
+        """上传单个分片，失败时退避重试
+
+        chunk 可以是 bytes，也可以是提供 reader() 的中继分片（每次尝试从头读取，不复制整个分片）
+
+        Returns:
+            分片的ETag
+        """
+        headers = {
+            "content-type": "application/octet-stream",
+            "x-cos-security-token": token
+        }
+        params = {"partNumber": part_number, "uploadId": upload_id}
+        for attempt in range(1, self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire(url, "upload")
+            try:
+                data = chunk.reader() if hasattr(chunk, "reader") else chunk
+                response = self.session.put(url, params=params, headers=headers, data=data, timeout=self.timeout)
+                if self.rate_limiter:
+                    self.rate_limiter.feedback(url, response.status_code, response.headers.get("Retry-After"), "upload")
+                etag = response.headers.get("ETag")
+                if response.status_code == 200 and etag:
+                    self.logger.info(f"Successfully uploaded part {part_number}, size: {len(chunk)}, ETag: {etag}")
+                    return etag
+                error = Exception(f"Failed to upload part {part_number}, status {response.status_code}: {response.text[:200]}")
+            except requests.RequestException as e:
+                if self.rate_limiter:
+                    self.rate_limiter.feedback(url, None, category="upload")
+                error = e
+
+            if attempt == self.max_retries:
+                raise error
+            wait = self.backoff * 2 ** (attempt - 1) + random.uniform(0, self.backoff)
+            self.logger.warning(f"Part {part_number} attempt {attempt}/{self.max_retries} failed: {error}, retrying in {wait:.2f}s")
+            time.sleep(wait)
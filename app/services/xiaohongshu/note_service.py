@@ -1,37 +1,48 @@
+import asyncio
 import logging
-from typing import Dict, Any, Optional, Tuple, Generator, List
+import random
+from typing import Dict, Any, Optional, Tuple, Generator, List, Callable
+import time
+import hashlib
 from datetime import datetime
 import pytz
 import xmltodict
 import json
 from sqlmodel import select, Session
 from app.internal.db import engine
-from app.models.video import Video
+from app.models.video import Video, XhsMediaUpload
 
 from app.services.xiaohongshu.xiaohongshu_client import XiaohongshuClient, XiaohongshuConfig
+from app.services.xiaohongshu.async_xiaohongshu_client import AsyncXiaohongshuClient
+from app.services.xiaohongshu.topic_cache import TopicCache
+from app.services.xiaohongshu.multipart_uploader import MultipartUploader
+from app.services.xiaohongshu.upload_state import UploadStateStore
+from app.services.xiaohongshu.upload_permit_pool import UploadPermit, UploadPermitPool, AsyncUploadPermitPool
 from app.models.xiaohongshu import XiaohongshuNoteBuilder
 from app.models.product import ProductArticle, ArticleStatus, Tag, ArticleVideoMapping
 from app.config.auth_config import AuthConfig
-from app.services.oss_service import OSSService
+from app.config.xhs_upload_config import XhsUploadConfig
+from app.services.oss_service import OSSService, get_oss_service
+from app.services.thumbnail_service import ThumbnailService
 import xml.etree.ElementTree as ET
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 
-class NoteService:
-    """笔记发送服务"""
+# 发布笔记失败时，错误信息同时包含文件和无效原因的关键字才认为复用的文件ID已失效
+INVALID_FILE_SUBJECTS = ("fileid", "file_id", "file id", "文件", "视频", "封面")
+INVALID_FILE_REASONS = ("无效", "失效", "过期", "不存在", "invalid", "expired", "not exist", "not found")
+
+class BaseNoteService:
+    """笔记发送服务公共部分：请求参数、响应解析与笔记构建，与同步/异步实现无关"""
     
     def __init__(self, logger: Optional[logging.Logger] = None):
         self.logger = logger or logging.getLogger(__name__)
-        self.client = XiaohongshuClient(logger=self.logger)
 
-    def set_topic_tags(self, article_data: ProductArticle, builder: XiaohongshuNoteBuilder):
-        """
-        设置话题标签
-        """
-        for tag in article_data.tags.split(","):
-            params = {"keyword":tag,"suggest_topic_request":{"title":"","desc":""},"page":{"page_size":20,"page":1}}
-            response = self.client._make_request("POST", "/web_api/sns/v1/search/topic", api_base_url="https://edith.xiaohongshu.com", data=params)
-            if tagsInfo := response["data"].get("topic_info_dtos", []):
-                tagInfo = tagsInfo[0]
+    def _add_topic_tags(self, builder: XiaohongshuNoteBuilder, tags: List[str], topics: Dict[str, Optional[Dict[str, str]]]):
+        """按标签顺序将解析到的话题添加到笔记"""
+        for tag in tags:
+            if tagInfo := topics.get(tag):
                 # 添加 autoPlayMedioBack=yes 参数到链接
                 link = tagInfo["link"]
                 if "?" in link:
@@ -40,19 +51,247 @@ class NoteService:
                     link += "?autoPlayMedioBack=yes"
                 builder.add_hashtag(tagInfo["id"], tagInfo["name"], link)
 
+    def _upload_permit_params(self, scene: str, file_count: int = 1) -> Dict[str, Any]:
+        """上传许可请求参数"""
+        return {"biz_name": "spectrum", "scene": scene, "file_count": file_count, "version": "1", "source": "web"}
+
+    def _parse_upload_permits(self, response: Dict[str, Any], default_ttl: int) -> List[UploadPermit]:
+        """解析上传许可响应，每个文件ID对应一个许可，token过期时间没有给出时按 default_ttl 秒估算"""
+        upload_permits = (response.get("data") or {}).get("uploadTempPermits") or []
+        if not upload_permits:
+            self.logger.error(f"获取上传许可失败: {response}")
+            return []
+        self.logger.info(f"上传许可: {upload_permits}")
+        now = int(time.time() * 1000)
+        permits = []
+        for upload_permit in upload_permits:
+            expire_time = upload_permit.get("expireTime")
+            if isinstance(expire_time, (int, float)) and expire_time > 0:
+                # 兼容秒和毫秒
+                expire_at = int(expire_time if expire_time > 10 ** 12 else expire_time * 1000)
+            else:
+                expire_at = now + default_ttl * 1000
+            for file_id in upload_permit.get("fileIds") or []:
+                permits.append(UploadPermit(upload_permit["uploadAddr"], upload_permit["token"], file_id, expire_at))
+        return permits
+
+    def _parse_upload_ids(self, response: Dict[str, Any], file_id: str) -> List[str]:
+        """解析进行中的分片上传列表，返回该文件的上传ID"""
+        uploads = (response.get("ListMultipartUploadsResult") or {}).get("Upload") or []
+        if isinstance(uploads, dict):
+            uploads = [uploads]
+        return [upload.get("UploadId", "") for upload in uploads if upload.get("Key") == file_id]
+
+    def _parse_list_parts(self, response: Dict[str, Any]) -> Tuple[Dict[int, str], Optional[str]]:
+        """解析已上传分片列表
+
+        Returns:
+            ({分片序号: ETag}, 下一页的分片序号标记，没有更多时为 None)
+        """
+        result = response.get("ListPartsResult") or {}
+        items = result.get("Part") or []
+        if isinstance(items, dict):
+            items = [items]
+        parts = {int(item["PartNumber"]): item["ETag"] for item in items}
+        truncated = str(result.get("IsTruncated", "false")).lower() == "true"
+        return parts, result.get("NextPartNumberMarker") if truncated else None
+
+    def _upload_source_key(self, video: Video) -> str:
+        """续传和上传登记使用的源文件标识"""
+        return video.file_hash or video.oss_object_key
+
+    def _find_reusable_media(self, upload_state: UploadStateStore, source_key: str, ttl: int) -> Tuple[Optional[str], Optional[str]]:
+        """查找有效期内同一文件已上传的视频和封面，两者分别复用
+
+        Returns:
+            (视频文件ID, 封面文件ID)，没有可复用的上传时对应项为 None
+        """
+        video_upload = upload_state.find_completed(source_key, "video", ttl)
+        cover_upload = upload_state.find_completed(source_key, "image", ttl)
+        video_file_id = video_upload.file_id if video_upload else None
+        cover_file_id = cover_upload.file_id if cover_upload else None
+        if video_file_id or cover_file_id:
+            self.logger.info(f"复用已上传的视频 {video_file_id or '-'} 和封面 {cover_file_id or '-'}")
+        return video_file_id, cover_file_id
+
+    @staticmethod
+    def _reused_scenes(video_file_id: Optional[str], cover_file_id: Optional[str]) -> List[str]:
+        """复用了上传登记的场景"""
+        return [scene for scene, file_id in (("video", video_file_id), ("image", cover_file_id)) if file_id]
+
+    def _is_invalid_file_error(self, response: Dict[str, Any]) -> bool:
+        """发布失败是否因为文件ID无效或过期
+
+        只有小红书明确返回文件无效时才作废上传登记；请求异常、超时和 5xx 与文件无关，
+        作废会让下次发布无谓地重新上传
+        """
+        status_code = response.get("status_code")
+        if not isinstance(status_code, int) or status_code >= 500:
+            return False
+        text = response.get("response") or ""
+        try:
+            data = json.loads(text)
+            message = f"{data.get('msg') or data.get('message') or ''} {data.get('code', '')}"
+        except (ValueError, AttributeError):
+            message = text
+        message = message.lower()
+        return (any(keyword in message for keyword in INVALID_FILE_SUBJECTS)
+                and any(keyword in message for keyword in INVALID_FILE_REASONS))
+
+    def _parse_complete_result(self, status_code: int, text: str) -> Dict[str, Any]:
+        """解析完成分片上传的响应"""
+        if status_code != 200:
+            raise Exception(f"Complete upload failed with status {status_code}: {text}")
+        
+        # 解析响应
+        result = xmltodict.parse(text)
+        
+        if "CompleteMultipartUploadResult" not in result:
+            raise Exception(f"Invalid complete response: {text}")
+        
+        complete_result = result["CompleteMultipartUploadResult"]
+        return {
+            "file_id": complete_result.get("Key", ""),
+            "etag": complete_result.get("ETag", "")
+        }
+
+    def _build_complete_xml(self, parts: List[Dict[str, str]]) -> str:
+        """构建完成上传的XML请求体"""
+        # 手动构建XML声明，确保格式完全匹配
+        xml_declaration = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        
+        root = ET.Element('CompleteMultipartUpload')
+        for part in sorted(parts, key=lambda x: int(x["PartNumber"])):
+            part_elem = ET.SubElement(root, 'Part')
+            part_number = ET.SubElement(part_elem, 'PartNumber')
+            part_number.text = part["PartNumber"]
+            etag = ET.SubElement(part_elem, 'ETag')
+            etag.text = part["ETag"]
+        
+        # 不使用ET的xml_declaration，而是手动拼接
+        body = ET.tostring(root, encoding='UTF-8', xml_declaration=False).decode('utf-8')
+        return xml_declaration + body
+
+    def _create_builder(self, article_data: ProductArticle) -> XiaohongshuNoteBuilder:
+        """创建笔记构建器并设置标题和正文"""
+        builder = XiaohongshuNoteBuilder()
+        
+        # 设置基本信息
+        builder.set_title(article_data.title)
+        tags = article_data.tags.split(",")
+        description = f"{article_data.content}\n\n"
+        for tag in tags:
+            description += f"#{tag}[话题]# "
+        builder.set_description(description)
+        return builder
+
+    def _find_video(self, article_data: ProductArticle, goods_id: str) -> Optional[Video]:
+        """查找文章待发布的视频，没有时使用商品的任一可用视频"""
+        video = None
+        with Session(engine) as session:
+            article_video_mapping = session.exec(
+                select(ArticleVideoMapping).where(ArticleVideoMapping.article_id == article_data.id, ArticleVideoMapping.status == "pending_publish")
+            ).first()
+            if article_video_mapping:
+                video = session.exec(select(Video).where(Video.id == article_video_mapping.video_id, Video.is_enabled == True)).first()
+            else:
+                self.logger.info(f"没有找到待发布视频: {article_data.id}")
+            if not video:
+                self.logger.warning(f"没有找到待发布视频: {article_video_mapping.video_id if article_video_mapping else article_data.id}")
+                video = session.exec(
+                    select(Video).where(Video.sku_id == goods_id, Video.is_enabled == True)
+                ).first()
+                if not video:
+                    self.logger.info(f"没有找到可用视频: {goods_id}")
+        return video
+
+    def _add_goods_relation(self, builder: XiaohongshuNoteBuilder, goods_id: str, goods_name: str):
+        """设置商品信息"""
+        extra_info = {
+            'goods_id': goods_id,
+            'goods_name': goods_name,
+            'goods_type': 'goods_seller',
+            'tab_id': 1,
+            'image_type': 'spec',
+            'left_bottom_type': 'BUY_GOODS',
+            'bind_order': 0
+        }
+        builder.add_biz_relation(
+            biz_type="GOODS_SELLER_V2",
+            biz_id=goods_id,
+            extra_info=json.dumps(extra_info)
+        )
+
+    def _get_cover_url(self, oss_service: OSSService, video: Video) -> str:
+        """生成视频截帧封面的签名地址，用于上传时没有生成封面的历史视频"""
+        return ThumbnailService(oss_service, self.logger).snapshot_url(video, "full")
+
+    def _read_stored_cover(self, oss_service: OSSService, video: Video) -> Optional[bytes]:
+        """读取上传视频时生成的封面，没有时返回 None"""
+        try:
+            return ThumbnailService(oss_service, self.logger).read(video.file_hash, "full")
+        except Exception as e:
+            self.logger.warning(f"读取视频封面失败，改用OSS截帧: {video.file_hash}, {str(e)}")
+            return None
+
+
+class NoteService(BaseNoteService):
+    """笔记发送服务"""
+    
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        super().__init__(logger)
+        self.client = XiaohongshuClient(logger=self.logger)
+        self.topic_cache = TopicCache(self.client, self.logger)
+        # COS上传使用独立会话复用连接，不携带小红书的认证请求头
+        config = self.client.config
+        self.upload_session = requests.Session()
+        self.upload_session.mount("https://", HTTPAdapter(pool_maxsize=max(XhsUploadConfig.UPLOAD_CONCURRENCY, 10)))
+        self.uploader = MultipartUploader(
+            self.upload_session,
+            concurrency=XhsUploadConfig.UPLOAD_CONCURRENCY,
+            max_retries=XhsUploadConfig.UPLOAD_PART_RETRIES,
+            backoff=XhsUploadConfig.UPLOAD_RETRY_BACKOFF,
+            timeout=config.TIMEOUT,
+            rate_limiter=self.client.rate_limiter,
+            logger=self.logger,
+        )
+        self.upload_state = UploadStateStore(self.logger)
+        self.permit_pool = UploadPermitPool(
+            self._request_upload_permits,
+            batch_size=XhsUploadConfig.UPLOAD_PERMIT_BATCH,
+            low_watermark=XhsUploadConfig.UPLOAD_PERMIT_LOW_WATERMARK,
+            expire_margin=UploadStateStore.EXPIRE_MARGIN,
+            logger=self.logger,
+        )
+
+    def set_topic_tags(self, article_data: ProductArticle, builder: XiaohongshuNoteBuilder):
+        """
+        设置话题标签
+        """
+        # 优先使用话题缓存，未命中的话题并发查询
+        tags = article_data.tags.split(",")
+        self._add_topic_tags(builder, tags, self.topic_cache.resolve(tags))
+
     def _get_upload_permit(self, scene: str = "video") -> Tuple[str, str, str]:
         """
         获取上传许可
         """
-        params = {"biz_name": "spectrum", "scene": scene, "file_count": 1, "version": "1", "source": "web"}
+        upload_addr, token, file_id, _ = self._get_upload_permit_with_expire(scene)
+        return upload_addr, token, file_id
+
+    def _get_upload_permit_with_expire(self, scene: str = "video") -> Tuple[str, str, str, int]:
+        """
+        从许可池获取上传许可及token过期时间（毫秒）
+        """
+        return tuple(self.permit_pool.acquire(scene))
+
+    def _request_upload_permits(self, scene: str, file_count: int) -> List[UploadPermit]:
+        """
+        请求一批上传许可
+        """
+        params = self._upload_permit_params(scene, file_count)
         response = self.client._make_request("GET", "/api/media/v1/upload/creator/permit", api_base_url="https://creator.xiaohongshu.com", params=params)
-        if upload_permits:=response["data"].get("uploadTempPermits", []):
-            upload_permit = upload_permits[0]
-            self.logger.info(f"上传许可: {upload_permit}")
-            return upload_permit['uploadAddr'], upload_permit['token'], upload_permit['fileIds'][0]
-        else:
-            self.logger.error(f"获取上传许可失败: {response}")
-            return None, None, None
+        return self._parse_upload_permits(response, XhsUploadConfig.UPLOAD_TOKEN_TTL)
         
     def _init_upload_chunk(self, upload_addr: str, token: str, file_id: str) -> Dict[str, Any]:
         """
@@ -60,7 +299,8 @@ class NoteService:
         """
         params = {"uploads":"", "prefix": file_id}
         response = self.client._make_request("GET", "", api_base_url=f"https://{upload_addr}",
-                                              params=params, headers={"x-cos-security-token": token}, reponse_format="xml")
+                                              params=params, headers={"x-cos-security-token": token}, reponse_format="xml",
+                                              rate_limit_category="upload")
         self.logger.info(f"初始化上传分块响应: {response}")
         return response
     
@@ -70,11 +310,63 @@ class NoteService:
         """
         params = {"uploads":""}
         response = self.client._make_request("POST", "/"+file_id, api_base_url=f"https://{upload_addr}",
-                                              params=params, headers={"x-cos-security-token": token}, reponse_format="xml")
+                                              params=params, headers={"x-cos-security-token": token}, reponse_format="xml",
+                                              rate_limit_category="upload")
         self.logger.info(f"初始化上传桶响应: {response}")
         return response.get("InitiateMultipartUploadResult", {}).get("UploadId", "")
     
-    def _upload_chunk(self, upload_addr: str, token: str, file_id: str, upload_id: str, chunk_stream: Generator[bytes, None, None], file_info: dict) -> List[Dict[str, str]]:
+    def _list_uploaded_parts(self, upload_addr: str, token: str, file_id: str, upload_id: str) -> Dict[int, str]:
+        """
+        查询COS中已上传的分片
+        
+        Returns:
+            Dict[int, str]: {分片序号: ETag}
+        """
+        parts: Dict[int, str] = {}
+        marker = None
+        while True:
+            params = {"uploadId": upload_id}
+            if marker:
+                params["part-number-marker"] = marker
+            response = self.client._make_request("GET", "/"+file_id, api_base_url=f"https://{upload_addr}",
+                                                  params=params, headers={"x-cos-security-token": token}, reponse_format="xml",
+                                                  rate_limit_category="upload")
+            page, marker = self._parse_list_parts(response)
+            parts.update(page)
+            if not marker:
+                return parts
+
+    def _resume_upload(self, source_key: str, file_info: dict) -> Optional[Tuple[XhsMediaUpload, Dict[int, str]]]:
+        """
+        查找可续传的上传任务，并以COS中实际存在的分片为准
+        
+        Returns:
+            (上传状态, 已上传分片)，没有可续传的任务时返回 None
+        """
+        part_size = file_info.get('chunk_size', XhsUploadConfig.UPLOAD_PART_SIZE)
+        state = self.upload_state.find_resumable(source_key, "video", part_size)
+        if not state:
+            return None
+        if state.total_parts != file_info['total_chunks']:
+            self.upload_state.expire(state)
+            return None
+        try:
+            # 通过进行中的分片上传列表确认上传任务仍然有效
+            listing = self._init_upload_chunk(state.upload_addr, state.token, state.file_id)
+            if state.upload_id not in self._parse_upload_ids(listing, state.file_id):
+                self.logger.info(f"上传任务已失效，重新上传: {state.file_id}")
+                self.upload_state.expire(state)
+                return None
+            parts = self._list_uploaded_parts(state.upload_addr, state.token, state.file_id, state.upload_id)
+        except Exception as e:
+            self.logger.warning(f"查询上传进度失败，重新上传: {state.file_id}, {str(e)}")
+            return None
+        self.upload_state.set_parts(state, parts)
+        self.logger.info(f"续传视频 {state.file_id}，已上传 {len(parts)}/{state.total_parts} 个分片")
+        return state, parts
+
+    def _upload_chunk(self, upload_addr: str, token: str, file_id: str, upload_id: str, chunk_stream: Generator[bytes, None, None], file_info: dict,
+                      uploaded: Optional[Dict[int, str]] = None, on_part: Optional[Callable[[int, str], None]] = None) -> List[Dict[str, str]]:
         """
         上传分块
         
@@ -85,70 +377,16 @@ class NoteService:
             upload_id: 上传ID
             chunk_stream: 文件块生成器
             file_info: 文件信息
+            uploaded: 已上传的分片 {分片序号: ETag}，续传时跳过
+            on_part: 分片上传成功后的回调
             
         Returns:
             List[Dict[str, str]]: 每个分片的信息，包含 PartNumber 和 ETag
         """
-        etags = []
         try:
-            for part_number, chunk in enumerate(chunk_stream, 1):
-                self.logger.info(f"Uploading part {part_number}/{file_info['total_chunks']}")
-                
-                # 构造分片上传请求参数
-                params = {
-                    "partNumber": part_number,
-                    "uploadId": upload_id
-                }
-                
-                # 获取当前分片的大小
-                chunk_size = len(chunk)
-                
-                # # 发送分片上传请求 这样发送会超时
-                # response = self.client._make_request(
-                #     "PUT",
-                #     f"/{file_id}",
-                #     api_base_url=f"https://{upload_addr}",
-                #     params=params,
-                #     headers={
-                #         "content-type": "application/octet-stream",
-                #         "content-length": str(chunk_size),
-                #         "x-cos-security-token": token,
-                #     },
-                #     data=chunk,
-                #     stream=True,
-                #     need_sign=False
-                # )
-                url = f"https://{upload_addr}/{file_id}"
-                headers = {
-                    "content-type": "application/octet-stream",
-                    "content-length": str(chunk_size),
-                    "x-cos-security-token": token
-                }
-
-                # 使用requests直接发送二进制数据
-                response = requests.put(
-                    url,
-                    params=params,
-                    headers=headers,
-                    data=chunk,  # 直接发送二进制数据
-                    stream=True  # 使用流式传输
-                )
-                
-                # 获取ETag
-                etag = response.headers.get("ETag")
-                if not etag:
-                    raise Exception(f"Failed to upload part {part_number}, no ETag in response")
-                
-                # 记录分片信息
-                etags.append({
-                    "PartNumber": str(part_number),
-                    "ETag": etag
-                })
-                
-                self.logger.info(f"Successfully uploaded part {part_number}, size: {chunk_size}, ETag: {etag}")
-                
-            return etags
-            
+            url = f"https://{upload_addr}/{file_id}"
+            return self.uploader.upload(url, token, upload_id, chunk_stream, file_info['total_chunks'],
+                                        uploaded=uploaded, on_part=on_part)
         except Exception as e:
             self.logger.error(f"Failed to upload chunks: {str(e)}")
             raise
@@ -182,75 +420,94 @@ class NoteService:
             }
             
             self.logger.info(f"Sending complete request with XML: {complete_xml}")
-            response = requests.post(
+            response = self.upload_session.post(
                 url,
                 params=params,
                 headers=headers,
                 data=complete_xml.encode('utf-8')  # 确保发送UTF-8编码的字节
             )
-            
-            if response.status_code != 200:
-                raise Exception(f"Complete upload failed with status {response.status_code}: {response.text}")
-            
-            # 解析响应
-            result = xmltodict.parse(response.text)
-            
-            if "CompleteMultipartUploadResult" not in result:
-                raise Exception(f"Invalid complete response: {response.text}")
-            
-            complete_result = result["CompleteMultipartUploadResult"]
-            return {
-                "file_id": complete_result.get("Key", ""),
-                "etag": complete_result.get("ETag", "")
-            }
+            return self._parse_complete_result(response.status_code, response.text)
         except Exception as e:
             self.logger.error(f"Failed to complete upload: {str(e)}")
             raise
 
-    def upload_video_to_xiaohongshu(self, file_stream: Generator[bytes, None, None], file_info: dict) -> Dict[str, Any]:
+    def upload_video_to_xiaohongshu(self, file_stream: Generator[bytes, None, None], file_info: dict, source_key: str = "") -> Dict[str, Any]:
         """
         上传视频到小红书
+        
+        Args:
+            file_stream: 文件块生成器或预取中继
+            file_info: 文件信息
+            source_key: 源文件标识，不为空时记录上传进度，中断后再次上传同一文件会续传
         """
         try:
-            # 获取上传许可
-            upload_addr, token, file_id = self._get_upload_permit()
-            if not upload_addr or not token or not file_id:
-                self.logger.error(f"获取上传许可失败: {upload_addr}, {token}, {file_id}")
-                raise
-            
-            # 初始化上传分块
-            self._init_upload_chunk(upload_addr, token, file_id)
-            
-            # 初始化上传桶
-            upload_id = self._init_upload_bucket(upload_addr, token, file_id)
-            self.logger.info(f"初始化上传桶成功: {upload_id}")
-            if not upload_id:
-                self.logger.error(f"初始化上传桶失败: {upload_id}")
-                raise
+            state, uploaded = None, {}
+            resumed = self._resume_upload(source_key, file_info) if source_key else None
+            if resumed:
+                state, uploaded = resumed
+                upload_addr, token, file_id, upload_id = state.upload_addr, state.token, state.file_id, state.upload_id
+            else:
+                # 获取上传许可
+                upload_addr, token, file_id, expire_at = self._get_upload_permit_with_expire()
+                if not upload_addr or not token or not file_id:
+                    raise Exception(f"获取上传许可失败: {upload_addr}, {token}, {file_id}")
+                
+                # 初始化上传分块
+                self._init_upload_chunk(upload_addr, token, file_id)
+                
+                # 初始化上传桶
+                upload_id = self._init_upload_bucket(upload_addr, token, file_id)
+                self.logger.info(f"初始化上传桶成功: {upload_id}")
+                if not upload_id:
+                    raise Exception(f"初始化上传桶失败: {upload_id}")
+                
+                if source_key:
+                    state = self.upload_state.create(
+                        source_key, "video", upload_addr, token, file_id, upload_id, expire_at,
+                        file_info.get('chunk_size', XhsUploadConfig.UPLOAD_PART_SIZE), file_info['total_chunks']
+                    )
             
-            # 上传分片
-            etags = self._upload_chunk(upload_addr, token, file_id, upload_id, file_stream, file_info)
+            # 上传分片，已上传的分片不再从OSS下载
+            if uploaded and hasattr(file_stream, "skip"):
+                file_stream.skip(uploaded)
+            on_part = (lambda part_number, etag: self.upload_state.record_part(state, part_number, etag)) if state else None
+            etags = self._upload_chunk(upload_addr, token, file_id, upload_id, file_stream, file_info,
+                                       uploaded=uploaded, on_part=on_part)
             
             # 完成上传
-            return self._upload_confirm(upload_addr, token, file_id, upload_id, etags)
+            result = self._upload_confirm(upload_addr, token, file_id, upload_id, etags)
+            if state:
+                self.upload_state.complete(state, result.get("file_id", ""))
+            return result
             
         except Exception as e:
             self.logger.error(f"Failed to upload video: {str(e)}")
             raise
 
-    def _upload_cover(self, upload_addr: str, token: str, file_id: str, cover: str) -> str:
+    def _get_cover_data(self, oss_service: OSSService, video: Video) -> bytes:
+        """
+        获取封面图片，优先使用上传时生成的封面
+        """
+        cover = self._read_stored_cover(oss_service, video)
+        if cover is None:
+            response = self.upload_session.get(self._get_cover_url(oss_service, video))
+            response.raise_for_status()
+            cover = response.content
+        return cover
+
+    def _upload_cover(self, upload_addr: str, token: str, file_id: str, file_data: bytes) -> str:
         """
         上传封面
         """
-        file_data = requests.get(cover).content
         url = f"https://{upload_addr}/{file_id}"
         headers = {
+            "content-type": "image/jpeg",
             "content-length": str(len(file_data)),
             "x-cos-security-token": token
         }
 
-        # 使用requests直接发送二进制数据
-        response = requests.put(
+        # 使用上传会话直接发送二进制数据
+        response = self.upload_session.put(
             url,
             headers=headers,
             data=file_data,  # 直接发送二进制数据
@@ -262,41 +519,113 @@ class NoteService:
         self.logger.info(f"上传封面成功: {file_id}")
         return file_id
 
-    def upload_cover_to_xiaohongshu(self, cover: str) -> str:
+    def upload_cover_to_xiaohongshu(self, cover: bytes, source_key: str = "") -> str:
         """
-        上传封面到小红书
+        上传封面图片到小红书，source_key 不为空时登记上传结果供复用
         """
         try:
             # 获取上传许可
             upload_addr, token, file_id = self._get_upload_permit(scene="image")
             if not upload_addr or not token or not file_id:
-                self.logger.error(f"封面上传获取上传许可失败: {upload_addr}, {token}, {file_id}, {cover}")
-                raise
+                raise Exception(f"封面上传获取上传许可失败: {upload_addr}, {token}, {file_id}")
             
             # 上传
             self._upload_cover(upload_addr, token, file_id, cover)
+            if source_key:
+                self.upload_state.record_completed(source_key, "image", upload_addr, file_id)
             return file_id
             
         except Exception as e:
             self.logger.error(f"Failed to upload cover: {str(e)}")
             raise
 
-    def _build_complete_xml(self, parts: List[Dict[str, str]]) -> str:
-        """构建完成上传的XML请求体"""
-        # 手动构建XML声明，确保格式完全匹配
-        xml_declaration = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    def _ensure_media(self, video: Video, source_key: str) -> List[str]:
+        """
+        确保视频和封面已上传到小红书，结果写入 video.third_file_id 和 video.cover_file_id，
+        视频和封面分别复用有效期内已上传的文件，只上传缺少的部分
         
-        root = ET.Element('CompleteMultipartUpload')
-        for part in sorted(parts, key=lambda x: int(x["PartNumber"])):
-            part_elem = ET.SubElement(root, 'Part')
-            part_number = ET.SubElement(part_elem, 'PartNumber')
-            part_number.text = part["PartNumber"]
-            etag = ET.SubElement(part_elem, 'ETag')
-            etag.text = part["ETag"]
+        Returns:
+            List[str]: 复用了上传登记的场景（video、image），全部重新上传时为空
+        """
+        video_file_id, cover_file_id = self._find_reusable_media(self.upload_state, source_key, XhsUploadConfig.UPLOAD_REUSE_TTL)
+        oss_service = get_oss_service(self.logger)
+
+        if video_file_id:
+            video.third_file_id = video_file_id
+        else:
+            # 预取中继在上传当前分片时下载后续分片
+            relay, file_info = oss_service.get_file_relay(
+                video.oss_object_key, chunk_size=XhsUploadConfig.UPLOAD_PART_SIZE, in_flight=XhsUploadConfig.UPLOAD_CONCURRENCY + 1
+            )
+            self.logger.info(f"文件信息: {file_info}")
+            try:
+                upload_result = self.upload_video_to_xiaohongshu(relay, file_info, source_key)
+            finally:
+                relay.close()
+            video.third_file_id = upload_result.get("file_id", "")
+
+        if cover_file_id:
+            video.cover_file_id = cover_file_id
+        else:
+            cover = self._get_cover_data(oss_service, video)
+            video.cover_file_id = self.upload_cover_to_xiaohongshu(cover, source_key)
+        return self._reused_scenes(video_file_id, cover_file_id)
+
+    def stage_note(self, article_data: ProductArticle, goods_id: str) -> Optional[Video]:
+        """
+        预上传笔记素材：在发布时间之前完成话题解析、视频和封面上传，
+        发布时 send_note 从话题缓存和上传登记中直接取得结果，只需发送一次笔记请求
         
-        # 不使用ET的xml_declaration，而是手动拼接
-        body = ET.tostring(root, encoding='UTF-8', xml_declaration=False).decode('utf-8')
-        return xml_declaration + body
+        Args:
+            article_data: 文章数据
+            goods_id: 商品ID
+            
+        Returns:
+            Optional[Video]: 已上传素材的视频，没有可用视频时返回 None
+        """
+        video = self._find_video(article_data, goods_id)
+        if not video:
+            return None
+
+        self.topic_cache.resolve(article_data.tags.split(","))
+        reused = self._ensure_media(video, self._upload_source_key(video))
+
+        with Session(engine) as session:
+            video = session.merge(video)
+            # 固定文章使用的视频，发布时 _find_video 选中同一个视频
+            mapping = session.exec(
+                select(ArticleVideoMapping).where(
+                    ArticleVideoMapping.article_id == article_data.id,
+                    ArticleVideoMapping.video_id == video.id,
+                )
+            ).first()
+            if not mapping:
+                mapping = ArticleVideoMapping(article_id=article_data.id, video_id=video.id)
+            mapping.status = "pending_publish"
+            mapping.update_at = int(time.time() * 1000)
+            session.add(video)
+            session.add(mapping)
+            session.commit()
+            session.refresh(video)
+
+        self.logger.info(f"文章 {article_data.id} 素材{'已预上传，复用' if reused else '预上传完成'}: 视频 {video.third_file_id}, 封面 {video.cover_file_id}")
+        return video
+
+    def is_staged(self, article_id: int) -> bool:
+        """文章是否已固定待发布视频，且该视频和封面的上传登记仍在有效期内"""
+        with Session(engine) as session:
+            video = session.exec(
+                select(Video).join(ArticleVideoMapping, ArticleVideoMapping.video_id == Video.id).where(
+                    ArticleVideoMapping.article_id == article_id,
+                    ArticleVideoMapping.status == "pending_publish",
+                    Video.is_enabled == True,
+                )
+            ).first()
+        if not video:
+            return False
+        source_key = self._upload_source_key(video)
+        ttl = XhsUploadConfig.UPLOAD_REUSE_TTL
+        return all(self.upload_state.find_completed(source_key, scene, ttl) for scene in ("video", "image"))
 
     def send_note(self, article_data: ProductArticle, goods_id: str, goods_name: str, note_data: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], Video]:
         """
@@ -313,34 +642,12 @@ class NoteService:
                 - Dict[str, Any]: API响应结果，包含 success 字段表示是否成功
                 - Video: 使用的视频对象
         """
-        builder = XiaohongshuNoteBuilder()
-        
-        # 设置基本信息
-        builder.set_title(article_data.title)
-        tags = article_data.tags.split(",")
-        description = f"{article_data.content}\n\n"
-        for tag in tags:
-            description += f"#{tag}[话题]# "
-        builder.set_description(description)
+        builder = self._create_builder(article_data)
         
         # 查询是否有待发布视频
-        video = None
-        with Session(engine) as session:
-            article_video_mapping = session.exec(
-                select(ArticleVideoMapping).where(ArticleVideoMapping.article_id == article_data.id, ArticleVideoMapping.status == "pending_publish")
-            ).first()
-            if article_video_mapping:
-                video = session.exec(select(Video).where(Video.id == article_video_mapping.video_id, Video.is_enabled == True)).first()
-            else:
-                self.logger.info(f"没有找到待发布视频: {article_data.id}")
-            if not video:
-                self.logger.warning(f"没有找到待发布视频: {article_video_mapping.video_id}")
-                video = session.exec(
-                    select(Video).where(Video.sku_id == goods_id, Video.is_enabled == True)
-                ).first()
-                if not video:
-                    self.logger.info(f"没有找到可用视频: {goods_id}")
-                    return {"success": False, "message": "没有找到可用视频"}, None
+        video = self._find_video(article_data, goods_id)
+        if not video:
+            return {"success": False, "message": "没有找到可用视频"}, None
         
         self.logger.info(f"匹配视频信息: {video}")    
         
@@ -348,32 +655,11 @@ class NoteService:
         self.set_topic_tags(article_data, builder)
 
         # 设置商品信息
-        extra_info = {
-            'goods_id': goods_id,
-            'goods_name': goods_name,
-            'goods_type': 'goods_seller',
-            'tab_id': 1,
-            'image_type': 'spec',
-            'left_bottom_type': 'BUY_GOODS',
-            'bind_order': 0
-        }
-        builder.add_biz_relation(
-            biz_type="GOODS_SELLER_V2",
-            biz_id=goods_id,
-            extra_info=json.dumps(extra_info)
-        )
+        self._add_goods_relation(builder, goods_id, goods_name)
         
-            # 上传视频到小红书
-        oss_service = OSSService(logger=self.logger)
-        file_stream, file_info = oss_service.get_file_stream(video.oss_object_key, chunk_size=3 * 1024 * 1024)
-        self.logger.info(f"文件信息: {file_info}")
-        upload_result = self.upload_video_to_xiaohongshu(file_stream, file_info)
-        video.third_file_id = upload_result.get("file_id", "")
-
-        style = f"video/snapshot,t_1000,f_jpg,w_{video.width},h_{video.height},m_fast"
-        cover = oss_service.bucket.sign_url("GET", video.oss_object_key, 3600, params={"x-oss-process": style})
-        file_id = self.upload_cover_to_xiaohongshu(cover)
-        video.cover_file_id = file_id
+        # 同一文件有效期内上传过（包括预上传）时直接复用文件ID，否则上传视频和封面
+        source_key = self._upload_source_key(video)
+        reused = self._ensure_media(video, source_key)
 
         # 设置视频信息
         builder.set_video_info(video)
@@ -385,11 +671,444 @@ class NoteService:
             self.logger.info("开始发送笔记")
             response = self.client._make_request("POST", "/web_api/sns/v2/note", api_base_url="https://edith.xiaohongshu.com", data=note_data)
             self.logger.info("笔记发送完成")
-            return response, video
         except Exception as e:
             self.logger.error(f"发送笔记失败: {str(e)}")
-            return {"success": False, "message": str(e)}, video
+            response = {"success": False, "message": str(e)}
+        if reused and not response.get("success", False) and self._is_invalid_file_error(response):
+            # 复用的文件ID已失效，作废复用的登记，下次发布时重新上传
+            self.upload_state.invalidate(source_key, reused)
+        return response, video
     
     def close(self):
         """关闭服务"""
-        self.client.close() 
\ No newline at end of file
+        self.upload_session.close()
+        self.client.close()
+
+
+class AsyncNoteService(BaseNoteService):
+    """笔记发送服务异步版本
+
+    所有小红书和COS请求共用 AsyncXiaohongshuClient 的连接池，
+    话题查询、视频上传和封面上传并发进行，数据库和OSS SDK的阻塞调用放到线程中执行。
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None, client: Optional[AsyncXiaohongshuClient] = None):
+        super().__init__(logger)
+        self.client = client or AsyncXiaohongshuClient(logger=self.logger)
+        self.topic_cache = TopicCache(logger=self.logger)
+        self.upload_state = UploadStateStore(self.logger)
+        # 账号 -> 笔记发布并发信号量；信号量绑定创建它的事件循环，按实例保存，不在不同事件循环的实例间共享
+        self._account_slots: Dict[str, asyncio.Semaphore] = {}
+        self.permit_pool = AsyncUploadPermitPool(
+            self._request_upload_permits,
+            batch_size=XhsUploadConfig.UPLOAD_PERMIT_BATCH,
+            low_watermark=XhsUploadConfig.UPLOAD_PERMIT_LOW_WATERMARK,
+            expire_margin=UploadStateStore.EXPIRE_MARGIN,
+            logger=self.logger,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def set_topic_tags(self, article_data: ProductArticle, builder: XiaohongshuNoteBuilder):
+        """
+        设置话题标签，优先使用话题缓存，未命中的话题并发查询
+        """
+        tags = article_data.tags.split(",")
+        topics, missing = await asyncio.to_thread(self.topic_cache.lookup, tags)
+        if missing:
+            responses = await self.client.map(
+                [self.topic_cache.build_search_request(self.client, tag) for tag in missing],
+                return_exceptions=True,
+            )
+            topics.update(await asyncio.to_thread(self.topic_cache.store, dict(zip(missing, responses))))
+        self._add_topic_tags(builder, tags, topics)
+
+    async def _get_upload_permit(self, scene: str = "video") -> Tuple[str, str, str]:
+        """
+        获取上传许可
+        """
+        upload_addr, token, file_id, _ = await self._get_upload_permit_with_expire(scene)
+        return upload_addr, token, file_id
+
+    async def _get_upload_permit_with_expire(self, scene: str = "video") -> Tuple[str, str, str, int]:
+        """
+        从许可池获取上传许可及token过期时间（毫秒）
+        """
+        return tuple(await self.permit_pool.acquire(scene))
+
+    async def _request_upload_permits(self, scene: str, file_count: int) -> List[UploadPermit]:
+        """
+        请求一批上传许可
+        """
+        params = self._upload_permit_params(scene, file_count)
+        response = await self.client._make_request("GET", "/api/media/v1/upload/creator/permit", api_base_url="https://creator.xiaohongshu.com", params=params)
+        return self._parse_upload_permits(response, XhsUploadConfig.UPLOAD_TOKEN_TTL)
+
+    async def _init_upload_chunk(self, upload_addr: str, token: str, file_id: str) -> Dict[str, Any]:
+        """
+        初始化上传分块
+        """
+        params = {"uploads":"", "prefix": file_id}
+        response = await self.client._make_request("GET", "", api_base_url=f"https://{upload_addr}",
+                                                    params=params, headers={"x-cos-security-token": token}, reponse_format="xml",
+                                                    rate_limit_category="upload")
+        self.logger.info(f"初始化上传分块响应: {response}")
+        return response
+
+    async def _init_upload_bucket(self, upload_addr: str, token: str, file_id: str) -> str:
+        """
+        初始化上传桶
+        """
+        params = {"uploads":""}
+        response = await self.client._make_request("POST", "/"+file_id, api_base_url=f"https://{upload_addr}",
+                                                    params=params, headers={"x-cos-security-token": token}, reponse_format="xml",
+                                                    rate_limit_category="upload")
+        self.logger.info(f"初始化上传桶响应: {response}")
+        return response.get("InitiateMultipartUploadResult", {}).get("UploadId", "")
+
+    async def _list_uploaded_parts(self, upload_addr: str, token: str, file_id: str, upload_id: str) -> Dict[int, str]:
+        """
+        查询COS中已上传的分片，返回 {分片序号: ETag}
+        """
+        parts: Dict[int, str] = {}
+        marker = None
+        while True:
+            params = {"uploadId": upload_id}
+            if marker:
+                params["part-number-marker"] = marker
+            response = await self.client._make_request("GET", "/"+file_id, api_base_url=f"https://{upload_addr}",
+                                                        params=params, headers={"x-cos-security-token": token}, reponse_format="xml",
+                                                        rate_limit_category="upload")
+            page, marker = self._parse_list_parts(response)
+            parts.update(page)
+            if not marker:
+                return parts
+
+    async def _resume_upload(self, source_key: str, file_info: dict) -> Optional[Tuple[XhsMediaUpload, Dict[int, str]]]:
+        """
+        查找可续传的上传任务，逻辑与 NoteService._resume_upload 一致
+        """
+        part_size = file_info.get('chunk_size', XhsUploadConfig.UPLOAD_PART_SIZE)
+        state = await asyncio.to_thread(self.upload_state.find_resumable, source_key, "video", part_size)
+        if not state:
+            return None
+        if state.total_parts != file_info['total_chunks']:
+            await asyncio.to_thread(self.upload_state.expire, state)
+            return None
+        try:
+            listing = await self._init_upload_chunk(state.upload_addr, state.token, state.file_id)
+            if state.upload_id not in self._parse_upload_ids(listing, state.file_id):
+                self.logger.info(f"上传任务已失效，重新上传: {state.file_id}")
+                await asyncio.to_thread(self.upload_state.expire, state)
+                return None
+            parts = await self._list_uploaded_parts(state.upload_addr, state.token, state.file_id, state.upload_id)
+        except Exception as e:
+            self.logger.warning(f"查询上传进度失败，重新上传: {state.file_id}, {str(e)}")
+            return None
+        await asyncio.to_thread(self.upload_state.set_parts, state, parts)
+        self.logger.info(f"续传视频 {state.file_id}，已上传 {len(parts)}/{state.total_parts} 个分片")
+        return state, parts
+
+    async def _upload_chunk(self, upload_addr: str, token: str, file_id: str, upload_id: str, chunk_stream: Generator[bytes, None, None], file_info: dict,
+                            uploaded: Optional[Dict[int, str]] = None, on_part: Optional[Callable[[int, str], None]] = None) -> List[Dict[str, str]]:
+        """
+        并发上传分块，OSS分块在线程中按顺序读取，同时最多 UPLOAD_CONCURRENCY 个分片在上传，
+        跳过 uploaded 中已上传的分片，每个分片成功后在线程中调用 on_part
+            
+        Returns:
+            List[Dict[str, str]]: 每个分片的信息，包含 PartNumber 和 ETag
+        """
+        url = f"https://{upload_addr}/{file_id}"
+        uploaded = dict(uploaded or {})
+        slots = asyncio.Semaphore(XhsUploadConfig.UPLOAD_CONCURRENCY)
+        tasks: Dict[int, asyncio.Task] = {}
+        chunk_iter = iter(chunk_stream)
+        index = 0
+
+        async def upload(part_number: int, chunk: bytes) -> str:
+            etag = await self._upload_part(url, token, upload_id, part_number, chunk)
+            if on_part:
+                await asyncio.to_thread(on_part, part_number, etag)
+            return etag
+
+        try:
+            while True:
+                await slots.acquire()
+                if any(task.done() and not task.cancelled() and task.exception() for task in tasks.values()):
+                    slots.release()
+                    break
+                chunk = await asyncio.to_thread(next, chunk_iter, None)
+                if chunk is None:
+                    slots.release()
+                    break
+                index += 1
+                part_number = getattr(chunk, "part_number", index)
+                if not isinstance(chunk, bytes):
+                    # httpx 需要 bytes 请求体，复制后立即归还中继缓冲区
+                    data = bytes(chunk)
+                    chunk.release()
+                    chunk = data
+                if part_number in uploaded:
+                    slots.release()
+                    continue
+                self.logger.info(f"Uploading part {part_number}/{file_info['total_chunks']}")
+                task = asyncio.create_task(upload(part_number, chunk))
+                task.add_done_callback(lambda _: slots.release())
+                tasks[part_number] = task
+            
+            etags = await asyncio.gather(*tasks.values())
+            uploaded.update(zip(tasks.keys(), etags))
+            return [{"PartNumber": str(number), "ETag": uploaded[number]} for number in sorted(uploaded)]
+            
+        except BaseException as e:
+            for task in tasks.values():
+                task.cancel()
+            self.logger.error(f"Failed to upload chunks: {str(e)}")
+            raise
+
+    async def _upload_part(self, url: str, token: str, upload_id: str, part_number: int, chunk: bytes) -> str:
+        """上传单个分片，失败时退避重试，返回ETag"""
+        for attempt in range(1, XhsUploadConfig.UPLOAD_PART_RETRIES + 1):
+            try:
+                response = await self.client.send_raw(
+                    "PUT",
+                    url,
+                    rate_limit_category="upload",
+                    params={"partNumber": part_number, "uploadId": upload_id},
+                    headers={
+                        "content-type": "application/octet-stream",
+                        "x-cos-security-token": token
+                    },
+                    content=chunk
+                )
+                etag = response.headers.get("ETag")
+                if response.status_code == 200 and etag:
+                    self.logger.info(f"Successfully uploaded part {part_number}, size: {len(chunk)}, ETag: {etag}")
+                    return etag
+                error = Exception(f"Failed to upload part {part_number}, status {response.status_code}: {response.text[:200]}")
+            except httpx.HTTPError as e:
+                error = e
+            
+            if attempt == XhsUploadConfig.UPLOAD_PART_RETRIES:
+                raise error
+            wait = XhsUploadConfig.UPLOAD_RETRY_BACKOFF * 2 ** (attempt - 1) + random.uniform(0, XhsUploadConfig.UPLOAD_RETRY_BACKOFF)
+            self.logger.warning(f"Part {part_number} attempt {attempt}/{XhsUploadConfig.UPLOAD_PART_RETRIES} failed: {error}, retrying in {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    async def _upload_confirm(self, upload_addr: str, token: str, file_id: str, upload_id: str, etags: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        完成分片上传
+        """
+        try:
+            complete_xml = self._build_complete_xml(etags)
+            self.logger.info(f"Sending complete request with XML: {complete_xml}")
+            response = await self.client.send_raw(
+                "POST",
+                f"https://{upload_addr}/{file_id}",
+                rate_limit_category="upload",
+                params={"uploadId": upload_id},
+                headers={
+                    "content-type": "application/xml",
+                    "x-cos-security-token": token
+                },
+                content=complete_xml.encode('utf-8')
+            )
+            return self._parse_complete_result(response.status_code, response.text)
+        except Exception as e:
+            self.logger.error(f"Failed to complete upload: {str(e)}")
+            raise
+
+    async def upload_video_to_xiaohongshu(self, file_stream: Generator[bytes, None, None], file_info: dict, source_key: str = "") -> Dict[str, Any]:
+        """
+        上传视频到小红书，source_key 不为空时记录上传进度并支持续传
+        """
+        try:
+            state, uploaded = None, {}
+            resumed = await self._resume_upload(source_key, file_info) if source_key else None
+            if resumed:
+                state, uploaded = resumed
+                upload_addr, token, file_id, upload_id = state.upload_addr, state.token, state.file_id, state.upload_id
+            else:
+                upload_addr, token, file_id, expire_at = await self._get_upload_permit_with_expire()
+                if not upload_addr or not token or not file_id:
+                    raise Exception(f"获取上传许可失败: {upload_addr}, {token}, {file_id}")
+                
+                await self._init_upload_chunk(upload_addr, token, file_id)
+                
+                upload_id = await self._init_upload_bucket(upload_addr, token, file_id)
+                if not upload_id:
+                    raise Exception(f"初始化上传桶失败: {upload_id}")
+                self.logger.info(f"初始化上传桶成功: {upload_id}")
+                
+                if source_key:
+                    state = await asyncio.to_thread(
+                        self.upload_state.create, source_key, "video", upload_addr, token, file_id, upload_id, expire_at,
+                        file_info.get('chunk_size', XhsUploadConfig.UPLOAD_PART_SIZE), file_info['total_chunks']
+                    )
+            
+            if uploaded and hasattr(file_stream, "skip"):
+                file_stream.skip(uploaded)
+            on_part = (lambda part_number, etag: self.upload_state.record_part(state, part_number, etag)) if state else None
+            etags = await self._upload_chunk(upload_addr, token, file_id, upload_id, file_stream, file_info,
+                                             uploaded=uploaded, on_part=on_part)
+            result = await self._upload_confirm(upload_addr, token, file_id, upload_id, etags)
+            if state:
+                await asyncio.to_thread(self.upload_state.complete, state, result.get("file_id", ""))
+            return result
+            
+        except Exception as e:
+            self.logger.error(f"Failed to upload video: {str(e)}")
+            raise
+
+    async def _get_cover_data(self, oss_service: OSSService, video: Video) -> bytes:
+        """
+        获取封面图片，优先使用上传时生成的封面
+        """
+        cover = await asyncio.to_thread(self._read_stored_cover, oss_service, video)
+        if cover is None:
+            response = await self.client.send_raw("GET", self._get_cover_url(oss_service, video), rate_limit_category="upload")
+            response.raise_for_status()
+            cover = response.content
+        return cover
+
+    async def _upload_cover_stage(self, oss_service: OSSService, video: Video, source_key: str) -> str:
+        """封面上传阶段：读取封面并上传到小红书"""
+        cover = await self._get_cover_data(oss_service, video)
+        return await self.upload_cover_to_xiaohongshu(cover, source_key)
+
+    async def upload_cover_to_xiaohongshu(self, cover: bytes, source_key: str = "") -> str:
+        """
+        上传封面图片到小红书，source_key 不为空时登记上传结果供复用
+        """
+        try:
+            upload_addr, token, file_id = await self._get_upload_permit(scene="image")
+            if not upload_addr or not token or not file_id:
+                raise Exception(f"封面上传获取上传许可失败: {upload_addr}, {token}, {file_id}")
+            
+            response = await self.client.send_raw(
+                "PUT",
+                f"https://{upload_addr}/{file_id}",
+                rate_limit_category="upload",
+                headers={"content-type": "image/jpeg", "x-cos-security-token": token},
+                content=cover
+            )
+            if response.status_code != 200:
+                raise Exception(f"Failed to upload cover: {response.text}")
+            self.logger.info(f"上传封面成功: {file_id}")
+            if source_key:
+                await asyncio.to_thread(self.upload_state.record_completed, source_key, "image", upload_addr, file_id)
+            return file_id
+            
+        except Exception as e:
+            self.logger.error(f"Failed to upload cover: {str(e)}")
+            raise
+
+    def _get_account_slots(self) -> asyncio.Semaphore:
+        """当前账号在本实例中的笔记发布并发信号量"""
+        auth_config = AuthConfig.from_env()
+        account = hashlib.md5(auth_config.authorization.encode()).hexdigest() if auth_config else ""
+        if account not in self._account_slots:
+            self._account_slots[account] = asyncio.Semaphore(XhsUploadConfig.NOTES_PER_ACCOUNT)
+        return self._account_slots[account]
+
+    async def _timed(self, timings: Dict[str, float], stage: str, coro):
+        """执行一个阶段并记录耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[stage] = round(time.perf_counter() - start, 3)
+
+    async def _upload_video_stage(self, oss_service: OSSService, video: Video, source_key: str) -> Dict[str, Any]:
+        """视频上传阶段：打开OSS预取中继并上传到小红书"""
+        relay, file_info = await asyncio.to_thread(
+            oss_service.get_file_relay, video.oss_object_key, chunk_size=XhsUploadConfig.UPLOAD_PART_SIZE,
+            in_flight=XhsUploadConfig.UPLOAD_CONCURRENCY + 1
+        )
+        self.logger.info(f"文件信息: {file_info}")
+        try:
+            return await self.upload_video_to_xiaohongshu(relay, file_info, source_key)
+        finally:
+            await asyncio.to_thread(relay.close)
+
+    async def send_note(self, article_data: ProductArticle, goods_id: str, goods_name: str, note_data: Optional[Dict[str, Any]] = None,
+                        timings: Optional[Dict[str, float]] = None) -> Tuple[Dict[str, Any], Video]:
+        """
+        发送笔记到小红书，参数与返回值与 NoteService.send_note 一致
+        
+        话题查询、视频上传、封面上传并发进行，单篇笔记的耗时取决于最慢的阶段；
+        同一账号同时发布的笔记数受 NOTES_PER_ACCOUNT 限制。
+        
+        Args:
+            timings: 传入字典时写入各阶段耗时（秒）：queue、find_video、topics、video_upload、cover_upload、note_post、total
+        """
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
+        slots = self._get_account_slots()
+        await self._timed(timings, "queue", slots.acquire())
+        try:
+            return await self._send_note(article_data, goods_id, goods_name, timings)
+        finally:
+            slots.release()
+            timings["total"] = round(time.perf_counter() - start, 3)
+            self.logger.info(f"笔记发布阶段耗时: {timings}")
+
+    async def _send_note(self, article_data: ProductArticle, goods_id: str, goods_name: str, timings: Dict[str, float]) -> Tuple[Dict[str, Any], Video]:
+        builder = self._create_builder(article_data)
+        
+        video = await self._timed(timings, "find_video", asyncio.to_thread(self._find_video, article_data, goods_id))
+        if not video:
+            return {"success": False, "message": "没有找到可用视频"}, None
+        self.logger.info(f"匹配视频信息: {video}")
+
+        self._add_goods_relation(builder, goods_id, goods_name)
+
+        source_key = self._upload_source_key(video)
+        reused_video, reused_cover = await asyncio.to_thread(
+            self._find_reusable_media, self.upload_state, source_key, XhsUploadConfig.UPLOAD_REUSE_TTL)
+        reused = self._reused_scenes(reused_video, reused_cover)
+        oss_service = get_oss_service(self.logger)
+
+        async def video_file_id() -> str:
+            if reused_video:
+                return reused_video
+            upload_result = await self._timed(timings, "video_upload", self._upload_video_stage(oss_service, video, source_key))
+            return upload_result.get("file_id", "")
+
+        async def cover_file_id() -> str:
+            if reused_cover:
+                return reused_cover
+            return await self._timed(timings, "cover_upload", self._upload_cover_stage(oss_service, video, source_key))
+
+        # 话题查询、视频上传、封面上传互不依赖，并发进行；已复用的部分不再上传
+        _, video.third_file_id, video.cover_file_id = await asyncio.gather(
+            self._timed(timings, "topics", self.set_topic_tags(article_data, builder)),
+            video_file_id(),
+            cover_file_id(),
+        )
+
+        builder.set_video_info(video)
+        note_data = builder.build()
+        self.logger.info(f"笔记数据: {note_data}")
+            
+        try:
+            self.logger.info("开始发送笔记")
+            response = await self._timed(timings, "note_post", self.client._make_request(
+                "POST", "/web_api/sns/v2/note", api_base_url="https://edith.xiaohongshu.com", data=note_data))
+            self.logger.info("笔记发送完成")
+        except Exception as e:
+            self.logger.error(f"发送笔记失败: {str(e)}")
+            response = {"success": False, "message": str(e)}
+        if reused and not response.get("success", False) and self._is_invalid_file_error(response):
+            # 复用的文件ID已失效，作废复用的登记，下次发布时重新上传
+            await asyncio.to_thread(self.upload_state.invalidate, source_key, reused)
+        return response, video
+    
+    async def close(self):
+        """关闭服务"""
+        await self.permit_pool.close()
+        await self.client.close()
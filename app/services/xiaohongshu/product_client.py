@@ -3,22 +3,47 @@ import json
 import logging
 import time
 from typing import Dict, Any, Optional
-from .xiaohongshu_client import XiaohongshuClient, XiaohongshuConfig
+from .xiaohongshu_client import XiaohongshuClient, XiaohongshuConfig, XiaohongshuRequest
+from .async_xiaohongshu_client import AsyncXiaohongshuClient
+from .rate_limiter import RateLimiter
 
 from app.models.product import ProductSearchRequest, ProductSearchResponse
 
 
+SEARCH_PRODUCTS_PATH = "/api/edith/product/search_item_v2"
+
+
+def build_search_data(page_no: int, page_size: int, sort_field: str, order: str,
+                      card_type: int, is_channel: bool) -> Dict[str, Any]:
+    """构造商品搜索请求数据"""
+    return {
+        "page_no": page_no,
+        "page_size": page_size,
+        "search_order": {
+            "sort_field": sort_field,
+            "order": order
+        },
+        "search_filter": {
+            "card_type": card_type,
+            "is_channel": is_channel
+        },
+        "search_item_detail_option": {}
+    }
+
+
 class ProductClient(XiaohongshuClient):
     """小红书商品API客户端"""
     
-    def __init__(self, config: Optional[XiaohongshuConfig] = None, logger: Optional[logging.Logger] = None):
+    def __init__(self, config: Optional[XiaohongshuConfig] = None, logger: Optional[logging.Logger] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         """初始化商品客户端
         
         Args:
             config: API配置，如果不提供则使用默认配置
             logger: 日志记录器，如果不提供则使用默认记录器
+            rate_limiter: 限流器，如果不提供则使用跨进程共享的限流器
         """
-        super().__init__(config, logger)
+        super().__init__(config, logger, rate_limiter)
     
     def search_products(self, page_no: int = 1, page_size: int = 20, sort_field: str = "create_time", 
                        order: str = "desc", card_type: int = 2, is_channel: bool = False) -> Dict[str, Any]:
@@ -35,25 +60,16 @@ class ProductClient(XiaohongshuClient):
         Returns:
             搜索结果
         """
-        path = "/api/edith/product/search_item_v2"
-        
-        # 构造请求数据
-        data = {
-            "page_no": page_no,
-            "page_size": page_size,
-            "search_order": {
-                "sort_field": sort_field,
-                "order": order
-            },
-            "search_filter": {
-                "card_type": card_type,
-                "is_channel": is_channel
-            },
-            "search_item_detail_option": {}
-        }
+        data = build_search_data(page_no, page_size, sort_field, order, card_type, is_channel)
         
         # 发送请求
-        return self._make_request('POST', path, "", data=data)
+        return self._make_request('POST', SEARCH_PRODUCTS_PATH, "", data=data)
+    
+    def build_search_request(self, page_no: int = 1, page_size: int = 20, sort_field: str = "create_time",
+                             order: str = "desc", card_type: int = 2, is_channel: bool = False) -> XiaohongshuRequest:
+        """构建搜索商品请求，参数与 search_products 一致，用于 map 批量发送"""
+        data = build_search_data(page_no, page_size, sort_field, order, card_type, is_channel)
+        return self.build_request('POST', SEARCH_PRODUCTS_PATH, "", data=data)
     
     def get_product_detail(self, product_id: str) -> Dict[str, Any]:
         """获取商品详情
@@ -66,21 +82,30 @@ class ProductClient(XiaohongshuClient):
         """
         path = f"/api/edith/product/item/{product_id}"
         
-        # 获取时间戳
-        timestamp = str(int(time.time() * 1000))
-        
-        # 生成签名
-        x_s = self.get_sign(timestamp, path, {})
-        
-        # 设置请求头
-        self.session.headers.update({
-            'x-s': x_s,
-            'x-t': timestamp
-        })
-        
-        # 发送请求
+        # 发送请求，签名在构建请求时生成
         return self._make_request('GET', path)
+
+
+class AsyncProductClient(AsyncXiaohongshuClient):
+    """小红书商品API异步客户端"""
     
-    def close(self):
-        """关闭会话"""
-        self.session.close() 
\ No newline at end of file
+    async def search_products(self, page_no: int = 1, page_size: int = 20, sort_field: str = "create_time", 
+                              order: str = "desc", card_type: int = 2, is_channel: bool = False) -> Dict[str, Any]:
+        """搜索商品，参数与 ProductClient.search_products 一致
+        
+        Returns:
+            搜索结果
+        """
+        data = build_search_data(page_no, page_size, sort_field, order, card_type, is_channel)
+        return await self._make_request('POST', SEARCH_PRODUCTS_PATH, "", data=data)
+    
+    async def get_product_detail(self, product_id: str) -> Dict[str, Any]:
+        """获取商品详情
+        
+        Args:
+            product_id: 商品ID
+            
+        Returns:
+            商品详情
+        """
+        return await self._make_request('GET', f"/api/edith/product/item/{product_id}")
@@ -0,0 +1,267 @@
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.config.redis_config import RedisConfig
+
+
+@dataclass
+class RateLimitRule:
+    """令牌桶限流规则"""
+    rate: float        # 初始速率（令牌/秒）
+    burst: float       # 桶容量
+    min_rate: float    # 出错降速的下限
+    max_rate: float    # 连续成功提速的上限
+    increase: float    # 每次成功增加的速率
+    cooldown: float    # 429 后暂停的秒数
+
+
+# 按接口类别划分的默认规则，小红书接口域名按子域名区分，COS上传地址归为 upload，
+# 无法识别的地址按 edith 的保守规则限流
+DEFAULT_RULES: Dict[str, RateLimitRule] = {
+    "ark": RateLimitRule(rate=0.3, burst=2, min_rate=0.05, max_rate=1.0, increase=0.01, cooldown=30),
+    "edith": RateLimitRule(rate=0.3, burst=2, min_rate=0.05, max_rate=1.0, increase=0.01, cooldown=30),
+    "creator": RateLimitRule(rate=0.3, burst=2, min_rate=0.05, max_rate=1.0, increase=0.01, cooldown=30),
+    "upload": RateLimitRule(rate=10, burst=10, min_rate=1, max_rate=20, increase=0.5, cooldown=5),
+}
+
+# 接口返回 HTTP 200 时表示访问频率过高的业务错误码和提示关键字
+THROTTLE_CODES = {300013}
+THROTTLE_KEYWORDS = ("频繁", "频次", "too many requests", "rate limit")
+
+
+class MemoryRateLimitBackend:
+    """进程内状态存储，用于测试和单进程场景"""
+
+    def __init__(self):
+        self._states: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key: str, func: Callable[[Optional[Dict]], Tuple[Dict, Any]]) -> Any:
+        """原子地读取并更新状态，func 接收旧状态，返回 (新状态, 结果)"""
+        with self._lock:
+            state, result = func(self._states.get(key))
+            self._states[key] = state
+            return result
+
+
+class FileRateLimitBackend:
+    """基于文件锁的状态存储，同一台机器上的多个进程共享"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def update(self, key: str, func: Callable[[Optional[Dict]], Tuple[Dict, Any]]) -> Any:
+        """原子地读取并更新状态，func 接收旧状态，返回 (新状态, 结果)"""
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            with os.fdopen(fd, "r+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    raw = f.read()
+                    states = json.loads(raw) if raw else {}
+                    state, result = func(states.get(key))
+                    states[key] = state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(states))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            return result
+
+
+class RedisRateLimitBackend:
+    """基于Redis的状态存储，多台机器共享"""
+
+    def __init__(self, url: str, prefix: str = "xhs:rate_limit:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def update(self, key: str, func: Callable[[Optional[Dict]], Tuple[Dict, Any]]) -> Any:
+        """使用 WATCH/MULTI 乐观事务原子地读取并更新状态"""
+        redis_key = f"{self.prefix}{key}"
+        results = []
+
+        def transaction(pipe):
+            raw = pipe.get(redis_key)
+            state, result = func(json.loads(raw) if raw else None)
+            pipe.multi()
+            pipe.set(redis_key, json.dumps(state), ex=24 * 3600)
+            results.append(result)
+
+        self.client.transaction(transaction, redis_key)
+        return results[-1]
+
+
+class RateLimiter:
+    """自适应令牌桶限流器
+
+    每个接口类别一个令牌桶，状态保存在可跨进程共享的存储中。
+    请求前预定令牌并等待；出错时速率减半，收到 429 或响应体表示限流时还会暂停该类别，成功时速率缓慢回升。
+    """
+
+    def __init__(self, backend, rules: Optional[Dict[str, RateLimitRule]] = None,
+                 jitter: float = 0.3, logger: Optional[logging.Logger] = None):
+        """初始化限流器
+
+        Args:
+            backend: 状态存储
+            rules: 接口类别到限流规则的映射
+            jitter: 需要等待时附加的随机抖动上限（秒）
+            logger: 日志记录器
+        """
+        self.backend = backend
+        self.rules = rules or DEFAULT_RULES
+        self.jitter = jitter
+        self.logger = logger or logging.getLogger(__name__)
+        self._fallback = MemoryRateLimitBackend()
+
+    def classify(self, url: str) -> str:
+        """根据请求地址确定接口类别，调用方未指定类别时使用
+
+        子域名与规则同名的小红书接口（ark、edith、creator）按子域名限流；
+        已知的上传地址（首段子域名包含 upload，如 ros-upload，或腾讯云 COS 域名）归为 upload；
+        其余地址无法确定是否为小红书接口，按 edith 的保守规则限流
+        """
+        host = urlparse(url).hostname or ""
+        name = host.split(".")[0]
+        if host.endswith("xiaohongshu.com") and name in self.rules:
+            return name
+        if "upload" in name or host.endswith(".myqcloud.com") or ".cos." in f".{host}":
+            return "upload"
+        return "edith"
+
+    def is_throttled(self, response_data: Any) -> bool:
+        """HTTP 200 的响应体是否表示触发了接口频率限制"""
+        if not isinstance(response_data, dict) or response_data.get("success") is not False:
+            return False
+        if response_data.get("code") in THROTTLE_CODES:
+            return True
+        message = str(response_data.get("msg") or response_data.get("message") or "").lower()
+        return any(keyword in message for keyword in THROTTLE_KEYWORDS)
+
+    def _update(self, key: str, func: Callable[[Optional[Dict]], Tuple[Dict, Any]]) -> Any:
+        """更新状态，共享存储不可用时退化为进程内存储"""
+        try:
+            return self.backend.update(key, func)
+        except Exception as e:
+            self.logger.warning(f"限流状态存储不可用，使用进程内限流: {str(e)}")
+            return self._fallback.update(key, func)
+
+    def _initial_state(self, rule: RateLimitRule, now: float) -> Dict[str, float]:
+        return {"tokens": rule.burst, "updated_at": now, "rate": rule.rate, "blocked_until": 0.0}
+
+    def reserve(self, url: str, category: str = "") -> float:
+        """预定一个令牌
+
+        Args:
+            url: 请求地址
+            category: 接口类别，为空时按地址确定
+
+        Returns:
+            需要等待的秒数
+        """
+        key = category or self.classify(url)
+        rule = self.rules[key]
+
+        def take(state: Optional[Dict]) -> Tuple[Dict, float]:
+            now = time.time()
+            state = state or self._initial_state(rule, now)
+            elapsed = max(now - state["updated_at"], 0.0)
+            tokens = min(rule.burst, state["tokens"] + elapsed * state["rate"])
+            # 令牌可以透支，后来的请求按顺序排在后面
+            tokens -= 1
+            wait = 0.0 if tokens >= 0 else -tokens / state["rate"]
+            wait = max(wait, state["blocked_until"] - now)
+            state.update(tokens=tokens, updated_at=now)
+            return state, wait
+
+        wait = self._update(key, take)
+        if wait > 0:
+            wait += random.uniform(0, self.jitter)
+        return wait
+
+    def acquire(self, url: str, category: str = ""):
+        """获取一个令牌，必要时阻塞等待，参数同 reserve"""
+        wait = self.reserve(url, category)
+        if wait > 0:
+            self.logger.info(f"Rate limiting: sleeping for {wait:.2f} seconds")
+            time.sleep(wait)
+
+    def feedback(self, url: str, status_code: Optional[int], retry_after: Optional[str] = None, category: str = "",
+                 response_data: Any = None):
+        """根据响应调整速率
+
+        HTTP 200 但 success 为 false 的响应按失败处理；响应体中的限流错误码与 429 一样暂停该类别
+
+        Args:
+            url: 请求地址
+            status_code: HTTP状态码，请求异常时为 None
+            retry_after: 响应中的 Retry-After 头
+            category: 接口类别，为空时按地址确定
+            response_data: 解析后的 JSON 响应体，不是 JSON 时为 None
+        """
+        key = category or self.classify(url)
+        rule = self.rules[key]
+        throttled = status_code == 429 or self.is_throttled(response_data)
+        success = (status_code is not None and status_code < 400 and not throttled
+                   and not (isinstance(response_data, dict) and response_data.get("success") is False))
+
+        def adjust(state: Optional[Dict]) -> Tuple[Dict, float]:
+            now = time.time()
+            state = state or self._initial_state(rule, now)
+            if success:
+                state["rate"] = min(rule.max_rate, state["rate"] + rule.increase)
+            else:
+                state["rate"] = max(rule.min_rate, state["rate"] / 2)
+                if throttled:
+                    cooldown = rule.cooldown
+                    if retry_after and retry_after.isdigit():
+                        cooldown = max(cooldown, float(retry_after))
+                    state["blocked_until"] = max(state["blocked_until"], now + cooldown)
+            return state, state["rate"]
+
+        rate = self._update(key, adjust)
+        if throttled:
+            self.logger.warning(f"{key} 接口触发限流({status_code})，暂停后限流速率降至 {rate:.3f}/s")
+        elif not success:
+            self.logger.warning(f"{key} 接口响应异常({status_code})，限流速率降至 {rate:.3f}/s")
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(backend: str = "", logger: Optional[logging.Logger] = None) -> RateLimiter:
+    """获取进程内共享的限流器
+
+    Args:
+        backend: 存储类型 redis/file/memory，默认读取 XHS_RATE_LIMIT_BACKEND，
+                 未设置时配置了Redis则使用Redis，否则使用文件锁
+        logger: 日志记录器
+    """
+    backend = backend or os.getenv("XHS_RATE_LIMIT_BACKEND", "")
+    if not backend:
+        backend = "redis" if RedisConfig.is_configured() else "file"
+
+    with _rate_limiters_lock:
+        if backend not in _rate_limiters:
+            if backend == "redis":
+                store = RedisRateLimitBackend(RedisConfig.get_url())
+            elif backend == "file":
+                store = FileRateLimitBackend(os.getenv("XHS_RATE_LIMIT_FILE", "/tmp/xhs_rate_limit.json"))
+            else:
+                store = MemoryRateLimitBackend()
+            _rate_limiters[backend] = RateLimiter(store, logger=logger)
+        return _rate_limiters[backend]
@@ -0,0 +1,211 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from app.internal.db import engine
+from app.models.product import Tag
+from .xiaohongshu_client import BaseXiaohongshuClient, XiaohongshuClient, XiaohongshuRequest
+
+
+class TopicCache:
+    """话题解析缓存：标签名 -> 小红书话题
+
+    两级缓存，进程内LRU + Tag表，Tag表中的记录分三类：
+    - type="topic": 话题本身，id 为话题ID，name 为话题名称
+    - type="alias": 搜索词与话题名称不一致时的映射，name 为搜索词，link 存放话题ID
+    - type="miss": 搜索无结果的负缓存，name 为搜索词
+    记录按 update_at 判断是否过期，负缓存的有效期更短。
+    """
+
+    PLATFORM = "xiaohongshu"
+    TOPIC_SEARCH_PATH = "/web_api/sns/v1/search/topic"
+    TOPIC_SEARCH_BASE_URL = "https://edith.xiaohongshu.com"
+
+    # 有效期（毫秒）
+    TTL = 7 * 24 * 3600 * 1000
+    NEGATIVE_TTL = 24 * 3600 * 1000
+    # 进程内缓存条数
+    MAXSIZE = 1024
+
+    # 进程内LRU在所有实例间共享，值为 (话题或None, 过期时间毫秒)
+    _lru: "OrderedDict[str, Tuple[Optional[Dict[str, str]], int]]" = OrderedDict()
+    _lru_lock = threading.Lock()
+
+    def __init__(self, client: Optional[XiaohongshuClient] = None, logger: Optional[logging.Logger] = None):
+        """初始化话题缓存
+
+        Args:
+            client: 小红书客户端，仅 resolve 需要发起搜索时使用
+            logger: 日志记录器
+        """
+        self.client = client
+        self.logger = logger or logging.getLogger(__name__)
+
+    @staticmethod
+    def _key_id(prefix: str, keyword: str) -> str:
+        """搜索词对应的记录ID"""
+        return f"{prefix}_{hashlib.md5(keyword.encode()).hexdigest()}"
+
+    def _lru_get(self, keyword: str, now: int) -> Tuple[bool, Optional[Dict[str, str]]]:
+        with self._lru_lock:
+            entry = self._lru.get(keyword)
+            if entry is None:
+                return False, None
+            if entry[1] <= now:
+                del self._lru[keyword]
+                return False, None
+            self._lru.move_to_end(keyword)
+            return True, entry[0]
+
+    def _lru_put(self, keyword: str, topic: Optional[Dict[str, str]], expire_at: int):
+        with self._lru_lock:
+            self._lru[keyword] = (topic, expire_at)
+            self._lru.move_to_end(keyword)
+            while len(self._lru) > self.MAXSIZE:
+                self._lru.popitem(last=False)
+
+    def lookup(self, keywords: Iterable[str]) -> Tuple[Dict[str, Optional[Dict[str, str]]], List[str]]:
+        """从缓存中查找话题，不发起网络请求
+
+        Args:
+            keywords: 标签名列表
+
+        Returns:
+            (已命中的 标签名->话题，话题为 None 表示确认无结果, 未命中的标签名列表)
+        """
+        now = int(time.time() * 1000)
+        resolved: Dict[str, Optional[Dict[str, str]]] = {}
+        pending = []
+        for keyword in dict.fromkeys(keywords):
+            hit, topic = self._lru_get(keyword, now)
+            if hit:
+                resolved[keyword] = topic
+            else:
+                pending.append(keyword)
+        if not pending:
+            return resolved, []
+
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Tag).where(Tag.platform == self.PLATFORM, Tag.name.in_(pending))
+            ).all()
+            # 同名记录中优先使用话题本身，其次是映射和负缓存
+            priority = {"topic": 0, "alias": 1, "miss": 2}
+            rows = sorted(
+                (row for row in rows
+                 if row.type in priority
+                 and now - row.update_at < (self.NEGATIVE_TTL if row.type == "miss" else self.TTL)),
+                key=lambda row: priority[row.type],
+            )
+            alias_ids = {row.link for row in rows if row.type == "alias"}
+            targets = {}
+            if alias_ids:
+                targets = {
+                    row.id: row for row in session.exec(select(Tag).where(Tag.id.in_(alias_ids))).all()
+                }
+
+            for row in rows:
+                if row.name in resolved:
+                    continue
+                if row.type == "topic":
+                    topic = {"id": row.id, "name": row.name, "link": row.link}
+                elif row.type == "alias":
+                    target = targets.get(row.link)
+                    if target is None:
+                        continue
+                    topic = {"id": target.id, "name": target.name, "link": target.link}
+                else:
+                    topic = None
+                ttl = self.NEGATIVE_TTL if topic is None else self.TTL
+                resolved[row.name] = topic
+                self._lru_put(row.name, topic, row.update_at + ttl)
+
+        return resolved, [keyword for keyword in pending if keyword not in resolved]
+
+    def build_search_request(self, client: BaseXiaohongshuClient, keyword: str) -> XiaohongshuRequest:
+        """构建话题搜索请求，同步和异步客户端均可使用"""
+        data = {"keyword": keyword, "suggest_topic_request": {"title": "", "desc": ""}, "page": {"page_size": 20, "page": 1}}
+        return client.build_request("POST", self.TOPIC_SEARCH_PATH, api_base_url=self.TOPIC_SEARCH_BASE_URL, data=data)
+
+    def store(self, responses: Dict[str, Any]) -> Dict[str, Optional[Dict[str, str]]]:
+        """保存话题搜索结果
+
+        Args:
+            responses: 标签名 -> 话题搜索接口响应，请求失败的响应不写入缓存
+
+        Returns:
+            标签名 -> 话题，话题为 None 表示搜索无结果
+        """
+        now = int(time.time() * 1000)
+        resolved: Dict[str, Optional[Dict[str, str]]] = {}
+        with Session(engine) as session:
+            for keyword, response in responses.items():
+                if not isinstance(response, dict) or not response.get("success") or "data" not in response:
+                    self.logger.warning(f"话题搜索失败，不写入缓存: {keyword}, {response}")
+                    continue
+                topics = response["data"].get("topic_info_dtos") or []
+                if topics:
+                    info = topics[0]
+                    topic = {"id": info["id"], "name": info["name"], "link": info["link"]}
+                    self._save_row(session, topic["id"], topic["name"], topic["link"], "topic", now)
+                    if topic["name"] != keyword:
+                        self._save_row(session, self._key_id("alias", keyword), keyword, topic["id"], "alias", now)
+                    miss = session.get(Tag, self._key_id("miss", keyword))
+                    if miss:
+                        session.delete(miss)
+                    self._lru_put(keyword, topic, now + self.TTL)
+                else:
+                    topic = None
+                    self._save_row(session, self._key_id("miss", keyword), keyword, "", "miss", now)
+                    self._lru_put(keyword, None, now + self.NEGATIVE_TTL)
+                resolved[keyword] = topic
+            session.commit()
+        return resolved
+
+    def _save_row(self, session: Session, tag_id: str, name: str, link: str, tag_type: str, now: int):
+        """插入或刷新一条Tag记录"""
+        row = session.get(Tag, tag_id)
+        if row is None:
+            row = Tag(id=tag_id, platform=self.PLATFORM, create_at=now, name=name, link=link, type=tag_type)
+        row.name = name
+        row.link = link
+        row.type = tag_type
+        row.update_at = now
+        session.add(row)
+
+    def resolve(self, keywords: Iterable[str]) -> Dict[str, Optional[Dict[str, str]]]:
+        """解析标签名对应的话题，缓存未命中的标签并发搜索后写入缓存
+
+        Args:
+            keywords: 标签名列表
+
+        Returns:
+            标签名 -> 话题，话题为 None 表示无结果；搜索失败的标签不在结果中
+        """
+        resolved, missing = self.lookup(keywords)
+        if missing:
+            if self.client is None:
+                raise ValueError("TopicCache 未设置客户端，无法搜索话题")
+            self.logger.info(f"话题缓存未命中 {len(missing)} 个标签，开始搜索: {missing}")
+            responses = self.client.map(
+                [self.build_search_request(self.client, keyword) for keyword in missing],
+                return_exceptions=True,
+            )
+            resolved.update(self.store(dict(zip(missing, responses))))
+        return resolved
+
+    def warm(self, keywords: Iterable[str]) -> int:
+        """预热缓存
+
+        Returns:
+            本次新搜索的标签数
+        """
+        _, missing = self.lookup(keywords)
+        if missing:
+            self.resolve(missing)
+        return len(missing)
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional
+
+
+class UploadPermit(NamedTuple):
+    """一个上传许可，file_id 只能使用一次"""
+    upload_addr: str
+    token: str
+    file_id: str
+    expire_at: int  # token过期时间（毫秒）
+
+
+class _PermitStock:
+    """按场景存放未使用的上传许可，丢弃即将过期的许可"""
+
+    def __init__(self, expire_margin: int):
+        self.expire_margin = expire_margin
+        self._permits: Dict[str, Deque[UploadPermit]] = {}
+
+    def take(self, scene: str) -> Optional[UploadPermit]:
+        permits = self._permits.setdefault(scene, deque())
+        deadline = int(time.time() * 1000) + self.expire_margin
+        while permits:
+            permit = permits.popleft()
+            if permit.expire_at > deadline:
+                return permit
+        return None
+
+    def add(self, scene: str, permits: List[UploadPermit]):
+        self._permits.setdefault(scene, deque()).extend(permits)
+
+    def available(self, scene: str) -> int:
+        deadline = int(time.time() * 1000) + self.expire_margin
+        return sum(1 for permit in self._permits.get(scene, ()) if permit.expire_at > deadline)
+
+
+class UploadPermitPool:
+    """小红书上传许可池
+
+    每次请求许可时申请 batch_size 个文件ID（file_count > 1），按场景缓存，
+    发布一篇笔记的视频和封面不再各自请求许可。取出后剩余数量低于 low_watermark 时
+    在后台线程补充，token 剩余有效期不足 expire_margin 的许可直接丢弃。
+    同一个 NoteService 的预上传、发布和重试共用一个池。
+    """
+
+    def __init__(self, fetch: Callable[[str, int], List[UploadPermit]], batch_size: int = 4, low_watermark: int = 1,
+                 expire_margin: int = 10 * 60 * 1000, logger: Optional[logging.Logger] = None):
+        """初始化许可池
+
+        Args:
+            fetch: 请求许可的函数，参数为 (场景, 文件数)
+            batch_size: 每次请求的文件数，为 1 时等同于不缓存
+            low_watermark: 剩余许可数低于该值时后台补充
+            expire_margin: token 剩余有效期不足该值（毫秒）时不再使用
+            logger: 日志记录器
+        """
+        self.fetch = fetch
+        self.batch_size = max(1, batch_size)
+        self.low_watermark = low_watermark
+        self.logger = logger or logging.getLogger(__name__)
+        self._stock = _PermitStock(expire_margin)
+        self._lock = threading.Lock()
+        # 每个场景同一时刻只有一个许可请求，并发的取用方等待其结果
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+
+    def acquire(self, scene: str) -> UploadPermit:
+        """取出一个许可，池中没有可用许可时请求一批，已有请求进行中时等待其结果"""
+        while True:
+            with self._lock:
+                permit = self._stock.take(scene)
+                fetch_lock = self._fetch_locks.setdefault(scene, threading.Lock())
+            if permit is not None:
+                self._maybe_refill(scene)
+                return permit
+            with fetch_lock:
+                with self._lock:
+                    if self._stock.available(scene):
+                        continue
+                permits = self.fetch(scene, self.batch_size)
+                if not permits:
+                    raise Exception(f"获取上传许可失败: {scene}")
+                with self._lock:
+                    self._stock.add(scene, permits)
+
+    def _maybe_refill(self, scene: str):
+        if self.batch_size <= 1:
+            return
+        with self._lock:
+            if self._stock.available(scene) >= self.low_watermark:
+                return
+            fetch_lock = self._fetch_locks[scene]
+        if fetch_lock.acquire(blocking=False):
+            threading.Thread(target=self._refill, args=(scene, fetch_lock), name=f"xhs-permit-{scene}", daemon=True).start()
+
+    def _refill(self, scene: str, fetch_lock: threading.Lock):
+        try:
+            permits = self.fetch(scene, self.batch_size)
+            with self._lock:
+                self._stock.add(scene, permits)
+            self.logger.info(f"补充 {scene} 上传许可 {len(permits)} 个")
+        except Exception as e:
+            self.logger.warning(f"补充 {scene} 上传许可失败: {str(e)}")
+        finally:
+            fetch_lock.release()
+
+
+class AsyncUploadPermitPool:
+    """上传许可池异步版本，与 UploadPermitPool 行为一致，在事件循环的后台任务中补充"""
+
+    def __init__(self, fetch: Callable[[str, int], Awaitable[List[UploadPermit]]], batch_size: int = 4, low_watermark: int = 1,
+                 expire_margin: int = 10 * 60 * 1000, logger: Optional[logging.Logger] = None):
+        self.fetch = fetch
+        self.batch_size = max(1, batch_size)
+        self.low_watermark = low_watermark
+        self.logger = logger or logging.getLogger(__name__)
+        self._stock = _PermitStock(expire_margin)
+        self._fetch_locks: Dict[str, asyncio.Lock] = {}
+        self._refilling: Dict[str, asyncio.Task] = {}
+
+    async def acquire(self, scene: str) -> UploadPermit:
+        """取出一个许可，池中没有可用许可时请求一批，已有请求进行中时等待其结果"""
+        fetch_lock = self._fetch_locks.setdefault(scene, asyncio.Lock())
+        while True:
+            permit = self._stock.take(scene)
+            if permit is not None:
+                self._maybe_refill(scene)
+                return permit
+            async with fetch_lock:
+                if self._stock.available(scene):
+                    continue
+                permits = await self.fetch(scene, self.batch_size)
+                if not permits:
+                    raise Exception(f"获取上传许可失败: {scene}")
+                self._stock.add(scene, permits)
+
+    def _maybe_refill(self, scene: str):
+        if self.batch_size <= 1 or self._stock.available(scene) >= self.low_watermark:
+            return
+        if not self._fetch_locks[scene].locked():
+            self._refilling[scene] = asyncio.create_task(self._refill(scene))
+
+    async def _refill(self, scene: str):
+        try:
+            async with self._fetch_locks[scene]:
+                if self._stock.available(scene) >= self.low_watermark:
+                    return
+                permits = await self.fetch(scene, self.batch_size)
+                self._stock.add(scene, permits)
+            self.logger.info(f"补充 {scene} 上传许可 {len(permits)} 个")
+        except Exception as e:
+            self.logger.warning(f"补充 {scene} 上传许可失败: {str(e)}")
+
+    async def close(self):
+        """取消进行中的补充任务"""
+        for task in self._refilling.values():
+            task.cancel()
+        self._refilling.clear()
@@ -0,0 +1,170 @@
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlmodel import Session, select
+
+from app.internal.db import engine
+from app.models.video import XhsMediaUpload
+
+
+class UploadStateStore:
+    """小红书上传状态存储
+
+    每次分片上传成功后立即记录 ETag，上传中断后下次发布时可以找回
+    同一源文件未过期的上传任务，只补传缺失的分片。
+    上传完成的记录同时作为按源文件索引的上传登记，有效期内再次发布同一文件时直接复用文件ID。
+    """
+
+    # token 剩余有效期不足该值（毫秒）时不再续传，避免上传途中过期
+    EXPIRE_MARGIN = 10 * 60 * 1000
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def find_resumable(self, source_key: str, scene: str, part_size: int) -> Optional[XhsMediaUpload]:
+        """查找可续传的上传任务
+
+        Args:
+            source_key: 源文件标识
+            scene: 上传场景
+            part_size: 本次上传的分片大小，分片大小不同时无法续传
+
+        Returns:
+            最近一次未完成且token未过期的上传任务，没有时返回 None
+        """
+        now = int(time.time() * 1000)
+        with Session(engine) as session:
+            return session.exec(
+                select(XhsMediaUpload).where(
+                    XhsMediaUpload.source_key == source_key,
+                    XhsMediaUpload.scene == scene,
+                    XhsMediaUpload.status == "uploading",
+                    XhsMediaUpload.upload_id != "",
+                    XhsMediaUpload.part_size == part_size,
+                    XhsMediaUpload.token_expire_at > now + self.EXPIRE_MARGIN,
+                ).order_by(XhsMediaUpload.id.desc())
+            ).first()
+
+    def find_completed(self, source_key: str, scene: str, ttl: int) -> Optional[XhsMediaUpload]:
+        """查找有效期内已完成的上传
+
+        Args:
+            source_key: 源文件标识
+            scene: 上传场景
+            ttl: 有效期（秒）
+
+        Returns:
+            最近一次完成且未过期的上传，没有时返回 None
+        """
+        if ttl <= 0 or not source_key:
+            return None
+        now = int(time.time() * 1000)
+        with Session(engine) as session:
+            return session.exec(
+                select(XhsMediaUpload).where(
+                    XhsMediaUpload.source_key == source_key,
+                    XhsMediaUpload.scene == scene,
+                    XhsMediaUpload.status == "completed",
+                    XhsMediaUpload.completed_at > now - ttl * 1000,
+                ).order_by(XhsMediaUpload.completed_at.desc())
+            ).first()
+
+    def record_completed(self, source_key: str, scene: str, upload_addr: str, file_id: str) -> XhsMediaUpload:
+        """登记一次不分片的完成上传（如封面）"""
+        now = int(time.time() * 1000)
+        upload = XhsMediaUpload(
+            source_key=source_key,
+            scene=scene,
+            upload_addr=upload_addr,
+            token="",
+            file_id=file_id,
+            status="completed",
+            completed_at=now,
+        )
+        return self._save(upload)
+
+    def invalidate(self, source_key: str, scenes: Optional[List[str]] = None):
+        """作废源文件已完成的上传，下次发布时重新上传
+
+        Args:
+            source_key: 源文件标识
+            scenes: 只作废这些场景的上传，为空时作废全部
+        """
+        with Session(engine) as session:
+            query = select(XhsMediaUpload).where(
+                XhsMediaUpload.source_key == source_key,
+                XhsMediaUpload.status == "completed",
+            )
+            if scenes:
+                query = query.where(XhsMediaUpload.scene.in_(scenes))
+            uploads = session.exec(query).all()
+            for upload in uploads:
+                upload.status = "expired"
+                upload.update_at = int(time.time() * 1000)
+                session.add(upload)
+            session.commit()
+
+    def create(self, source_key: str, scene: str, upload_addr: str, token: str, file_id: str, upload_id: str,
+               token_expire_at: int, part_size: int, total_parts: int) -> XhsMediaUpload:
+        """记录新的上传任务"""
+        upload = XhsMediaUpload(
+            source_key=source_key,
+            scene=scene,
+            upload_addr=upload_addr,
+            token=token,
+            file_id=file_id,
+            upload_id=upload_id,
+            token_expire_at=token_expire_at,
+            part_size=part_size,
+            total_parts=total_parts,
+        )
+        return self._save(upload)
+
+    @staticmethod
+    def get_parts(upload: XhsMediaUpload) -> Dict[int, str]:
+        """已上传的分片 {分片序号: ETag}"""
+        return {int(number): etag for number, etag in json.loads(upload.parts or "{}").items()}
+
+    def set_parts(self, upload: XhsMediaUpload, parts: Dict[int, str]):
+        """以COS中实际存在的分片覆盖记录"""
+        with self._lock:
+            upload.parts = json.dumps({str(number): etag for number, etag in sorted(parts.items())})
+            self._save(upload)
+
+    def record_part(self, upload: XhsMediaUpload, part_number: int, etag: str):
+        """记录一个上传成功的分片，可在多个上传线程中调用"""
+        with self._lock:
+            parts = self.get_parts(upload)
+            parts[part_number] = etag
+            upload.parts = json.dumps({str(number): value for number, value in sorted(parts.items())})
+            try:
+                self._save(upload)
+            except Exception as e:
+                # 记录失败只影响续传，不中断上传
+                self.logger.warning(f"保存分片上传状态失败: {upload.file_id} part {part_number}, {str(e)}")
+
+    def complete(self, upload: XhsMediaUpload, file_id: str = ""):
+        """标记上传完成，file_id 为完成上传响应中的文件ID"""
+        now = int(time.time() * 1000)
+        with self._lock:
+            upload.file_id = file_id or upload.file_id
+            upload.status = "completed"
+            upload.completed_at = now
+            self._save(upload)
+
+    def expire(self, upload: XhsMediaUpload):
+        """标记上传任务失效（COS中已不存在或无法续传）"""
+        with self._lock:
+            upload.status = "expired"
+            self._save(upload)
+
+    def _save(self, upload: XhsMediaUpload) -> XhsMediaUpload:
+        upload.update_at = int(time.time() * 1000)
+        with Session(engine, expire_on_commit=False) as session:
+            upload = session.merge(upload)
+            session.commit()
+            return upload
@@ -1,14 +1,31 @@
+import os
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import logging
+import base64
 import hashlib
-import math
 import random
 import time
 import xmltodict
-from typing import Dict, Any, Optional
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, List, Mapping, Optional, Union
+from dataclasses import dataclass, field
 from ...config.auth_config import AuthConfig
+from ...config.xhs_upload_config import XhsUploadConfig
+from .rate_limiter import RateLimiter, get_rate_limiter
+
+
+# 签名使用的自定义Base64字符集，第65位为补位字符
+SIGN_ALPHABET = "A4NjFqYu5wPHsO0XTdDgMa2r1ZQocVte9UJBvk6/7=yRnhISGKblCWi+LpfE8xzm3"
+# 标准Base64字符集到签名字符集的转换表
+SIGN_TRANSLATION = bytes.maketrans(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=",
+    SIGN_ALPHABET.encode()
+)
+# 请求体与签名共用的JSON编码器，紧凑格式且非ASCII字符转义，与服务端验签的格式一致
+JSON_ENCODER = json.JSONEncoder(ensure_ascii=True, separators=(',', ':'))
 
 
 @dataclass
@@ -18,32 +35,46 @@ class XiaohongshuConfig:
     TIMEOUT: int = 30
     MAX_RETRIES: int = 3
     USER_AGENT: str = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.361442) NetType/WIFI Language/en"
-    MIN_REQUEST_INTERVAL: float = 2.0  # 最小请求间隔（秒）
-    MAX_REQUEST_INTERVAL: float = 5.0  # 最大请求间隔（秒）
-    LAST_REQUEST_TIME: float = 0.0     # 上次请求时间
+    RATE_LIMIT_BACKEND: str = ""       # 限流状态存储 redis/file/memory，为空时自动选择
+    MAX_CONNECTIONS: int = 20          # 异步客户端连接池总连接数
+    MAX_CONNECTIONS_PER_HOST: int = 4  # 异步客户端单个域名的并发连接数
+    KEEPALIVE_EXPIRY: float = 30.0     # 空闲连接保持时间（秒）
+    HTTP2: bool = True                 # 异步客户端在安装了 h2 时启用 HTTP/2
+
 
+@dataclass(frozen=True)
+class XiaohongshuRequest:
+    """构建完成的请求
 
-class XiaohongshuClient:
-    """小红书API基础客户端，提供通用功能"""
+    请求体只序列化一次，签名基于同一份字节计算，发送时原样使用；
+    headers 只包含本次请求的签名、认证等请求头，构建后只读，不写入会话的公共请求头，
+    因此同一个客户端可以在多个线程中同时发送不同的请求。
+    """
+    method: str
+    url: str
+    path: str
+    params: Optional[Mapping[str, Any]] = None
+    body: Optional[bytes] = None
+    headers: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    response_format: str = "json"
+    rate_limit_category: str = ""  # 限流类别，为空时按地址确定
+
+
+class BaseXiaohongshuClient:
+    """小红书API客户端公共部分：配置、限流、签名与请求头，与具体HTTP库无关"""
     
-    def __init__(self, config: Optional[XiaohongshuConfig] = None, logger: Optional[logging.Logger] = None):
+    def __init__(self, config: Optional[XiaohongshuConfig] = None, logger: Optional[logging.Logger] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         """初始化客户端
         
         Args:
             config: API配置，如果不提供则使用默认配置
             logger: 日志记录器，如果不提供则使用默认记录器
+            rate_limiter: 限流器，如果不提供则使用跨进程共享的限流器
         """
         self.config = config or XiaohongshuConfig()
         self.logger = logger or logging.getLogger(__name__)
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': self.config.USER_AGENT
-        })
-        self._init_session()
-    
-    def _init_session(self):
-        """初始化会话，设置默认请求头"""
-        self.session.headers.update(self._get_default_headers())
+        self.rate_limiter = rate_limiter or get_rate_limiter(self.config.RATE_LIMIT_BACKEND, self.logger)
     
     def _get_default_headers(self) -> Dict[str, str]:
         """获取默认请求头"""
@@ -65,16 +96,16 @@ class XiaohongshuClient:
             'X-B3-Traceid':  ''.join(random.choices("abcdef0123456789", k=16)),
         }
     
-    def set_auth(self, auth_config: AuthConfig):
-        """设置认证信息"""
-        self.session.headers.update({
+    def _get_auth_headers(self, auth_config: AuthConfig) -> Dict[str, str]:
+        """获取认证请求头"""
+        return {
             'cookie': auth_config.cookie,
             'authorization': auth_config.authorization
-        })
+        }
     
     def _dict_to_escaped_str(self, data: Dict) -> str:
         """将字典转换为带转义的字符串"""
-        return json.dumps(data, ensure_ascii=True, separators=(',', ':'))
+        return JSON_ENCODER.encode(data)
     
     def _get_params_str(self, data: Dict) -> str:
         """将字典转换为带转义的字符串"""
@@ -85,134 +116,149 @@ class XiaohongshuClient:
     def get_sign(self, method: str, timestamp: str, path: str, params: Optional[Dict] = None, data: Optional[Dict] = None) -> str:
         """生成签名
         
+        签名为 MD5 十六进制摘要按自定义字符集做的 Base64 编码，
+        通过标准 Base64 编码后查表替换字符得到
+        
         Args:
+            method: HTTP方法
             timestamp: 时间戳
             path: API路径
+            params: GET请求参数
             data: 请求数据
             
         Returns:
             生成的签名字符串
         """
+        if method == "GET":
+            payload = self._get_params_str(params)
+        else:
+            payload = self._dict_to_escaped_str(data)
+        return self._sign_payload(method, timestamp, path, payload)
+    
+    def _sign_payload(self, method: str, timestamp: str, path: str, payload: str) -> str:
+        """对已序列化的查询串或请求体生成签名"""
         # 构造签名字符串
         if method == "GET":
-            data_str = self._get_params_str(params)
-            g = 'test'
-            sign_str = f"{timestamp}{g}{path}?{data_str}"
+            sign_str = f"{timestamp}test{path}?{payload}"
         else:
-            data_str = self._dict_to_escaped_str(data)
-            g = 'test'
-            sign_str = f"{timestamp}{g}{path}{data_str}"
+            sign_str = f"{timestamp}test{path}{payload}"
         
-        # 计算MD5
+        # 计算MD5并按自定义字符集编码
         b_md5 = hashlib.md5(sign_str.encode()).hexdigest()
+        result = base64.b64encode(b_md5.encode()).translate(SIGN_TRANSLATION).decode()
         
-        # Base64字符集
-        d = "A4NjFqYu5wPHsO0XTdDgMa2r1ZQocVte9UJBvk6/7=yRnhISGKblCWi+LpfE8xzm3"
-        self.logger.debug(f"Base64 charset: {d}")
-        self.logger.debug(f"MD5 hash: {b_md5}")
-        self.logger.debug(f"Sign string: {sign_str}")
-        
-        # 初始化变量
-        e = b_md5
-        p = 0
-        result = ""
+        self.logger.debug("Generated signature: %s", result)
+        return result
+    
+    def build_request(self, method: str, path: str, api_base_url: str = "", params: Optional[Dict] = None,
+                      data: Optional[Union[Dict, bytes]] = None, headers: Optional[Dict] = None,
+                      reponse_format: str = "json", need_sign: bool = True,
+                      rate_limit_category: str = "") -> XiaohongshuRequest:
+        """构建请求：序列化请求体、签名并生成本次请求的请求头
         
-        while p < len(e):
-            g = "1|5|4|8|6|0|2|7|3"
-            a, c, u, h, l, v, x, b = 0, 0, 0, 0, 0, 0, 0, ""
-            
-            for step in g.split("|"):
-                if step == "0":
-                    if not self._is_nan(u):
-                        h = ((c & 15) << 2) | (u >> 6)
-                    else:
-                        h = ((c & 15) << 2) | (0 >> 6)
-                elif step == "1":
-                    if p < len(e):
-                        a = self._get_char_code_at(e, p)
-                        p += 1
-                elif step == "2":
-                    if not self._is_nan(u):
-                        v = 63 & u
-                    else:
-                        v = 0
-                elif step == "3":
-                    if 'x' in locals() and 'l' in locals() and 'h' in locals() and 'v' in locals():
-                        b = self._concat_chars(d, x, l, h, v)
-                elif step == "4":
-                    if p < len(e):
-                        u = self._get_char_code_at(e, p)
-                        p += 1
-                    else:
-                        u = float('nan')
-                elif step == "5":
-                    if p < len(e):
-                        c = self._get_char_code_at(e, p)
-                        p += 1
-                    else:
-                        c = float('nan')
-                elif step == "6":
-                    l = ((a & 3) << 4) | (c >> 4)
-                elif step == "7":
-                    if self._is_nan(c):
-                        h = v = 64
-                    elif self._is_nan(u):
-                        v = 64
-                elif step == "8":
-                    x = a >> 2
+        Args:
+            method: HTTP方法
+            path: API路径
+            api_base_url: API域名，为空时使用配置中的域名
+            params: 查询参数
+            data: 请求数据，字典按JSON序列化，bytes原样发送
+            headers: 额外的请求头
+            reponse_format: 响应格式 json/xml/text
+            need_sign: 是否需要签名和认证
+            rate_limit_category: 限流类别，为空时按地址确定，COS上传请求传 upload
             
-            if 'b' in locals() and b:
-                result += b
+        Returns:
+            XiaohongshuRequest: 构建完成的请求
+        """
+        request_headers = {}
+        body = None
+        if isinstance(data, dict):
+            payload = self._dict_to_escaped_str(data)
+            body = payload.encode()
+            request_headers['Content-Type'] = 'application/json'
+        else:
+            payload = self._dict_to_escaped_str(None)
+            if data:
+                body = data
         
-        self.logger.debug(f"Generated signature: {result}")
-        print(f"Generated signature: {result}")
-        return result
-    
-    def _get_char_code_at(self, text: str, index: int) -> int:
-        """获取字符的ASCII码"""
-        if index < len(text):
-            return ord(text[index])
-        return float('nan')
-    
-    def _is_nan(self, value) -> bool:
-        """检查是否为NaN"""
-        try:
-            return math.isnan(float(value))
-        except (TypeError, ValueError):
-            return False
-    
-    def _concat_chars(self, d: str, x: int, l: int, h: int, v: int) -> str:
-        """拼接字符串"""
-        result = ""
-        try:
-            if 0 <= x < len(d):
-                result += d[x]
-            if 0 <= l < len(d):
-                result += d[l]
-            if 0 <= h < len(d):
-                result += d[h]
-            if 0 <= v < len(d):
-                result += d[v]
-        except (IndexError, TypeError):
-            pass
-        return result
-    
-    def set_sign(self, method: str, path: str, params: Optional[Dict] = None, data: Optional[Dict] = None):
-        """设置签名"""
-        timestamp = str(int(time.time() * 1000))
-        self.session.headers['x-s'] = self.get_sign(method, timestamp, path, params, data)
-        self.session.headers['x-t'] = timestamp
+        if need_sign:
+            timestamp = str(int(time.time() * 1000))
+            if method == "GET":
+                payload = self._get_params_str(params)
+            request_headers['x-s'] = self._sign_payload(method, timestamp, path, payload)
+            request_headers['x-t'] = timestamp
+            request_headers.update(self._get_auth_headers(AuthConfig.from_env()))
+        if headers:
+            request_headers.update(headers)
+        
+        return XiaohongshuRequest(
+            method=method,
+            url=self._build_url(path, api_base_url),
+            path=path,
+            params=MappingProxyType(dict(params)) if params else None,
+            body=body,
+            headers=MappingProxyType(request_headers),
+            response_format=reponse_format,
+            rate_limit_category=rate_limit_category,
+        )
 
-    def _prepare_request(self, method: str, path: str, params: Optional[Dict] = None, data: Optional[Dict] = None, **kwargs):
-        self.set_sign(method, path, params, data)
-        self.set_auth(AuthConfig.from_env())
+    def _build_url(self, path: str, api_base_url: str = "") -> str:
+        """拼接请求地址"""
+        return f"{api_base_url or self.config.API_BASE_URL}{path}"
 
     def is_success(self, response: Dict[str, Any]) -> bool:
         """检查响应是否成功"""
         return response.get("success")
+
+    def _parse_json(self, response) -> Optional[Dict[str, Any]]:
+        """解析 JSON 响应体，不是 JSON 对象时返回 None"""
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _should_retry(self, response, response_data: Optional[Dict[str, Any]]) -> bool:
+        """是否因限流重试：HTTP 429，或 HTTP 200 但响应体表示访问过于频繁"""
+        return response.status_code == 429 or self.rate_limiter.is_throttled(response_data)
+
+
+class XiaohongshuClient(BaseXiaohongshuClient):
+    """小红书API基础客户端，基于 requests 的同步实现
+
+    会话只保存公共请求头，签名、认证和COS token等按请求生成，
+    同一实例可以被多个线程共享，map 使用线程池并发发送一批请求。
+    """
+    
+    def __init__(self, config: Optional[XiaohongshuConfig] = None, logger: Optional[logging.Logger] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        """初始化客户端
+        
+        Args:
+            config: API配置，如果不提供则使用默认配置
+            logger: 日志记录器，如果不提供则使用默认记录器
+            rate_limiter: 限流器，如果不提供则使用跨进程共享的限流器
+        """
+        super().__init__(config, logger, rate_limiter)
+        self.session = requests.Session()
+        # 连接池大小与批量请求线程数一致，避免并发时连接被丢弃
+        adapter = HTTPAdapter(pool_maxsize=max(XhsUploadConfig.MAP_WORKERS, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            'User-Agent': self.config.USER_AGENT
+        })
+        self._init_session()
+        # 在构造时创建，多个线程同时首次调用 map 时不会各自创建线程池；线程在首次提交任务时才启动
+        self._executor = ThreadPoolExecutor(max_workers=XhsUploadConfig.MAP_WORKERS, thread_name_prefix="xhs-client")
+    
+    def _init_session(self):
+        """初始化会话，设置默认请求头"""
+        self.session.headers.update(self._get_default_headers())
     
     def _make_request(self, method: str, path: str, api_base_url: str = "", params: Optional[Dict] = None, 
-                      data: Optional[Dict] = None, headers: Optional[Dict] = None, reponse_format: str = "json", need_sign: bool = True, **kwargs) -> Dict[str, Any]:
+                      data: Optional[Dict] = None, headers: Optional[Dict] = None, reponse_format: str = "json", need_sign: bool = True,
+                      rate_limit_category: str = "", **kwargs) -> Dict[str, Any]:
         """发送HTTP请求
         
         Args:
@@ -227,56 +273,44 @@ class XiaohongshuClient:
         Raises:
             requests.RequestException: 请求异常
         """
-        if need_sign:
-            self._prepare_request(method, path, params, data, **kwargs)
-        if headers:
-            self.session.headers.update(headers)
-        # 添加请求间隔
-        current_time = time.time()
-        time_since_last_request = current_time - self.config.LAST_REQUEST_TIME
-        if time_since_last_request < self.config.MIN_REQUEST_INTERVAL:
-            sleep_time = random.uniform(
-                self.config.MIN_REQUEST_INTERVAL - time_since_last_request,
-                self.config.MAX_REQUEST_INTERVAL - time_since_last_request
-            )
-            self.logger.info(f"Rate limiting: sleeping for {sleep_time:.2f} seconds")
-            time.sleep(sleep_time)
-        
-        self.config.LAST_REQUEST_TIME = time.time()
-        if api_base_url:
-            url = f"{api_base_url}{path}"
-        else:
-            url = f"{self.config.API_BASE_URL}{path}"
-        self.logger.info(f"Making request to: {url} [method: {method}]")
+        request = self.build_request(method, path, api_base_url, params, data, headers, reponse_format, need_sign,
+                                     rate_limit_category)
+        self.logger.info(f"Making request to: {request.url} [method: {method}]")
         if data and isinstance(data, bytes):
             self.logger.info(f"Request data: {data[:100]} bytes")
         else:
             self.logger.info(f"Request data: {data}")
+        return self.send_request(request, **kwargs)
+    
+    def send_request(self, request: XiaohongshuRequest, **kwargs) -> Dict[str, Any]:
+        """发送构建完成的请求，失败时重试
         
-        # 准备请求数据
-        if data and isinstance(data, dict):
-            kwargs['data'] = json.dumps(data, separators=(',', ':'))
-        if params:
-            kwargs['params'] = params
-        # 创建请求对象
+        Args:
+            request: 构建完成的请求
+            **kwargs: 传给 requests.Request 的其他参数
+            
+        Returns:
+            API响应数据
+            
+        Raises:
+            requests.RequestException: 请求异常
+        """
+        method, url, reponse_format = request.method, request.url, request.response_format
+        category = request.rate_limit_category
+        # 会话的公共请求头由 prepare_request 合并，本次请求头只作用于本次请求
         req = requests.Request(
             method=method,
             url=url,
-            headers=self.session.headers,
+            headers=request.headers,
+            params=request.params,
+            data=request.body,
             **kwargs
         )
-        
-        # 准备请求
         prepped = self.session.prepare_request(req)
         
-        # 确保content-type正确设置
-        if data and isinstance(data, dict):
-            prepped.headers['Content-Type'] = 'application/json'
-        
-        # 添加随机延迟
-        time.sleep(random.uniform(0.5, 0.7))
-        
         for attempt in range(self.config.MAX_RETRIES):
+            # 按接口类别限流，每次尝试（包括重试）都需要获取令牌
+            self.rate_limiter.acquire(url, category)
             try:
                 self.logger.info(f"Sending {method} request to {url} (attempt {attempt + 1}/{self.config.MAX_RETRIES})")
                 
@@ -287,40 +321,64 @@ class XiaohongshuClient:
                 )
                 
                 self.logger.info(f"Response status code: {response.status_code}")
+                response_data = self._parse_json(response) if reponse_format == "json" else None
+                self.rate_limiter.feedback(url, response.status_code, response.headers.get("Retry-After"), category,
+                                           response_data)
+                if self._should_retry(response, response_data) and attempt < self.config.MAX_RETRIES - 1:
+                    self.logger.warning(f"Too many requests (attempt {attempt + 1}/{self.config.MAX_RETRIES})")
+                    continue
                 print("Response cookies:", dict(response.cookies))
                 print("Response headers:", dict(response.headers))
                 
-                try:
-                    if reponse_format == "json":
-                        response_data = response.json()
-                    elif reponse_format == "xml":
-                        response_data = xmltodict.parse(response.text)
-                        return response_data
-                    else:
-                        response_data = response.text
-                        return response_data
-                    self.logger.debug(f"Response data: {json.dumps(response_data, ensure_ascii=False, indent=2)}")
-                    if self.is_success(response_data):
-                        return response_data
-                    else:
-                        self.logger.error(f"Response data: {json.dumps(response_data, ensure_ascii=False, indent=2)}")
-                        return {"response": response.text, "status_code": response.status_code}
-                except json.JSONDecodeError:
+                if reponse_format == "xml":
+                    return xmltodict.parse(response.text)
+                if reponse_format != "json":
+                    return response.text
+                if response_data is None:
                     self.logger.warning(f"Failed to parse JSON response: {response.text}")
                     return {"raw_response": response.text, "status_code": response.status_code}
+                self.logger.debug(f"Response data: {json.dumps(response_data, ensure_ascii=False, indent=2)}")
+                if self.is_success(response_data):
+                    return response_data
+                self.logger.error(f"Response data: {json.dumps(response_data, ensure_ascii=False, indent=2)}")
+                return {"response": response.text, "status_code": response.status_code}
                     
             except requests.exceptions.Timeout:
+                self.rate_limiter.feedback(url, None, category=category)
                 self.logger.warning(f"Request timeout (attempt {attempt + 1}/{self.config.MAX_RETRIES})")
                 if attempt == self.config.MAX_RETRIES - 1:
                     raise
                     
             except requests.exceptions.RequestException as e:
+                self.rate_limiter.feedback(url, None, category=category)
                 self.logger.error(f"Request error (attempt {attempt + 1}/{self.config.MAX_RETRIES}): {str(e)}")
                 if attempt == self.config.MAX_RETRIES - 1:
                     raise
                     
         raise requests.RequestException("All retry attempts failed")
     
+    def map(self, xhs_requests: Iterable[XiaohongshuRequest], return_exceptions: bool = False) -> List[Any]:
+        """使用线程池并发发送一批请求，每个请求仍经过限流器
+        
+        Args:
+            xhs_requests: 由 build_request 构建的请求
+            return_exceptions: 为 True 时请求异常作为结果返回，否则抛出第一个异常
+            
+        Returns:
+            与请求顺序一致的响应数据列表
+        """
+        futures = [self._executor.submit(self.send_request, request) for request in xhs_requests]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+    
     def close(self):
         """关闭会话"""
+        self._executor.shutdown(wait=False)
         self.session.close() 
\ No newline at end of file
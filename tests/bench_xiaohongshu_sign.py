@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+小红书请求签名基准测试
+
+测量 get_sign 和 build_request 的单次耗时；指定 --baseline 时从 git 取出该版本的
+xiaohongshu_client.py，用同一批输入测量旧实现并校验签名一致。
+
+用法:
+    python tests/bench_xiaohongshu_sign.py
+    python tests/bench_xiaohongshu_sign.py --baseline <commit> -n 20000
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import timeit
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.xiaohongshu.rate_limiter import MemoryRateLimitBackend, RateLimiter
+from app.services.xiaohongshu.xiaohongshu_client import BaseXiaohongshuClient
+
+CLIENT_PATH = "app/services/xiaohongshu/xiaohongshu_client.py"
+
+# 与线上请求相近的输入：商品分页查询（GET）和发布笔记（POST）
+SAMPLES = [
+    ("GET", "1700000000000", "/api/edith/product/search_item_v2", {"page_no": 1, "page_size": 20}, None),
+    ("POST", "1700000000000", "/web_api/sns/v2/note", None, {
+        "common": {"type": "video", "title": "夏日清爽穿搭", "desc": "#话题[话题]# 好看", "ats": [],
+                   "hash_tag": [{"id": "5f", "name": "穿搭", "type": "topic"}]},
+        "video_info": {"fileid": "spectrum/abc", "format_width": 1080, "format_height": 1920},
+    }),
+]
+
+
+def load_baseline(rev: str):
+    """从 git 加载指定版本的客户端，返回可调用 get_sign 的实例"""
+    source = subprocess.check_output(["git", "show", f"{rev}:{CLIENT_PATH}"], text=True)
+    source = source.replace("from ...config.auth_config", "from app.config.auth_config")
+    module = types.ModuleType("baseline_xiaohongshu_client")
+    # 旧实现每次签名都会 print 中间结果，屏蔽输出，只比较签名计算本身
+    module.print = lambda *args, **kwargs: None
+    exec(compile(source, f"{rev}:{CLIENT_PATH}", "exec"), module.__dict__)
+    client = module.XiaohongshuClient.__new__(module.XiaohongshuClient)
+    client.logger = logging.getLogger("baseline")
+    return client
+
+
+def bench(name: str, func, number: int):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{name:<32} {seconds / number * 1e6:8.2f} us/次")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="小红书请求签名基准测试")
+    parser.add_argument("-n", "--number", type=int, default=20000, help="每轮调用次数")
+    parser.add_argument("--baseline", help="对比的 git 版本")
+    args = parser.parse_args()
+
+    client = BaseXiaohongshuClient(rate_limiter=RateLimiter(MemoryRateLimitBackend()))
+    baseline = load_baseline(args.baseline) if args.baseline else None
+
+    for method, timestamp, path, params, data in SAMPLES:
+        print(f"{method} {path}")
+        current = bench("get_sign", lambda: client.get_sign(method, timestamp, path, params, data), args.number)
+        bench("build_request", lambda: client.build_request(method, path, "", params, data), args.number)
+        if baseline is None:
+            continue
+        expected = baseline.get_sign(method, timestamp, path, params, data)
+        old = bench("get_sign (baseline)", lambda: baseline.get_sign(method, timestamp, path, params, data), args.number)
+        assert client.get_sign(method, timestamp, path, params, data) == expected, "签名与基线不一致"
+        print(f"{'speedup':<32} {old / current:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+测试公共配置
+
+应用在导入 app.internal.db 时按 MySQL 配置创建引擎并建表，测试中改为临时 SQLite 文件，
+限流状态使用进程内存储。
+"""
+import os
+import tempfile
+
+import sqlalchemy.ext.asyncio
+import sqlmodel
+
+os.environ.setdefault("XHS_RATE_LIMIT_BACKEND", "memory")
+
+TEST_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="shop-sphere-test-"), "test.db")
+
+_create_engine = sqlmodel.create_engine
+
+
+def _create_test_engine(url, **kwargs):
+    return _create_engine(f"sqlite:///{TEST_DB_PATH}", connect_args={"check_same_thread": False})
+
+
+sqlmodel.create_engine = _create_test_engine
+sqlalchemy.ext.asyncio.create_async_engine = lambda *args, **kwargs: None
@@ -0,0 +1,79 @@
+"""
+异步客户端请求头测试
+
+COS 上传请求不能带小红书接口的公共请求头（content-type: application/json、origin、referer 等），
+否则封面会以 JSON 类型存入 COS。
+
+运行:
+    python -m pytest tests/test_async_xiaohongshu_client.py -q
+"""
+import asyncio
+from unittest import mock
+
+import httpx
+import pytest
+
+from app.services.xiaohongshu.async_xiaohongshu_client import AsyncXiaohongshuClient
+from app.services.xiaohongshu.rate_limiter import MemoryRateLimitBackend, RateLimiter
+
+UPLOAD_ADDR = "ros-upload.xiaohongshu.com"
+
+
+@pytest.fixture
+def captured():
+    return []
+
+
+@pytest.fixture
+def client(captured):
+    def handler(request: httpx.Request) -> httpx.Response:
+        captured.append(request)
+        return httpx.Response(200, headers={"ETag": '"etag"'}, json={"success": True})
+
+    return AsyncXiaohongshuClient(
+        rate_limiter=RateLimiter(MemoryRateLimitBackend()),
+        transport=httpx.MockTransport(handler),
+    )
+
+
+def test_upload_requests_do_not_carry_api_headers(client, captured):
+    asyncio.run(client.send_raw("PUT", f"https://{UPLOAD_ADDR}/part", rate_limit_category="upload",
+                                headers={"x-cos-security-token": "token"}, content=b"data"))
+    headers = captured[0].headers
+    assert headers["x-cos-security-token"] == "token"
+    for name in ("origin", "referer", "content-type", "sec-fetch-site", "x-b3-traceid"):
+        assert name not in headers
+
+
+def test_api_requests_keep_default_headers(client, captured):
+    asyncio.run(client.send_raw("GET", "https://edith.xiaohongshu.com/api/x"))
+    headers = captured[0].headers
+    assert headers["content-type"] == "application/json"
+    assert "origin" in headers
+
+
+def test_cover_upload_is_sent_as_jpeg(client, captured):
+    from app.services.xiaohongshu.note_service import AsyncNoteService
+
+    service = AsyncNoteService(client=client)
+    with mock.patch.object(service, "_get_upload_permit", return_value=(UPLOAD_ADDR, "token", "file-id")):
+        file_id = asyncio.run(service.upload_cover_to_xiaohongshu(b"\xff\xd8jpeg"))
+    assert file_id == "file-id"
+    request = captured[0]
+    assert request.method == "PUT"
+    assert request.url == f"https://{UPLOAD_ADDR}/file-id"
+    assert request.headers["content-type"] == "image/jpeg"
+    assert "origin" not in request.headers and "referer" not in request.headers
+
+
+def test_account_slots_are_per_instance(client):
+    from app.services.xiaohongshu.note_service import AsyncNoteService
+
+    first, second = AsyncNoteService(client=client), AsyncNoteService(client=client)
+
+    async def slots(service):
+        return service._get_account_slots()
+
+    # 每个实例在各自的事件循环中创建信号量，不会拿到其他事件循环创建的信号量
+    assert asyncio.run(slots(first)) is not asyncio.run(slots(second))
+    assert first._account_slots is not second._account_slots
@@ -0,0 +1,78 @@
+"""
+上传登记复用测试
+
+视频和封面的上传登记分别复用；发布失败时只有小红书明确返回文件无效才作废复用的登记。
+
+运行:
+    python -m pytest tests/test_note_service_reuse.py -q
+"""
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from sqlmodel import Session, delete, select
+
+from app.internal.db import engine
+from app.models.video import XhsMediaUpload
+from app.services.xiaohongshu import note_service as note_service_module
+from app.services.xiaohongshu.note_service import NoteService
+
+SOURCE_KEY = "c" * 64
+
+
+@pytest.fixture
+def service():
+    with Session(engine) as session:
+        session.exec(delete(XhsMediaUpload))
+        session.commit()
+    service = NoteService()
+    yield service
+    service.close()
+
+
+def _statuses():
+    with Session(engine) as session:
+        return {upload.scene: upload.status for upload in session.exec(select(XhsMediaUpload))}
+
+
+def test_video_and_cover_are_reused_independently(service):
+    service.upload_state.record_completed(SOURCE_KEY, "video", "ros-upload.xiaohongshu.com", "spectrum/video")
+    video = SimpleNamespace(oss_object_key="video/a.mp4", third_file_id="", cover_file_id="")
+
+    with mock.patch.object(note_service_module, "get_oss_service"), \
+            mock.patch.object(service, "upload_video_to_xiaohongshu") as upload_video, \
+            mock.patch.object(service, "_get_cover_data", return_value=b"jpeg"), \
+            mock.patch.object(service, "upload_cover_to_xiaohongshu", return_value="spectrum/cover") as upload_cover:
+        reused = service._ensure_media(video, SOURCE_KEY)
+
+    assert reused == ["video"]
+    assert (video.third_file_id, video.cover_file_id) == ("spectrum/video", "spectrum/cover")
+    upload_video.assert_not_called()
+    upload_cover.assert_called_once_with(b"jpeg", SOURCE_KEY)
+
+
+@pytest.mark.parametrize("response, invalid", [
+    ({"response": json.dumps({"success": False, "msg": "视频文件已过期，请重新上传"}), "status_code": 200}, True),
+    ({"response": json.dumps({"success": False, "msg": "fileId invalid"}), "status_code": 200}, True),
+    ({"response": json.dumps({"success": False, "msg": "标题包含敏感词"}), "status_code": 200}, False),
+    ({"response": "upstream file not found", "status_code": 502}, False),
+    ({"success": False, "message": "Read timed out"}, False),
+])
+def test_invalid_file_error_detection(service, response, invalid):
+    assert service._is_invalid_file_error(response) is invalid
+
+
+def test_invalidate_only_expires_reused_scenes(service):
+    service.upload_state.record_completed(SOURCE_KEY, "video", "ros-upload.xiaohongshu.com", "spectrum/video")
+    service.upload_state.record_completed(SOURCE_KEY, "image", "ros-upload.xiaohongshu.com", "spectrum/cover")
+
+    service.upload_state.invalidate(SOURCE_KEY, ["video"])
+
+    assert _statuses() == {"video": "expired", "image": "completed"}
+
+
+def test_missing_cover_permit_raises_with_message(service):
+    with mock.patch.object(service, "_get_upload_permit", return_value=("", "", "")):
+        with pytest.raises(Exception, match="封面上传获取上传许可失败"):
+            service.upload_cover_to_xiaohongshu(b"jpeg")
@@ -0,0 +1,19 @@
+from unittest import mock
+
+from app.services.oss_service import OSSStreamingUpload
+
+
+def test_complete_does_not_copy_object_to_update_metadata():
+    bucket = mock.Mock()
+    bucket.init_multipart_upload.return_value.upload_id = "upload-1"
+    bucket.upload_part.side_effect = lambda key, upload_id, number, data: mock.Mock(etag=f"etag-{number}")
+
+    upload = OSSStreamingUpload(bucket, "video/a.mp4", "video/mp4", part_size=4)
+    upload.write(b"0123456789")
+    upload.complete("d" * 64)
+
+    bucket.init_multipart_upload.assert_called_once_with("video/a.mp4", headers={"Content-Type": "video/mp4"})
+    parts = bucket.complete_multipart_upload.call_args.args[2]
+    assert [(part.part_number, part.size) for part in parts] == [(1, 4), (2, 4), (3, 2)]
+    bucket.update_object_meta.assert_not_called()
+    bucket.copy_object.assert_not_called()
@@ -0,0 +1,65 @@
+import time
+from unittest import mock
+
+from sqlmodel import Session, delete
+
+from app.internal.db import engine
+from app.models.product import ArticlePublishLease, ArticleStatus, ProductArticle
+from app.scripts import prestage_notes
+
+
+class FakeNoteService:
+    def __init__(self, staged=()):
+        self.staged = set(staged)
+        self.checked = []
+
+    def is_staged(self, article_id):
+        self.checked.append(article_id)
+        return article_id in self.staged
+
+    def stage_note(self, article, goods_id):
+        return None
+
+
+def _reset(*rows):
+    with Session(engine) as session:
+        session.exec(delete(ProductArticle))
+        session.exec(delete(ArticlePublishLease))
+        for row in rows:
+            session.add(row)
+        session.commit()
+
+
+def _article(article_id, pre_publish_time):
+    return ProductArticle(id=article_id, item_id=f"item-{article_id}", sku_id="", title="", content="", tag_ids="",
+                          owner_id="", author_name="", status=ArticleStatus.PENDING_PUBLISH,
+                          pre_publish_time=pre_publish_time)
+
+
+def test_skips_due_and_leased_articles():
+    now = int(time.time() * 1000)
+    _reset(
+        _article(1, now - 1000),
+        _article(2, now + 60_000),
+        _article(3, now + 120_000),
+        _article(4, now + 180_000),
+        ArticlePublishLease(article_id=3, claim_token="t", lease_expire_at=now + 600_000),
+        ArticlePublishLease(article_id=4, claim_token="t", lease_expire_at=now - 1000),
+    )
+    service = FakeNoteService()
+    prestage_notes.prestage_due_articles(service)
+    # 已到发布时间的 1 和持有有效租约的 3 不参与预上传，租约已过期的 4 可以预上传
+    assert service.checked == [2, 4]
+
+
+def test_cursor_advances_past_unstaged_articles():
+    now = int(time.time() * 1000)
+    _reset(*[_article(i, now + 60_000 * i) for i in range(1, 6)])
+    service = FakeNoteService(staged={1})
+    with mock.patch.object(prestage_notes, "BATCH_SIZE", 2):
+        cursor = prestage_notes.prestage_due_articles(service)
+        cursor = prestage_notes.prestage_due_articles(service, cursor)
+        cursor = prestage_notes.prestage_due_articles(service, cursor)
+    # 每轮从上一轮之后继续，窗口扫描完后回到开头
+    assert service.checked == [1, 2, 3, 4, 5]
+    assert cursor == (0, 0)
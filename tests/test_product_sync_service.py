@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import Session, delete, select
+
+from app.internal.db import engine
+from app.models.product import Product, ProductStatus
+from app.services.product_sync_service import ProductSyncService
+
+
+def _item(i, **overrides):
+    item = {
+        "item_id": f"item-{i}",
+        "item_name": f"商品{i}",
+        "buyable": True,
+        "min_price": 100 + i,
+        "max_price": 200 + i,
+        "images": [{"link": f"https://example.com/{i}.jpg"}],
+        "update_time": 1_700_000_000_000 + i,
+        "first_sku_id": f"sku-{i}",
+    }
+    item.update(overrides)
+    return item
+
+
+def _use_dialect(session, name):
+    """让 _write_rows 按指定数据库的分支写入，其余调用仍使用真实连接"""
+    get_bind = session.get_bind
+
+    def fake_get_bind(*args, **kwargs):
+        if args or kwargs:
+            return get_bind(*args, **kwargs)
+        return SimpleNamespace(dialect=SimpleNamespace(name=name))
+
+    session.get_bind = fake_get_bind
+
+
+@pytest.fixture(autouse=True)
+def empty_products():
+    with Session(engine) as session:
+        session.exec(delete(Product))
+        session.commit()
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "other"])
+def test_bulk_upsert_counts(dialect):
+    service = ProductSyncService(chunk_size=2)
+    items = [_item(i) for i in range(5)]
+
+    with Session(engine) as session:
+        _use_dialect(session, dialect)
+        stats = service.bulk_upsert(session, items + [_item(9, buyable=False)])
+        session.commit()
+    assert stats == {"added": 5, "updated": 0, "unchanged": 0, "skipped": 1}
+
+    # 只改更新时间也需要写回，增量同步的水位依赖 item_update_time
+    items[0]["update_time"] += 1
+    items[1]["min_price"] = 1
+    items[2]["buyable"] = False
+    with Session(engine) as session:
+        _use_dialect(session, dialect)
+        stats = service.bulk_upsert(session, items)
+        session.commit()
+    assert stats == {"added": 0, "updated": 3, "unchanged": 2, "skipped": 0}
+
+    with Session(engine) as session:
+        products = {p.item_id: p for p in session.exec(select(Product))}
+        assert len(products) == 5
+        assert products["item-0"].item_update_time == items[0]["update_time"]
+        assert products["item-1"].min_price == 1
+        assert products["item-2"].status == ProductStatus.UNMANAGED
+        assert service.max_item_update_time(session) == items[4]["update_time"]
+
+    with Session(engine) as session:
+        _use_dialect(session, dialect)
+        stats = service.bulk_upsert(session, items)
+    assert stats == {"added": 0, "updated": 0, "unchanged": 5, "skipped": 0}
+
+
+def test_load_existing_reads_in_chunks_and_keeps_earliest_duplicate():
+    service = ProductSyncService(chunk_size=2)
+    with Session(engine) as session:
+        service.bulk_upsert(session, [_item(i) for i in range(5)])
+        session.add(Product.from_api_response(_item(3, item_name="重复")))
+        session.commit()
+
+        existing = service._load_existing(session, [f"item-{i}" for i in range(6)])
+        assert sorted(existing) == [f"item-{i}" for i in range(5)]
+        assert existing["item-3"]["item_name"] == "商品3"
@@ -0,0 +1,189 @@
+"""
+限流器测试
+
+覆盖接口类别划分、令牌桶、AIMD 速率调整（包括 HTTP 200 的业务限流响应）和三种状态存储。
+Redis 存储需要可连接的 Redis（TEST_REDIS_URL，默认本机 15 号库），不可用时跳过。
+
+运行:
+    python -m pytest tests/test_rate_limiter.py -q
+"""
+import asyncio
+import os
+import threading
+import uuid
+from unittest import mock
+
+import httpx
+import pytest
+
+from app.services.xiaohongshu import rate_limiter as rate_limiter_module
+from app.services.xiaohongshu.async_xiaohongshu_client import AsyncXiaohongshuClient
+from app.services.xiaohongshu.rate_limiter import (
+    DEFAULT_RULES,
+    FileRateLimitBackend,
+    MemoryRateLimitBackend,
+    RateLimiter,
+    RedisRateLimitBackend,
+)
+
+EDITH_URL = "https://edith.xiaohongshu.com/api/sns/v1/note"
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with mock.patch.object(rate_limiter_module.time, "time", clock):
+        yield clock
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(MemoryRateLimitBackend(), jitter=0)
+
+
+def _state(limiter, key):
+    return limiter.backend.update(key, lambda state: (state, dict(state)))
+
+
+@pytest.mark.parametrize("url, category", [
+    ("https://ark.xiaohongshu.com/api/edith/product/search_item_v2", "ark"),
+    (EDITH_URL, "edith"),
+    ("https://creator.xiaohongshu.com/api/galaxy/creator/note", "creator"),
+    ("https://ros-upload.xiaohongshu.com/spectrum/abc?partNumber=1", "upload"),
+    ("https://ros-upload-d4.xhscdn.com/spectrum/abc", "upload"),
+    ("https://bucket-1250000000.cos.ap-shanghai.myqcloud.com/key", "upload"),
+    ("https://www.xiaohongshu.com/api/unknown", "edith"),
+    ("https://example.com/api", "edith"),
+])
+def test_classify(limiter, url, category):
+    assert limiter.classify(url) == category
+
+
+def test_token_bucket_allows_burst_then_spaces_requests(limiter, clock):
+    rule = DEFAULT_RULES["edith"]
+    waits = [limiter.reserve(EDITH_URL) for _ in range(int(rule.burst) + 2)]
+    assert waits[:int(rule.burst)] == [0.0] * int(rule.burst)
+    # 透支的令牌按速率排队
+    assert waits[-2] == pytest.approx(1 / rule.rate)
+    assert waits[-1] == pytest.approx(2 / rule.rate)
+
+    clock.now += 10 / rule.rate
+    assert limiter.reserve(EDITH_URL) == 0.0
+
+
+def test_aimd_increases_on_success_and_halves_on_error(limiter, clock):
+    rule = DEFAULT_RULES["edith"]
+    limiter.feedback(EDITH_URL, 200, response_data={"success": True})
+    assert _state(limiter, "edith")["rate"] == pytest.approx(rule.rate + rule.increase)
+
+    limiter.feedback(EDITH_URL, 500)
+    assert _state(limiter, "edith")["rate"] == pytest.approx((rule.rate + rule.increase) / 2)
+
+    for _ in range(20):
+        limiter.feedback(EDITH_URL, None)
+    assert _state(limiter, "edith")["rate"] == rule.min_rate
+
+    for _ in range(1000):
+        limiter.feedback(EDITH_URL, 200)
+    assert _state(limiter, "edith")["rate"] == rule.max_rate
+
+
+def test_429_pauses_category_for_retry_after(limiter, clock):
+    limiter.feedback(EDITH_URL, 429, retry_after="120")
+    assert limiter.reserve(EDITH_URL) == pytest.approx(120)
+    # 其他类别不受影响
+    assert limiter.reserve("https://ark.xiaohongshu.com/api") == 0.0
+
+
+def test_business_failure_reduces_rate(limiter, clock):
+    rule = DEFAULT_RULES["edith"]
+    limiter.feedback(EDITH_URL, 200, response_data={"success": False, "code": -1, "msg": "参数错误"})
+    state = _state(limiter, "edith")
+    assert state["rate"] == pytest.approx(rule.rate / 2)
+    assert state["blocked_until"] == 0.0
+
+
+@pytest.mark.parametrize("response_data", [
+    {"success": False, "code": 300013, "msg": "访问频次异常，请勿频繁操作"},
+    {"success": False, "code": -100, "msg": "请求太频繁，请稍后再试"},
+])
+def test_business_throttle_pauses_like_429(limiter, clock, response_data):
+    assert limiter.is_throttled(response_data)
+    limiter.feedback(EDITH_URL, 200, response_data=response_data)
+    assert _state(limiter, "edith")["rate"] == pytest.approx(DEFAULT_RULES["edith"].rate / 2)
+    assert limiter.reserve(EDITH_URL) == pytest.approx(DEFAULT_RULES["edith"].cooldown)
+
+
+def test_async_client_feeds_back_business_throttle():
+    responses = iter([
+        httpx.Response(200, json={"success": False, "code": 300013, "msg": "访问频次异常"}),
+        httpx.Response(200, json={"success": True, "data": {}}),
+    ])
+    limiter = RateLimiter(MemoryRateLimitBackend(), jitter=0)
+    client = AsyncXiaohongshuClient(rate_limiter=limiter,
+                                    transport=httpx.MockTransport(lambda request: next(responses)))
+    request = client.build_request("GET", "/api/sns/v1/note", "https://edith.xiaohongshu.com", need_sign=False)
+
+    with mock.patch.object(asyncio, "sleep", mock.AsyncMock()) as sleep:
+        result = asyncio.run(client.send_request(request))
+
+    assert result == {"success": True, "data": {}}
+    # 第一次响应触发暂停，重试前等待冷却时间
+    assert sleep.await_args.args[0] >= DEFAULT_RULES["edith"].cooldown - 1
+    assert _state(limiter, "edith")["rate"] < DEFAULT_RULES["edith"].rate
+
+
+def _redis_backend():
+    url = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+    try:
+        backend = RedisRateLimitBackend(url, prefix=f"test:rate_limit:{uuid.uuid4().hex}:")
+        backend.client.ping()
+    except Exception as e:
+        pytest.skip(f"Redis 不可用: {e}")
+    return backend
+
+
+@pytest.fixture(params=["memory", "file", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryRateLimitBackend()
+    elif request.param == "file":
+        yield FileRateLimitBackend(str(tmp_path / "rate_limit.json"))
+    else:
+        backend = _redis_backend()
+        yield backend
+        for key in backend.client.scan_iter(f"{backend.prefix}*"):
+            backend.client.delete(key)
+
+
+def test_backend_update_is_atomic(backend):
+    def increment(state):
+        state = state or {"count": 0}
+        state["count"] += 1
+        return state, state["count"]
+
+    threads = [threading.Thread(target=lambda: [backend.update("counter", increment) for _ in range(25)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.update("counter", increment) == 101
+    assert backend.update("other", increment) == 1
+
+
+def test_file_backend_is_shared_between_limiters(tmp_path, clock):
+    path = str(tmp_path / "rate_limit.json")
+    first = RateLimiter(FileRateLimitBackend(path), jitter=0)
+    second = RateLimiter(FileRateLimitBackend(path), jitter=0)
+
+    first.feedback(EDITH_URL, 429)
+    assert second.reserve(EDITH_URL) == pytest.approx(DEFAULT_RULES["edith"].cooldown)
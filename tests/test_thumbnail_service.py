@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from app.services import thumbnail_service as thumbnail_module
+from app.services.thumbnail_service import ThumbnailIndex, ThumbnailService
+
+WITH_THUMB = "a" * 64
+WITHOUT_THUMB = "b" * 64
+
+
+def _video(video_id, file_hash):
+    return SimpleNamespace(id=video_id, file_hash=file_hash, oss_object_key=f"video/{video_id}.mp4", width=1080, height=1920)
+
+
+def _service(tmp_path, index=None):
+    oss_service = mock.Mock()
+    oss_service.is_available.return_value = True
+    oss_service.internal_bucket.object_exists.side_effect = lambda key: WITH_THUMB in key
+    oss_service.sign_urls.side_effect = lambda keys, expires, style: {key: f"https://oss/{key}?{style}" for key in keys}
+    return ThumbnailService(oss_service, cache_dir=str(tmp_path), index=index or ThumbnailIndex())
+
+
+def test_rows_without_saved_thumbnail_are_batch_signed(tmp_path):
+    service = _service(tmp_path)
+    videos = [_video(1, WITH_THUMB), _video(2, WITHOUT_THUMB), _video(3, "")]
+
+    urls = service.get_urls(videos, "w320")
+
+    assert urls[1] == f"/admin/videos/thumbs/{WITH_THUMB}/w320.jpg"
+    assert urls[2] == "https://oss/video/2.mp4?video/snapshot,t_1000,f_jpg,w_320,m_fast"
+    assert urls[3] == "https://oss/video/3.mp4?video/snapshot,t_1000,f_jpg,w_320,m_fast"
+    service.oss_service.sign_urls.assert_called_once()
+    assert sorted(service.oss_service.sign_urls.call_args.args[0]) == ["video/2.mp4", "video/3.mp4"]
+
+
+def test_existence_is_remembered_and_misses_expire(tmp_path):
+    service = _service(tmp_path, ThumbnailIndex(miss_ttl=600))
+    videos = [_video(1, WITH_THUMB), _video(2, WITHOUT_THUMB)]
+    bucket = service.oss_service.internal_bucket
+
+    service.get_urls(videos, "w320")
+    service.get_urls(videos, "w320")
+    assert bucket.object_exists.call_count == 2
+    # 已记录不存在时不再下载
+    assert service.cached_path(WITHOUT_THUMB, "w320") is None
+    bucket.get_object.assert_not_called()
+
+    with mock.patch.object(thumbnail_module.time, "time", return_value=thumbnail_module.time.time() + 601):
+        service.get_urls(videos, "w320")
+    assert bucket.object_exists.call_count == 3
+
+
+def test_local_cache_hit_skips_oss(tmp_path):
+    service = _service(tmp_path)
+    service._write_cache(WITHOUT_THUMB, "w160", b"jpeg")
+
+    assert service.get_urls([_video(1, WITHOUT_THUMB)], "w160") == {1: f"/admin/videos/thumbs/{WITHOUT_THUMB}/w160.jpg"}
+    service.oss_service.internal_bucket.object_exists.assert_not_called()
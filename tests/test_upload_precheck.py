@@ -0,0 +1,53 @@
+import asyncio
+from unittest import mock
+
+from sqlmodel import Session, delete
+
+from app.internal.db import engine
+from app.models.video import Video, VideoMaterial
+from app.services.stage_executor import StageExecutor
+from app.services.upload_service import UploadService
+from app.services.video_service import VideoService
+
+FILE_HASH = "a" * 64
+
+
+def _service():
+    executor = StageExecutor({"db": 1})
+    return UploadService(oss_service=mock.Mock(), video_service=VideoService(probe_service=mock.Mock()),
+                         executor=executor)
+
+
+def _material(**overrides):
+    values = dict(width=1080, height=1920, duration=10000, format="AVC", bitrate=1, frame_rate=30,
+                  colour_primaries="", matrix_coefficients="", transfer_characteristics="", rotation=0,
+                  audio_bitrate=0, audio_channels=0, audio_duration=0, audio_format="", audio_sampling_rate=0,
+                  file_hash=FILE_HASH, file_extension=".mp4", file_size=1024, item_id="item-1", sku_id="",
+                  platform="xiaohongshu", owner_id="", oss_object_key="video/material/a.mp4",
+                  url="https://bucket/video/material/a.mp4")
+    values.update(overrides)
+    return VideoMaterial(**values)
+
+
+def setup_function():
+    with Session(engine) as session:
+        session.exec(delete(VideoMaterial))
+        session.exec(delete(Video))
+        session.add(_material())
+        session.commit()
+
+
+def test_precheck_reuses_existing_file_for_another_item():
+    info = asyncio.run(_service().reuse_by_hash(FILE_HASH.upper(), 1024, "item-2", process_func="process_video_file",
+                                                name="b.mp4"))
+    assert info["item_id"] == "item-2"
+    assert info["oss_object_key"] == "video/material/a.mp4"
+    with Session(engine) as session:
+        assert session.get(Video, info["id"]).file_hash == FILE_HASH
+
+
+def test_precheck_misses_unknown_hash_or_different_size():
+    service = _service()
+    assert asyncio.run(service.reuse_by_hash("b" * 64, 1024, "item-2")) is None
+    assert asyncio.run(service.reuse_by_hash(FILE_HASH, 2048, "item-2")) is None
+    assert asyncio.run(service.reuse_by_hash("", 1024, "item-2")) is None
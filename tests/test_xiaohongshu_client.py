@@ -0,0 +1,27 @@
+import threading
+from unittest import mock
+
+from app.services.xiaohongshu.rate_limiter import MemoryRateLimitBackend, RateLimiter
+from app.services.xiaohongshu.xiaohongshu_client import XiaohongshuClient
+
+
+def test_concurrent_map_calls_share_one_executor():
+    client = XiaohongshuClient(rate_limiter=RateLimiter(MemoryRateLimitBackend()))
+    executor = client._executor
+    start = threading.Barrier(8)
+    results = []
+
+    def call_map(n):
+        start.wait()
+        results.append(client.map([n, n + 100]))
+
+    with mock.patch.object(client, "send_request", side_effect=lambda request: request * 2):
+        threads = [threading.Thread(target=call_map, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert client._executor is executor
+    assert sorted(results) == [[n * 2, (n + 100) * 2] for n in range(8)]
+    client.close()
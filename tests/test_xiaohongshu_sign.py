@@ -0,0 +1,50 @@
+"""
+小红书请求签名回归测试
+
+GOLDEN_VECTORS 由改写前的 get_sign（逐字符状态机实现）生成，
+新实现必须逐字节一致，否则服务端验签失败。
+
+运行:
+    python -m pytest tests/test_xiaohongshu_sign.py -q
+"""
+from unittest import mock
+
+import pytest
+
+from app.services.xiaohongshu.rate_limiter import MemoryRateLimitBackend, RateLimiter
+from app.services.xiaohongshu.xiaohongshu_client import BaseXiaohongshuClient
+
+# (method, timestamp, path, params, data, 期望签名)
+GOLDEN_VECTORS = [
+    ('GET', '1700000000000', '/api/edith/product/search_item_v2', {'page_no': 1, 'page_size': 20}, None, 'sY5Lsg5W16OksiFpslqUs6wBOgcW1gwkOgAG0jTl0j13'),
+    ('GET', '1700000000001', '/api/media/v1/upload/creator/permit', {'biz_name': 'spectrum', 'scene': 'video', 'file_count': 4, 'version': 1, 'source': 'web'}, None, 'Z6dB16FpsiTCZYTLOYdBOjFWOldvsgAl0YZBOBZJ1B53'),
+    ('GET', '1712345678901', '/web_api/sns/v1/search/topic', {'keyword': '防晒 推荐'}, None, 'OldUsgsC1lO6sYT+0gvKZg5WsBsW1gAiOgk61lUkZB13'),
+    ('GET', '1712345678902', '/api/edith/product/search_item_v2', {}, None, 'Z2q6OgVkO6aB1gsWsja6sgFKsYsK1lUk0gsLZBdJs613'),
+    ('GET', '1712345678903', '/api/a', None, None, 'OYaJ1iZv1iak1gFiOB5K1B5KOYOk16T+Z21Csg1psj53'),
+    ('GET', '0', '', {'a': '', 'b': None, 'c': True}, None, '1BsKZjvKsB5L0jvis2q616MLO25bsiFb1lwUO6w6OBA3'),
+    ('POST', '1700000000000', '/web_api/sns/v2/note', None, {'common': {'type': 'video', 'title': '夏日清爽穿搭', 'desc': '#话题[话题]# 好看😀', 'ats': [], 'hash_tag': [{'id': '5f', 'name': '穿搭', 'type': 'topic'}]}, 'video_info': {'fileid': 'spectrum/abc', 'format_width': 1080, 'format_height': 1920, 'composite_metadata': {'video': {'bitrate': 900000, 'duration': 12345}}}}, 'sgdJ12qv1B1WO25KOlvlZj5+Oiw6sYFl0Y1iO6d6ZB53'),
+    ('POST', '1700000000002', '/api/edith/product/search_item_v2', None, {'page_no': 3, 'page_size': 100, 'sort_field': 'create_time', 'desc': True, 'price': 12.5}, 'Zg5GsiFb0YOJZjs+12q602MC1gTKOgZksj1bZBsC1lM3'),
+    ('POST', '1700000000003', '/web_api/sns/v1/search/topic', None, {'keyword': 'a"b\\c\n\t/'}, 'OBvlZ65iOi1b0j1ls2ZUZjvi0YwBOgACsBZBsjALZ613'),
+    ('POST', '1700000000004', '/empty', None, {}, 'O2TG1BcLs2FbZBOvOlvpZYdB0j5LZjqBOgFlsi1KOY53'),
+    ('POST', '1700000000005', '/none', None, None, '1lOJ021+OlOk125K1gd6sBT+0g5lOBvlZ6sG1gMCs6F3'),
+    ('PUT', '1799999999999', '/api/x', None, {'list': [1, 2.0, None, False, 'ü']}, '0Y5pZ21l0jwJsBOJO2F+O2dJsjcGOlFCsgTC1gaUsiT3'),
+]
+
+
+@pytest.fixture
+def client():
+    return BaseXiaohongshuClient(rate_limiter=RateLimiter(MemoryRateLimitBackend()))
+
+
+@pytest.mark.parametrize("method, timestamp, path, params, data, expected", GOLDEN_VECTORS)
+def test_get_sign_matches_golden_vectors(client, method, timestamp, path, params, data, expected):
+    assert client.get_sign(method, timestamp, path, params, data) == expected
+
+
+@pytest.mark.parametrize("method, timestamp, path, params, data, expected", GOLDEN_VECTORS)
+def test_build_request_signs_like_get_sign(client, method, timestamp, path, params, data, expected):
+    """build_request 对序列化后的请求体签名，结果应与 get_sign 一致"""
+    with mock.patch("app.services.xiaohongshu.xiaohongshu_client.time.time", return_value=int(timestamp) / 1000):
+        request = client.build_request(method, path, "https://ark.xiaohongshu.com", params, data)
+    assert request.headers["x-t"] == timestamp
+    assert request.headers["x-s"] == expected